@@ -1,19 +1,165 @@
 import os
+import re
 import hashlib
 import sys
 import time
-from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QHBoxLayout, QLineEdit, QPushButton, QStyle, QListWidget, QSplitter, QFileDialog, QMessageBox, QDialog, QLabel, QTextEdit
+# 启动计时起点，用于统计模块导入耗时
+MODULE_START = time.perf_counter()
+import sqlite3
+import json
+import csv
+import heapq
+import itertools
+import bisect
+import threading
+import logging
+import queue
+import atexit
+import base64
+import zlib
+import email
+import email.policy
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+from contextlib import contextmanager
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime
+from urllib.parse import urlsplit
+from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QHBoxLayout, QLineEdit, QPushButton, QStyle, QListView, QCompleter, QSplitter, QTabWidget, QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QMessageBox, QDialog, QLabel, QTextEdit, QToolTip, QComboBox, QMenu
 from PyQt6.QtWebEngineWidgets import QWebEngineView
-from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineSettings
+from PyQt6.QtWebEngineCore import QWebEnginePage, QWebEngineSettings, QWebEngineProfile, QWebEngineDownloadRequest, QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo, QWebEngineScript
+from PyQt6.QtWebChannel import QWebChannel
 # 移除webview导入
-from PyQt6.QtCore import QUrl, QTimer, Qt, QPoint
-from PyQt6.QtGui import QIcon, QShortcut, QScreen, QPixmap
-from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
-from PyQt6.QtMultimediaWidgets import QVideoWidget
+from PyQt6.QtCore import QUrl, QTimer, Qt, QPoint, QAbstractListModel, QModelIndex, QObject, pyqtSignal, QFileSystemWatcher, QRunnable, QThreadPool, QFile, QIODevice, pyqtSlot, QByteArray, QDataStream
+from PyQt6.QtGui import QIcon, QShortcut, QScreen, QPixmap, QKeySequence, QImage, QImageWriter, QPainter
+# QtMultimedia 改为在 MediaService 中按需导入，避免启动时初始化多媒体后端
+
+class StartupTimeline:
+    """记录启动各阶段相对于模块开始导入的时间（秒）"""
+    
+    def __init__(self, origin):
+        self.origin = origin
+        self.marks = {}
+        self.load_finished = []
+        self.recording = True
+        
+    def mark(self, name):
+        """只记录每个阶段第一次到达的时间"""
+        if self.recording and name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.origin
+            
+    def mark_load_finished(self):
+        if self.recording:
+            self.load_finished.append(time.perf_counter() - self.origin)
+            self.mark('first_load_finished')
+            
+    def finish(self):
+        self.recording = False
+        
+    def as_dict(self):
+        return {'marks': dict(self.marks), 'load_finished': list(self.load_finished)}
+
+
+STARTUP_TIMELINE = StartupTimeline(MODULE_START)
+
+
+logger = logging.getLogger('gfy')
+
+# LogRecord自带的属性，其余属性视为通过extra传入的结构化字段
+LOG_RECORD_ATTRS = frozenset(logging.makeLogRecord({}).__dict__) | {'message', 'asctime'}
+LOG_DIR = 'logs'
+LOG_FILE = 'browser.jsonl'
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+
+
+def log_record_to_dict(record):
+    entry = {
+        'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+        'level': record.levelname,
+        'logger': record.name,
+        'message': record.getMessage(),
+    }
+    for key, value in record.__dict__.items():
+        if key not in LOG_RECORD_ATTRS:
+            entry[key] = value
+    if record.exc_info:
+        entry['exception'] = logging.Formatter().formatException(record.exc_info)
+    return entry
+
+
+class JsonLineFormatter(logging.Formatter):
+    """每条记录输出为一行JSON"""
+    
+    def format(self, record):
+        return json.dumps(log_record_to_dict(record), ensure_ascii=False, default=str)
+
+
+class RingBufferHandler(logging.Handler):
+    """在内存中保留最近的若干条记录，供界面直接显示"""
+    
+    def __init__(self, capacity=2000):
+        super().__init__()
+        self.records = deque(maxlen=capacity)
+        
+    def emit(self, record):
+        # 调用方线程只追加记录对象，读取时才转换
+        self.records.append(record)
+        
+    def recent(self, min_level=logging.NOTSET, limit=None):
+        records = [record for record in list(self.records) if record.levelno >= min_level]
+        if limit:
+            records = records[-limit:]
+        return [log_record_to_dict(record) for record in records]
+
+
+LOG_BUFFER = RingBufferHandler()
+logger.addHandler(LOG_BUFFER)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+
+def setup_logging(log_dir=LOG_DIR):
+    """把日志交给后台线程写入按大小轮转的JSON lines文件，调用方线程只做入队"""
+    if getattr(setup_logging, 'listener', None) is not None:
+        return
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = RotatingFileHandler(os.path.join(log_dir, LOG_FILE), maxBytes=LOG_MAX_BYTES,
+                                       backupCount=LOG_BACKUP_COUNT, encoding='utf-8')
+    file_handler.setFormatter(JsonLineFormatter())
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.WARNING)
+    console_handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    # 退出时把队列中剩余的记录写完
+    atexit.register(listener.stop)
+    setup_logging.listener = listener
+
+
+def log_files(log_dir=LOG_DIR):
+    """从新到旧列出日志文件，旧版的error_log.txt排在最后"""
+    base = os.path.join(log_dir, LOG_FILE)
+    paths = [base] + [f"{base}.{i}" for i in range(1, LOG_BACKUP_COUNT + 1)] + ['error_log.txt']
+    return [path for path in paths if os.path.exists(path)]
+
+
+@contextmanager
+def log_duration(message, level=logging.INFO, **fields):
+    """记录一段代码的耗时，duration_ms作为结构化字段写入"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        logger.log(level, message, extra=dict(fields, duration_ms=round((time.perf_counter() - start) * 1000, 2)))
+
 
 class Browser(QMainWindow):
-    def __init__(self):
+    def __init__(self, require_password=True, fast_startup=None):
         super().__init__()
+        setup_logging()
         
         # 设置窗口为无边框样式，确保完全无边框
         self.setWindowFlags(Qt.WindowType.FramelessWindowHint)
@@ -22,19 +168,27 @@ class Browser(QMainWindow):
         # 确保窗口激活时无额外边框
         self.setAttribute(Qt.WidgetAttribute.WA_NoSystemBackground, True)
         
-        # 检查密码文件是否存在
-        self.password_file = 'password.txt'
+        # 统一加载配置（起始页、下载目录、静音、密码等），之后只读内存
+        self.settings_store = SettingsStore()
         self.is_authenticated = False
+        # 快速启动：不重复加载起始页，也不使用固定延时
+        self.fast_startup = self.settings_store.get('fast_startup') if fast_startup is None else fast_startup
         
-        # 初始化错误日志文件
-        self.error_log_file = 'error_log.txt'
-        try:
-            open(self.error_log_file, 'a').close()
-        except Exception as e:
-            print(f"无法创建错误日志文件: {e}")
+        # 打开历史记录数据库（密码错误时也需要能清除历史）
+        self.history_store = HistoryStore()
+        # 页面加载耗时记录，包含URL，随历史记录一起清除
+        self.page_telemetry = PageLoadTelemetry()
+        # 访问过的页面正文的全文索引
+        self.page_index = PageTextIndex()
+        # 上次打开的标签页，清除历史时一并删除
+        self.session_store = SessionStore()
         
-        # 如果密码文件存在，显示密码输入对话框
-        if os.path.exists(self.password_file):
+        # 如果已设置密码，显示密码输入对话框
+        if not require_password:
+            # 仅供基准测试等程序化启动使用，运行在独立的临时目录中
+            self.is_authenticated = True
+            self.initialize_browser()
+        elif self.settings_store.get('password_hash'):
             self.show_password_dialog()
         else:
             # 首次运行，设置密码
@@ -45,10 +199,9 @@ class Browser(QMainWindow):
             return
             
         # 检查是否有清除历史记录的通知需要显示
-        if os.path.exists('history_cleared.txt'):
-            from PyQt6.QtWidgets import QMessageBox
+        if self.settings_store.get('history_cleared'):
             QMessageBox.information(self, "提示", "您的浏览记录已被清除！", QMessageBox.StandardButton.Ok)
-            os.remove('history_cleared.txt')
+            self.settings_store.set('history_cleared', False)
             
         self.setWindowTitle("GFY浏览器")
         self.setWindowIcon(QIcon("icon.ico"))
@@ -79,7 +232,7 @@ class Browser(QMainWindow):
                 border: 1px solid #ddd;
                 border-radius: 4px;
             }
-            QListWidget {
+            QListView {
                 border: 1px solid #ddd;
                 background-color: white;
             }
@@ -102,13 +255,36 @@ class Browser(QMainWindow):
         self.refresh_btn.setIcon(QApplication.style().standardIcon(QStyle.StandardPixmap.SP_BrowserReload))
         self.forward_btn = QPushButton(">" )
         self.url_bar = QLineEdit()
+        # 地址栏补全：索引在后台构建完成前不提供建议
+        self.omnibox_index = None
+        self.omnibox_pending = []
+        self.omnibox_building = False
+        self.omnibox_build_id = 0
+        self.omnibox_merging = False
+        self.suggestion_model = SuggestionListModel(self)
+        self.completer = QCompleter(self.suggestion_model, self)
+        self.completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self.completer.setCompletionRole(Qt.ItemDataRole.EditRole)
+        self.completer.setWidget(self.url_bar)
+        self.completer.activated.connect(self.on_suggestion_activated)
+        self.url_bar.textEdited.connect(self.update_suggestions)
         self.go_btn = QPushButton("Go")
+        self.blocked_label = QLabel()
+        self.blocked_label.setStyleSheet("color: white;")
+        self.memory_label = QLabel()
+        self.memory_label.setStyleSheet("color: white;")
         self.bookmark_btn = QPushButton("☆")
         self.history_btn = QPushButton("历史")
         self.clear_btn = QPushButton("清除历史记录")
         self.toggle_sidebar_btn = QPushButton("收藏夹")
         self.settings_btn = QPushButton("设置")
         self.screenshot_btn = QPushButton("截图")
+        self.archive_btn = QPushButton("存档")
+        archive_menu = QMenu(self.archive_btn)
+        archive_menu.addAction("离线保存当前页面", self.archive_current_page)
+        archive_menu.addAction("查看离线存档...", self.show_archive_panel)
+        self.archive_btn.setMenu(archive_menu)
+        self.downloads_btn = QPushButton("下载")
         
         # 添加窗口控制按钮
         self.minimize_btn = QPushButton("_")
@@ -135,12 +311,16 @@ class Browser(QMainWindow):
         nav_layout.addWidget(self.forward_btn)
         nav_layout.addWidget(self.url_bar)
         nav_layout.addWidget(self.go_btn)
+        nav_layout.addWidget(self.blocked_label)
+        nav_layout.addWidget(self.memory_label)
         nav_layout.addWidget(self.bookmark_btn)
         nav_layout.addWidget(self.history_btn)
         nav_layout.addWidget(self.clear_btn)
         nav_layout.addWidget(self.toggle_sidebar_btn)
         nav_layout.addWidget(self.settings_btn)
         nav_layout.addWidget(self.screenshot_btn)
+        nav_layout.addWidget(self.archive_btn)
+        nav_layout.addWidget(self.downloads_btn)
         
         # 添加窗口控制按钮到布局末尾
         nav_layout.addSpacing(10)
@@ -150,35 +330,97 @@ class Browser(QMainWindow):
         
         nav_bar.setLayout(nav_layout)
         
-        # 创建浏览器视图
-        self.browser = WebEngineView()
-        self.history_list = []
+        # 收藏夹服务需要在第一个标签页创建前就绪（用于更新星标）
+        self.bookmark_service = BookmarkService()
+        self.current_star_url = None
         
-        # 读取起始页配置
-        self.homepage_url = "https://www.baidu.com"
-        try:
-            with open('homepage.txt', 'r') as f:
-                url = f.read().strip()
-                if url:
-                    self.homepage_url = url
-        except FileNotFoundError:
-            pass
-            
-        self.browser.setUrl(QUrl(self.homepage_url))
+        # 创建标签页，所有标签页共用同一个持久化profile（cookie、磁盘缓存）
+        self.profile = create_browser_profile(self.settings_store, self)
+        self.script_registry = create_script_registry()
+        self.script_registry.install(self.profile)
+        self.download_manager = DownloadManager(self.settings_store, self)
+        self.profile.downloadRequested.connect(self.download_manager.handle_request)
+        # 离线存档：MHTML拆分为资源后去重压缩保存
+        self.archive_store = ArchiveStore()
+        self.page_archiver = PageArchiver(self.archive_store, self)
+        self.download_manager.page_save_requested.connect(self.page_archiver.handle_download)
+        self.page_archiver.archived.connect(self.on_page_archived)
+        self.page_archiver.failed.connect(lambda error: self.show_archive_message(f"存档失败: {error}"))
+        self.lifecycle_manager = TabLifecycleManager(self.settings_store, self)
+        # 所有标签页的导航（输入、链接、前进后退、预渲染命中）都经由这里记录历史
+        self.navigation_recorder = NavigationRecorder(self)
+        self.navigation_recorder.visits_committed.connect(self.record_visits)
+        # 写入失败（如后台整理正持有写锁）的访问记录，定时重试
+        self.unsaved_visits = []
+        self.visit_retry_timer = QTimer(self)
+        self.visit_retry_timer.setSingleShot(True)
+        self.visit_retry_timer.setInterval(HISTORY_RETRY_MS)
+        self.visit_retry_timer.timeout.connect(lambda: self.record_visits([]))
+        # 广告和跟踪器拦截，对所有标签页和后台页面生效
+        self.adblock_service = AdBlockService(self.settings_store, self)
+        self.profile.setUrlRequestInterceptor(self.adblock_service.interceptor)
+        self.adblock_service.blocked_count_changed.connect(self.on_blocked_count_changed)
+        self.prerender_manager = PrerenderManager(self.profile, self.settings_store, self.lifecycle_manager, self)
+        # 渲染进程内存监控，超出预算时逐级回收
+        self.memory_monitor = MemoryMonitor(self.settings_store, self.profile, self.lifecycle_manager,
+                                            self.prerender_manager, self)
+        self.memory_monitor.sampled.connect(self.on_memory_sampled)
+        self.page_indexer = PageTextIndexer(self.page_index, self.settings_store, self)
+        self.tabs = QTabWidget()
+        self.tabs.setDocumentMode(True)
+        self.tabs.setTabsClosable(True)
+        self.tabs.setMovable(True)
+        self.tabs.tabCloseRequested.connect(self.close_tab)
+        self.tabs.currentChanged.connect(self.on_current_tab_changed)
+        self.new_tab_btn = QPushButton("+")
+        self.new_tab_btn.setStyleSheet("min-width: 30px; max-width: 30px;")
+        self.new_tab_btn.clicked.connect(lambda: self.add_tab(self.settings_store.get('homepage')))
+        self.tabs.setCornerWidget(self.new_tab_btn)
+        # 有上次的会话时只恢复前台标签页，否则打开起始页
+        self.session_manager = SessionManager(self.session_store, self.settings_store, self)
+        if not self.session_manager.restore():
+            self.add_tab(self.settings_store.get('homepage'))
         
         # 创建收藏夹侧边栏
-        self.bookmarks_list = QListWidget()
-        self.bookmarks_list.itemClicked.connect(self.navigate_to_bookmark)
+        self.bookmarks_model = BookmarkListModel()
+        self.bookmarks_list = QListView()
+        self.bookmarks_list.setUniformItemSizes(True)
+        self.bookmarks_list.setModel(self.bookmarks_model)
+        self.bookmarks_list.clicked.connect(self.navigate_to_bookmark)
+        # 鼠标悬停在收藏或历史上时预加载该页面
+        self.bookmarks_list.setMouseTracking(True)
+        self.bookmarks_list.entered.connect(lambda index: self.prerender_manager.schedule(index.data(URL_ROLE)))
+        
+        # 创建历史记录侧边栏（按需分页加载，打开速度与记录数量无关）
+        self.history_model = HistoryListModel(self.history_store)
+        self.history_list = QListView()
+        self.history_list.setUniformItemSizes(True)
+        self.history_list.setModel(self.history_model)
+        self.history_list.clicked.connect(self.navigate_to_history)
+        self.history_list.setMouseTracking(True)
+        self.history_list.entered.connect(lambda index: self.prerender_manager.schedule(index.data(URL_ROLE)))
         
-        # 创建历史记录侧边栏
-        self.history_list = QListWidget()
-        self.history_list.itemClicked.connect(self.navigate_to_history)
+        # 历史记录上方的全文搜索框，有输入时列表显示搜索结果
+        self.history_search = QLineEdit()
+        self.history_search.setPlaceholderText("搜索访问过的页面内容")
+        self.history_search.setClearButtonEnabled(True)
+        self.search_model = SuggestionListModel(self)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(200)
+        self.search_timer.timeout.connect(self.search_pages)
+        self.history_search.textChanged.connect(lambda _: self.search_timer.start())
+        self.history_panel = QWidget()
+        history_layout = QVBoxLayout(self.history_panel)
+        history_layout.setContentsMargins(0, 0, 0, 0)
+        history_layout.addWidget(self.history_search)
+        history_layout.addWidget(self.history_list)
         
         # 使用QSplitter创建可调整的布局
         splitter = QSplitter()
         splitter.addWidget(self.bookmarks_list)
-        splitter.addWidget(self.history_list)
-        splitter.addWidget(self.browser)
+        splitter.addWidget(self.history_panel)
+        splitter.addWidget(self.tabs)
         
         # 设置布局
         layout = QVBoxLayout()
@@ -190,7 +432,7 @@ class Browser(QMainWindow):
         
         # 初始隐藏侧边栏
         self.bookmarks_list.hide()
-        self.history_list.hide()
+        self.history_panel.hide()
         self.toggle_sidebar_btn.clicked.connect(self.toggle_sidebar)
         self.history_btn.clicked.connect(self.toggle_history)
         
@@ -199,23 +441,92 @@ class Browser(QMainWindow):
         # 连接信号
         self.go_btn.clicked.connect(self.navigate_to_url)
         self.url_bar.returnPressed.connect(self.navigate_to_url)
-        self.refresh_btn.clicked.connect(self.browser.reload)
+        self.refresh_btn.clicked.connect(lambda: self.browser.reload())
         self.bookmark_btn.clicked.connect(self.add_bookmark)
+        self.bookmark_service.bookmark_toggled.connect(self.on_bookmark_toggled)
         self.clear_btn.clicked.connect(self.clear_history_and_cookies)
-        self.back_btn.clicked.connect(self.browser.back)
+        self.back_btn.clicked.connect(lambda: self.browser.back())
         self.back_btn.setEnabled(self.browser.history().canGoBack())
-        self.forward_btn.clicked.connect(self.browser.forward)
-        self.browser.page().urlChanged.connect(self.update_url)
+        self.forward_btn.clicked.connect(lambda: self.browser.forward())
         self.settings_btn.clicked.connect(self.show_settings_dialog)
         self.screenshot_btn.clicked.connect(self.take_screenshot)
+        self.downloads_btn.clicked.connect(self.show_downloads_panel)
+        self.settings_store.setting_changed.connect(self.on_setting_changed)
+        QShortcut(QKeySequence("Ctrl+T"), self, lambda: self.add_tab(self.settings_store.get('homepage')))
+        QShortcut(QKeySequence("Ctrl+W"), self, lambda: self.close_tab(self.tabs.currentIndex()))
+        QShortcut(QKeySequence("Ctrl+S"), self, self.archive_current_page)
+        QShortcut(QKeySequence("Ctrl+Shift+V"), self, lambda: self.pop_out_video())
+        self.video_popout = None
         
-        # 延迟加载部分资源
-        QTimer.singleShot(100, self.delayed_initialization)
+        # 延迟加载部分资源；快速启动时在事件循环开始后立即执行
+        QTimer.singleShot(0 if self.fast_startup else 100, self.delayed_initialization)
         
         # 窗口拖动变量初始化
         self.dragging = False
         self.drag_position = QPoint()
     
+    @property
+    def browser(self):
+        """当前标签页的浏览器视图"""
+        return self.tabs.currentWidget()
+        
+    def add_tab(self, url=None, background=False, session_tab=None):
+        """新建标签页，返回其WebEngineView；session_tab为恢复会话时的占位信息"""
+        view = WebEngineView(settings_store=self.settings_store, profile=self.profile, browser_window=self)
+        view.session_tab = session_tab
+        view.urlChanged.connect(lambda q, v=view: self.on_tab_url_changed(v, q))
+        view.titleChanged.connect(lambda title, v=view: self.on_tab_title_changed(v, title))
+        view.loadFinished.connect(lambda ok: STARTUP_TIMELINE.mark_load_finished())
+        view.video_detected.connect(lambda url, v=view: self.on_video_detected(v, url))
+        self.navigation_recorder.attach(view)
+        self.lifecycle_manager.register(view)
+        title = session_tab.title if session_tab is not None else ""
+        index = self.tabs.addTab(view, title[:20] or "新标签页")
+        if title:
+            self.tabs.setTabToolTip(index, title)
+        if url:
+            view.setUrl(QUrl(url))
+        if not background:
+            self.tabs.setCurrentIndex(index)
+        self.session_manager.mark_dirty()
+        return view
+        
+    def close_tab(self, index):
+        view = self.tabs.widget(index)
+        if view is None:
+            return
+        if self.tabs.count() == 1:
+            # 保留最后一个标签页，回到起始页
+            view.setUrl(QUrl(self.settings_store.get('homepage')))
+            return
+        self.lifecycle_manager.unregister(view)
+        self.navigation_recorder.detach(view)
+        self.tabs.removeTab(index)
+        view.deleteLater()
+        self.session_manager.mark_dirty()
+        
+    def on_current_tab_changed(self, index):
+        view = self.tabs.widget(index)
+        if view is None:
+            return
+        # 恢复的占位标签页在第一次切换到时才开始加载
+        self.session_manager.activate(view)
+        self.lifecycle_manager.activate(view)
+        self.update_url(view.url())
+        self.session_manager.mark_dirty()
+        
+    def on_tab_url_changed(self, view, q):
+        self.session_manager.mark_dirty()
+        if view is self.browser:
+            self.update_url(q)
+            
+    def on_tab_title_changed(self, view, title):
+        self.session_manager.mark_dirty()
+        index = self.tabs.indexOf(view)
+        if index >= 0:
+            self.tabs.setTabText(index, title[:20] if title else "新标签页")
+            self.tabs.setTabToolTip(index, title)
+        
     def toggle_maximize(self):
         """切换窗口最大化状态"""
         if self.isMaximized():
@@ -257,58 +568,214 @@ class Browser(QMainWindow):
             self.move(new_pos)
             event.accept()
     
+    def showEvent(self, event):
+        super().showEvent(event)
+        STARTUP_TIMELINE.mark('window_shown')
+        
     def mouseReleaseEvent(self, event):
         """处理鼠标释放事件，结束窗口拖动"""
         self.dragging = False
         event.accept()
     
+    def closeEvent(self, event):
+        """关闭窗口时保存会话、写回收藏夹并释放历史记录数据库"""
+        if hasattr(self, 'session_manager'):
+            self.session_manager.save()
+        if hasattr(self, 'bookmark_service'):
+            self.bookmark_service.flush()
+        if hasattr(self, 'navigation_recorder'):
+            self.navigation_recorder.flush_all()
+            if self.unsaved_visits:
+                self.visit_retry_timer.stop()
+                self.record_visits([])
+            if self.unsaved_visits:
+                logger.error(f"退出时仍有 {len(self.unsaved_visits)} 条历史记录未能保存")
+        self.history_store.close()
+        self.page_telemetry.close()
+        self.page_index.close()
+        if hasattr(self, 'archive_store'):
+            self.archive_store.close()
+        super().closeEvent(event)
+    
     def delayed_initialization(self):
         """延迟初始化非关键组件"""
         # 加载历史记录和书签
         self.load_history()
+        STARTUP_TIMELINE.mark('history_ready')
         self.load_bookmarks()
+        STARTUP_TIMELINE.mark('bookmarks_ready')
+        self.rebuild_omnibox_index()
         
+        # 定期在后台整理历史记录
+        interval = self.settings_store.get('history_compact_interval_h') * 3600
+        if interval and time.time() - self.settings_store.get('history_last_compacted') > interval:
+            QTimer.singleShot(HISTORY_COMPACT_DELAY_MS, self.compact_history)
+            
+        # 启动完成后空闲时预热缓存
+        if self.settings_store.get('cache_warmup'):
+            QTimer.singleShot(CacheWarmer.START_DELAY_MS, self.start_cache_warmup)
+            
+        if self.fast_startup or self.session_manager.restored:
+            # 起始页（或恢复的前台标签页）已经在创建标签页时开始加载，不再重复加载
+            return
+            
         # 设置1秒后自动执行Go功能的定时器
         self.timer = QTimer()
         self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.navigate_to_url)
         self.timer.start(1000)
         
+    def rebuild_omnibox_index(self, attempt=0):
+        """在后台线程中从历史记录和收藏夹构建地址栏补全索引，失败时稍后重试"""
+        db_path = self.history_store.db_path
+        bookmarks = self.bookmark_service.urls()
+        self.omnibox_index = None
+        self.omnibox_pending = []
+        # 只接受最近一次构建的结果，较早的构建完成或失败时直接忽略
+        self.omnibox_build_id += 1
+        build_id = self.omnibox_build_id
+        self.omnibox_building = True
+        def build():
+            with log_duration("构建地址栏补全索引"):
+                return build_omnibox_index(db_path, bookmarks)
+        run_in_background(build, lambda index: self.on_omnibox_index_ready(build_id, index),
+                          lambda error: self.on_omnibox_index_failed(build_id, attempt, error))
+        
+    def on_omnibox_index_ready(self, build_id, index):
+        if build_id != self.omnibox_build_id:
+            return
+        # 构建期间产生的访问记录在这里补上
+        for url, title, visit_time in self.omnibox_pending:
+            index.record_visit(url, title, visit_time)
+        self.omnibox_pending = []
+        self.omnibox_building = False
+        self.omnibox_index = index
+        
+    def on_omnibox_index_failed(self, build_id, attempt, error):
+        if build_id != self.omnibox_build_id:
+            return
+        # 期间的访问已经写入数据库，重新构建时会读到，不需要继续积累
+        self.omnibox_pending = []
+        self.omnibox_building = False
+        if attempt + 1 < OMNIBOX_BUILD_ATTEMPTS:
+            logger.error(f"构建地址栏补全索引时出错，{OMNIBOX_RETRY_MS // 1000} 秒后重试: {error}")
+            QTimer.singleShot(OMNIBOX_RETRY_MS, lambda: self.rebuild_omnibox_index(attempt + 1))
+        else:
+            logger.error(f"构建地址栏补全索引失败 {OMNIBOX_BUILD_ATTEMPTS} 次，本次运行不再提供补全: {error}")
+        
+    def update_suggestions(self, text):
+        if self.omnibox_index is None:
+            return
+        suggestions = self.omnibox_index.suggest(text)
+        self.suggestion_model.set_suggestions(suggestions)
+        if suggestions:
+            # 预加载排名第一的候选地址
+            self.prerender_manager.schedule(suggestions[0][0])
+            self.completer.complete()
+        else:
+            self.completer.popup().hide()
+            
+    def on_suggestion_activated(self, url):
+        self.url_bar.setText(url)
+        self.navigate_to_url()
+        
+    def compact_history(self, on_finished=None):
+        """在线程池中整理历史记录，完成后刷新侧边栏和补全索引"""
+        if getattr(self, 'history_compacting', False):
+            return
+        self.history_compacting = True
+        db_path = self.history_store.db_path
+        retention_days = self.settings_store.get('history_retention_days')
+        max_entries = self.settings_store.get('history_max_entries')
+        
+        def finished(result):
+            self.history_compacting = False
+            self.settings_store.set('history_last_compacted', time.time())
+            message = format_compaction_result(result)
+            logger.info(message, extra=result)
+            if result['rows_before'] != result['rows_after']:
+                self.history_model.reset()
+                self.rebuild_omnibox_index()
+            if on_finished is not None:
+                on_finished(message)
+                
+        def failed(error):
+            self.history_compacting = False
+            logger.error(f"整理历史记录时出错: {error}")
+            if on_finished is not None:
+                on_finished(f"整理失败: {error}")
+                
+        def compact():
+            with log_duration("整理历史记录"):
+                return compact_history(db_path, retention_days, max_entries)
+        run_in_background(compact, finished, failed)
+        
+    def start_cache_warmup(self):
+        """在隐藏页面中依次加载起始页和最常访问的收藏，把资源写入HTTP缓存"""
+        bookmarks = self.bookmark_service.urls()
+        counts = self.history_store.visit_counts(bookmarks)
+        top_bookmarks = sorted(bookmarks, key=lambda url: counts.get(url, 0), reverse=True)
+        urls = [self.settings_store.get('homepage')]
+        urls += top_bookmarks[:self.settings_store.get('cache_warmup_count')]
+        self.cache_warmer = CacheWarmer(self.profile, urls, self)
+        self.cache_warmer.start()
+        
     def update_url(self, q):
         self.url_bar.setText(q.toString())
         self.back_btn.setEnabled(self.browser.history().canGoBack())
+        self.update_bookmark_star(q.toString())
+        self.update_blocked_label(q.toString())
+        
+    def update_blocked_label(self, url):
+        count = self.adblock_service.blocked_count(url)
+        self.blocked_label.setText(f"已拦截 {count}" if count else "")
+        
+    def on_blocked_count_changed(self, url, count):
+        if self.browser is not None and url == self.browser.url().toString():
+            self.blocked_label.setText(f"已拦截 {count}")
+        
+    def on_memory_sampled(self, sample):
+        budget = self.memory_monitor.budget()
+        over = budget and sample.total > budget
+        self.memory_label.setText(f"内存 {format_bytes(sample.total)}")
+        self.memory_label.setStyleSheet("color: #ffd0d0; font-weight: bold;" if over else "color: white;")
+        lines = [f"{len(sample.processes)} 个渲染进程，预算 {format_bytes(budget)}" if budget
+                 else f"{len(sample.processes)} 个渲染进程"]
+        lines += [f"{format_bytes(size)}  {url}" for _, url, size in sample.pages[:10]]
+        self.memory_label.setToolTip('\n'.join(lines))
         
     def add_bookmark(self):
         url = self.url_bar.text()
         if url:
             if not url.startswith('http'):
                 url = 'http://' + url
+            self.current_star_url = url
             
             # 检查网址是否已存在
-            try:
-                with open('bookmarks.txt', 'r') as f:
-                    bookmarks = [line.strip() for line in f]
-                    if url in bookmarks:
-                        from PyQt6.QtWidgets import QMessageBox
-                        reply = QMessageBox.question(self, '取消收藏', 
-                            '该网址已在收藏夹中，是否取消收藏？',
-                            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-                        if reply == QMessageBox.StandardButton.Yes:
-                            # 从文件中删除该网址
-                            with open('bookmarks.txt', 'w') as f:
-                                for bookmark in bookmarks:
-                                    if bookmark != url:
-                                        f.write(bookmark + '\n')
-                            self.bookmark_btn.setText("☆")
-                            self.load_bookmarks()
-                        return
-            except FileNotFoundError:
-                pass
+            if self.bookmark_service.contains(url):
+                reply = QMessageBox.question(self, '取消收藏', 
+                    '该网址已在收藏夹中，是否取消收藏？',
+                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+                if reply == QMessageBox.StandardButton.Yes:
+                    self.bookmark_service.remove(url)
+                return
                 
-            with open('bookmarks.txt', 'a') as f:
-                f.write(url + '\n')
-            self.bookmark_btn.setText("★")
-            self.load_bookmarks()
+            self.bookmark_service.add(url)
+            
+    def update_bookmark_star(self, url):
+        """根据收藏索引更新星标按钮，不读取文件"""
+        self.current_star_url = url
+        self.bookmark_btn.setText("★" if self.bookmark_service.contains(url) else "☆")
+        
+    def on_bookmark_toggled(self, url, starred):
+        if starred:
+            self.bookmarks_model.add_bookmark(url)
+        else:
+            self.bookmarks_model.remove_bookmark(url)
+        if url == self.current_star_url:
+            self.bookmark_btn.setText("★" if starred else "☆")
+        if self.omnibox_index is not None:
+            self.omnibox_index.set_bookmarked(url, starred)
                 
     def navigate_to_url(self):
         url = self.url_bar.text()
@@ -321,160 +788,128 @@ class Browser(QMainWindow):
             
         if not url.startswith('http'):
             url = 'http://' + url
-        self.browser.setUrl(QUrl(url))
-        
-        # 获取网页标题
-        def get_title(title):
-            try:
-                # 记录历史（包含标题和时间）
-                from datetime import datetime
-                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                with open('history.txt', 'a', encoding='utf-8') as f:
-                    f.write(f"{url}||{title}||{current_time}\n")
-                self.load_history()
-            except Exception as e:
-                print(f"保存历史记录时出错: {e}")
-            finally:
-                # 确保信号只连接一次
-                self.browser.page().titleChanged.disconnect(get_title)
-         
-        self.browser.page().titleChanged.connect(get_title)
+        # 历史记录由导航记录器在页面提交后统一写入
+        self.open_url(url)
         
         # 检查当前网址是否已收藏
-        try:
-            with open('bookmarks.txt', 'r') as f:
-                bookmarks = [line.strip() for line in f]
-                if url in bookmarks:
-                    self.bookmark_btn.setText("★")
-                else:
-                    self.bookmark_btn.setText("☆")
-        except FileNotFoundError:
-            self.bookmark_btn.setText("☆")
+        self.update_bookmark_star(url)
+        
+    def open_url(self, url):
+        """在当前标签页打开url，已预渲染时直接换上后台页面并返回True"""
+        entry = self.prerender_manager.take(url)
+        if entry is None:
+            self.browser.setUrl(QUrl(url))
+            return False
+        self.browser.adopt_page(entry.page)
+        # 已加载完成的页面不会再发出loadFinished，标题稳定后即可记录；
+        # 仍在加载的页面由视图转发的loadFinished照常驱动记录和正文索引
+        if entry.finished is not None:
+            self.navigation_recorder.on_load_finished(self.browser, True)
+            self.page_indexer.capture(entry.page)
+        return True
         
     def load_bookmarks(self):
-        self.bookmarks_list.clear()
-        try:
-            with open('bookmarks.txt', 'r') as f:
-                for line in f:
-                    url = line.strip()
-                    if url:
-                        self.bookmarks_list.addItem(url)
-        except FileNotFoundError:
-            pass
+        self.bookmarks_model.set_bookmarks(self.bookmark_service.urls())
             
     def load_history(self):
-        self.history_list.clear()
+        self.history_model.reset()
+            
+    def record_visits(self, visits):
+        """批量写入导航记录器提交的访问记录并增量更新侧边栏和补全索引
+
+        数据库暂时被占用时保留这批记录，稍后与新的记录一起重试，不会丢弃。
+        """
+        visits = self.unsaved_visits + list(visits)
+        if not visits:
+            return
+        self.unsaved_visits = []
         try:
-            with open('history.txt', 'r', encoding='utf-8') as f:
-                for line in f:
-                    parts = line.strip().split('||')
-                    if len(parts) == 3:
-                        url, title, time = parts
-                        self.history_list.addItem(f"{time} - {title} - {url}")
-                    elif len(parts) == 2:
-                        url, title = parts
-                        self.history_list.addItem(f"{title} - {url}")
-                    elif len(parts) == 1 and parts[0]:  # 兼容旧格式
-                        self.history_list.addItem(parts[0])
-        except FileNotFoundError:
-            pass
-        except UnicodeDecodeError:
-            try:
-                with open('history.txt', 'r', encoding='gbk') as f:
-                    for line in f:
-                        parts = line.strip().split('||')
-                        if len(parts) == 3:
-                            url, title, time = parts
-                            self.history_list.addItem(f"{time} - {title} - {url}")
-                        elif len(parts) == 2:
-                            url, title = parts
-                            self.history_list.addItem(f"{title} - {url}")
-                        elif len(parts) == 1 and parts[0]:
-                            self.history_list.addItem(parts[0])
-            except Exception as e:
-                print(f"加载历史记录时出错: {e}")
-            
-    def navigate_to_history(self, item):
-        text = item.text()
-        # 从历史记录文本中提取URL
-        if ' - ' in text and 'http' in text:
-            # 格式为"时间 - 标题 - URL"或"标题 - URL"
-            url = text.split(' - ')[-1]
-        else:
-            url = text
+            entries = self.history_store.add_visits(visits)
+        except sqlite3.Error as e:
+            logger.warning(f"保存历史记录时出错，{HISTORY_RETRY_MS} ms后重试 {len(visits)} 条: {e}")
+            self.unsaved_visits = visits
+            self.visit_retry_timer.start()
+            return
+        self.history_model.prepend_visits(entries)
+        if self.omnibox_index is None:
+            if self.omnibox_building:
+                self.omnibox_pending.extend((url, title, visit_time) for _, url, title, visit_time in entries)
+            return
+        for _, url, title, visit_time in entries:
+            self.omnibox_index.record_visit(url, title, visit_time)
+        if self.omnibox_index.needs_merge() and not self.omnibox_merging:
+            self.omnibox_merging = True
+            index = self.omnibox_index
+            run_in_background(index.merge_delta, self.on_omnibox_merged, self.on_omnibox_merged)
+            
+    def on_omnibox_merged(self, result):
+        self.omnibox_merging = False
+            
+    def navigate_to_history(self, index):
+        # 直接从模型数据中取URL，标题中包含' - '也不受影响
+        url = index.data(URL_ROLE)
         self.url_bar.setText(url)
-        self.browser.setUrl(QUrl(url))
+        self.open_url(url)
             
-    def navigate_to_bookmark(self, item):
-        url = item.text()
+    def navigate_to_bookmark(self, index):
+        url = index.data(URL_ROLE)
         self.url_bar.setText(url)
-        self.browser.setUrl(QUrl(url))
-        
-        # 获取网页标题并记录历史
-        def get_title(title):
-            try:
-                # 记录历史（包含标题和时间）
-                from datetime import datetime
-                current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                with open('history.txt', 'a', encoding='utf-8') as f:
-                    f.write(f"{url}||{title}||{current_time}\n")
-                self.load_history()
-            except Exception as e:
-                print(f"保存历史记录时出错: {e}")
-            finally:
-                # 确保信号只连接一次
-                self.browser.page().titleChanged.disconnect(get_title)
-         
-        self.browser.page().titleChanged.connect(get_title)
+        self.open_url(url)
         
         # 检查当前网址是否已收藏
-        try:
-            with open('bookmarks.txt', 'r') as f:
-                bookmarks = [line.strip() for line in f]
-                if url in bookmarks:
-                    self.bookmark_btn.setText("★")
-                else:
-                    self.bookmark_btn.setText("☆")
-        except FileNotFoundError:
-            self.bookmark_btn.setText("☆")
+        self.update_bookmark_star(url)
             
     def clear_history_and_cookies(self):
         # 清除历史记录文件
         try:
-            open('history.txt', 'w').close()
-            if hasattr(self, 'history_list'):
-                self.history_list.clear()
-            # 创建清除记录标记文件
-            with open('history_cleared.txt', 'w') as f:
-                f.write('1')
-            # 创建密码错误标记文件
-            with open('password_error.txt', 'w') as f:
-                f.write('1')
+            self.history_store.clear()
+            self.page_telemetry.clear()
+            self.page_index.clear()
+            self.session_store.clear()
+            if hasattr(self, 'history_model'):
+                self.history_model.reset()
+                self.rebuild_omnibox_index()
+            # 记录清除标记和密码错误标记，下次启动时提示
+            self.settings_store.update({'history_cleared': True, 'password_error': True})
         except Exception as e:
-            print(f"清除历史记录时出错: {e}")
+            logger.error(f"清除历史记录时出错: {e}")
             
         # 清除浏览器cookie（仅在密码错误时）
-        if os.path.exists('password_error.txt'):
+        if self.settings_store.get('password_error'):
             try:
                 if hasattr(self, 'browser') and self.browser:
                     self.browser.page().profile().cookieStore().deleteAllCookies()
             except Exception as e:
-                print(f"清除cookie时出错: {e}")
+                logger.error(f"清除cookie时出错: {e}")
         
     def toggle_sidebar(self):
         if self.bookmarks_list.isVisible():
             self.bookmarks_list.hide()
         else:
             self.bookmarks_list.show()
-            self.history_list.hide()
+            self.history_panel.hide()
             
     def toggle_history(self):
-        if self.history_list.isVisible():
-            self.history_list.hide()
+        if self.history_panel.isVisible():
+            self.history_panel.hide()
         else:
-            self.history_list.show()
+            self.history_panel.show()
             self.bookmarks_list.hide()
             
+    def search_pages(self):
+        """在后台线程查询全文索引；输入已经变化时丢弃旧结果"""
+        query = self.history_search.text().strip()
+        if not query:
+            self.history_list.setModel(self.history_model)
+            return
+        def on_results(results, query=query):
+            if self.history_search.text().strip() != query:
+                return
+            self.search_model.set_suggestions(results)
+            self.history_list.setModel(self.search_model)
+        run_in_background(lambda: self.page_index.search(query), on_results,
+                          lambda error: logger.error(f"搜索页面内容时出错: {error}"))
+            
     def show_password_dialog(self):
         dialog = QDialog(self)
         dialog.setWindowTitle("输入密码")
@@ -524,14 +959,8 @@ class Browser(QMainWindow):
         dialog.exec()
         
     def log_error(self, error_msg):
-        """记录错误到日志文件"""
-        from datetime import datetime
-        try:
-            with open(self.error_log_file, 'a', encoding='utf-8') as f:
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                f.write(f"[{timestamp}] {error_msg}\n")
-        except Exception as e:
-            print(f"记录错误日志失败: {e}")
+        """记录错误到日志（由后台线程写入文件）"""
+        logger.error(error_msg)
             
     def verify_password(self, dialog):
         try:
@@ -539,8 +968,7 @@ class Browser(QMainWindow):
             if not hasattr(self, 'password_attempts'):
                 self.password_attempts = 0
                 
-            with open(self.password_file, 'r') as f:
-                stored_hash = f.read().strip()
+            stored_hash = self.settings_store.get('password_hash')
                 
             input_hash = hashlib.sha256(self.password_input.text().encode()).hexdigest()
             
@@ -558,9 +986,8 @@ class Browser(QMainWindow):
             # 仅在第三次错误时清除历史记录
             if self.password_attempts == 3:
                 self.clear_history_and_cookies()
-                # 创建密码错误标记文件
-                with open('password_error.txt', 'w') as f:
-                    f.write('1')
+                # 记录密码错误标记
+                self.settings_store.set('password_error', True)
                 QMessageBox.warning(self, "安全警告", "密码错误次数过多，已清除历史记录！\n\n出于安全考虑，您的浏览记录和cookies已被清除。")
                 dialog.close()
                 sys.exit(1)
@@ -583,8 +1010,7 @@ class Browser(QMainWindow):
             
         try:
             password_hash = hashlib.sha256(self.new_password_input.text().encode()).hexdigest()
-            with open(self.password_file, 'w') as f:
-                f.write(password_hash)
+            self.settings_store.set('password_hash', password_hash)
                 
             self.is_authenticated = True
             dialog.close()
@@ -598,17 +1024,20 @@ class Browser(QMainWindow):
             
     def initialize_browser(self):
         """初始化浏览器界面"""
-        # 检查是否有密码错误标记文件
-        if os.path.exists('password_error.txt'):
-            from PyQt6.QtWidgets import QMessageBox
+        # 检查是否有密码错误标记
+        if self.settings_store.get('password_error'):
             QMessageBox.information(self, "提示", "您连续三次密码错误，浏览记录已清除", QMessageBox.StandardButton.Ok)
-            os.remove('password_error.txt')
+            self.settings_store.set('password_error', False)
             
         # 保留cookie设置
         if hasattr(self, 'browser') and self.browser:
             settings = self.browser.page().profile().settings()
             settings.setAttribute(QWebEngineSettings.WebAttribute.PersistentCookies, True)
             
+        if self.fast_startup:
+            # 窗口样式会在构造函数中统一设置，这里不再重复应用
+            return
+            
         self.setWindowTitle("GFY浏览器")
         self.setWindowIcon(QIcon("icon.ico"))
         self.resize(1280, 720)
@@ -634,7 +1063,7 @@ class Browser(QMainWindow):
                 border: 1px solid #ddd;
                 border-radius: 4px;
             }
-            QListWidget {
+            QListView {
                 border: 1px solid #ddd;
                 background-color: white;
             }
@@ -645,34 +1074,69 @@ class Browser(QMainWindow):
         """)
         
     def take_screenshot(self):
-        """截图当前浏览器窗口并保存为PNG文件"""
-        screen = QApplication.primaryScreen()
-        if screen:
-            pixmap = screen.grabWindow(self.winId())
-            
-            # 创建screenshot文件夹如果不存在
-            screenshot_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'screenshots')
-            if not os.path.exists(screenshot_dir):
-                os.makedirs(screenshot_dir)
-            
-            # 获取保存路径，默认保存到screenshots文件夹
-            default_path = os.path.join(screenshot_dir, 'screenshot.png')
-            file_path, _ = QFileDialog.getSaveFileName(
-                self, "保存截图", 
-                default_path, 
-                "PNG 图片 (*.png);;所有文件 (*)"
-            )
+        """截取当前标签页的网页内容（可选整页），编码和写文件在线程池中进行"""
+        if self.settings_store.get('screenshot_full_page'):
+            # 整页截图需要滚动页面，同一时间只进行一个
+            if getattr(self, 'full_page_capture', None) is not None:
+                self.show_screenshot_message("正在截取整页，请稍候")
+                return
+            self.full_page_capture = FullPageCapture(self.browser, self)
+            self.full_page_capture.finished.connect(self.on_full_page_captured)
+            self.full_page_capture.failed.connect(self.on_full_page_capture_failed)
+            self.full_page_capture.start()
+        else:
+            image = self.browser.grab().toImage()
+            self.save_screenshot(lambda: image)
             
-            if file_path:
-                if not file_path.endswith('.png'):
-                    file_path += '.png'
-                pixmap.save(file_path, 'PNG')
-                QMessageBox.information(self, "成功", f"截图已保存到 {file_path}")
+    def on_full_page_captured(self, render):
+        self.full_page_capture.deleteLater()
+        self.full_page_capture = None
+        self.save_screenshot(render)
+        
+    def on_full_page_capture_failed(self, reason):
+        self.full_page_capture.deleteLater()
+        self.full_page_capture = None
+        logger.warning(f"整页截图已中止: {reason}")
+        self.show_screenshot_message(f"整页截图已中止: {reason}")
+        
+    def save_screenshot(self, render):
+        """render在后台线程中返回QImage；连拍模式自动命名，不弹出对话框"""
+        image_format = self.settings_store.get('screenshot_format')
+        if image_format not in SCREENSHOT_FORMATS:
+            image_format = 'png'
+        extension = SCREENSHOT_FORMATS[image_format][1]
+        screenshot_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'screenshots')
+        
+        if self.settings_store.get('screenshot_burst'):
+            if not hasattr(self, 'screenshot_counter'):
+                self.screenshot_counter = itertools.count(1)
+            file_path = os.path.join(
+                screenshot_dir, f"screenshot_{datetime.now():%Y%m%d_%H%M%S}_{next(self.screenshot_counter):04d}{extension}")
         else:
-            QMessageBox.warning(self, "错误", "无法获取屏幕信息")
+            os.makedirs(screenshot_dir, exist_ok=True)
+            file_path, _ = QFileDialog.getSaveFileName(
+                self, "保存截图",
+                os.path.join(screenshot_dir, 'screenshot' + extension),
+                f"{image_format.upper()} 图片 (*{extension});;所有文件 (*)"
+            )
+            if not file_path:
+                return
+            if not os.path.splitext(file_path)[1]:
+                file_path += extension
+                
+        quality = self.settings_store.get('screenshot_quality')
+        run_in_background(lambda: encode_screenshot(render(), file_path, image_format, quality),
+                          lambda path: self.show_screenshot_message(f"截图已保存到 {path}"),
+                          lambda error: (self.log_error(f"保存截图失败: {error}"),
+                                         self.show_screenshot_message("截图保存失败")))
+        
+    def show_screenshot_message(self, text):
+        """在截图按钮下方短暂提示，不打断操作"""
+        QToolTip.showText(self.screenshot_btn.mapToGlobal(QPoint(0, self.screenshot_btn.height())), text,
+                          self.screenshot_btn)
             
     def show_settings_dialog(self):
-        from PyQt6.QtWidgets import QDialog, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QCheckBox, QTextEdit
+        from PyQt6.QtWidgets import QDialog, QLabel, QLineEdit, QPushButton, QVBoxLayout, QHBoxLayout, QCheckBox, QTextEdit, QComboBox, QSpinBox
         
         dialog = QDialog(self)
         dialog.setWindowTitle("浏览器设置")
@@ -698,11 +1162,11 @@ class Browser(QMainWindow):
         
         # 起始页设置
         homepage_label = QLabel("起始页URL:")
-        self.homepage_edit = QLineEdit(self.homepage_url)
+        self.homepage_edit = QLineEdit(self.settings_store.get('homepage'))
         
         # 下载路径设置
         download_label = QLabel("下载文件夹:")
-        self.download_dir_edit = QLineEdit(getattr(self, 'download_dir', 'download'))
+        self.download_dir_edit = QLineEdit(self.settings_store.get('download_dir'))
         browse_btn = QPushButton("浏览...")
         browse_btn.clicked.connect(self.browse_download_dir)
         
@@ -710,19 +1174,143 @@ class Browser(QMainWindow):
         download_layout.addWidget(self.download_dir_edit)
         download_layout.addWidget(browse_btn)
         
+        self.download_concurrent_spin = QSpinBox()
+        self.download_concurrent_spin.setRange(1, 16)
+        self.download_concurrent_spin.setPrefix("同时下载: ")
+        self.download_concurrent_spin.setValue(self.settings_store.get('download_max_concurrent'))
+        self.download_auto_save_checkbox = QCheckBox("自动保存到下载文件夹（不弹出对话框）")
+        self.download_auto_save_checkbox.setChecked(self.settings_store.get('download_auto_save'))
+        download_options_layout = QHBoxLayout()
+        download_options_layout.addWidget(self.download_concurrent_spin)
+        download_options_layout.addWidget(self.download_auto_save_checkbox)
+        
         # 静音模式设置
         self.mute_checkbox = QCheckBox("静音模式")
-        self.mute_checkbox.setChecked(getattr(self, 'is_muted', False))
+        self.mute_checkbox.setChecked(self.settings_store.get('muted'))
+        
+        # 缓存设置
+        cache_label = QLabel("网页缓存:")
+        self.cache_type_combo = QComboBox()
+        for cache_type, name in HTTP_CACHE_TYPE_NAMES.items():
+            self.cache_type_combo.addItem(name, cache_type)
+        self.cache_type_combo.setCurrentIndex(
+            max(0, self.cache_type_combo.findData(self.settings_store.get('http_cache_type'))))
+        self.cache_size_spin = QSpinBox()
+        self.cache_size_spin.setRange(0, 10240)
+        self.cache_size_spin.setSuffix(" MB")
+        self.cache_size_spin.setSpecialValueText("自动")
+        self.cache_size_spin.setValue(self.settings_store.get('http_cache_size_mb'))
+        self.cache_usage_label = QLabel("已用: 计算中...")
+        self.cache_warmup_checkbox = QCheckBox("启动后预热起始页和常用收藏")
+        self.cache_warmup_checkbox.setChecked(self.settings_store.get('cache_warmup'))
+        
+        cache_layout = QHBoxLayout()
+        cache_layout.addWidget(self.cache_type_combo)
+        cache_layout.addWidget(self.cache_size_spin)
+        cache_layout.addWidget(self.cache_usage_label)
+        
+        # 在后台统计缓存目录大小，避免阻塞对话框
+        cache_path = self.profile.cachePath()
+        usage_label = self.cache_usage_label
+        run_in_background(lambda: directory_size(cache_path),
+                          lambda size: usage_label.setText(f"已用: {size / (1024 * 1024):.1f} MB"))
+        
+        # 截图设置
+        screenshot_label = QLabel("截图:")
+        self.screenshot_format_combo = QComboBox()
+        for image_format in available_screenshot_formats():
+            self.screenshot_format_combo.addItem(image_format.upper(), image_format)
+        self.screenshot_format_combo.setCurrentIndex(
+            max(0, self.screenshot_format_combo.findData(self.settings_store.get('screenshot_format'))))
+        self.screenshot_quality_spin = QSpinBox()
+        self.screenshot_quality_spin.setRange(-1, 100)
+        self.screenshot_quality_spin.setPrefix("质量 ")
+        self.screenshot_quality_spin.setSpecialValueText("默认质量")
+        self.screenshot_quality_spin.setValue(self.settings_store.get('screenshot_quality'))
+        self.screenshot_full_page_checkbox = QCheckBox("整页截图")
+        self.screenshot_full_page_checkbox.setChecked(self.settings_store.get('screenshot_full_page'))
+        self.screenshot_burst_checkbox = QCheckBox("连拍模式（自动保存到screenshots，不弹出对话框）")
+        self.screenshot_burst_checkbox.setChecked(self.settings_store.get('screenshot_burst'))
+        
+        screenshot_layout = QHBoxLayout()
+        screenshot_layout.addWidget(self.screenshot_format_combo)
+        screenshot_layout.addWidget(self.screenshot_quality_spin)
+        screenshot_layout.addWidget(self.screenshot_full_page_checkbox)
+        
+        # 预加载设置
+        self.prerender_checkbox = QCheckBox("预加载地址栏首选项和悬停的收藏/历史")
+        self.prerender_checkbox.setChecked(self.settings_store.get('prerender_enabled'))
+        prerender_stats_label = QLabel(self.prerender_manager.stats_text())
+        self.adblock_checkbox = QCheckBox(
+            f"拦截广告和跟踪器（{self.settings_store.get('adblock_dir')} 目录，已加载 {self.adblock_service.rule_count()} 条规则）")
+        self.adblock_checkbox.setChecked(self.settings_store.get('adblock_enabled'))
+        self.restore_session_checkbox = QCheckBox("启动时恢复上次打开的标签页（只加载当前标签页）")
+        self.restore_session_checkbox.setChecked(self.settings_store.get('restore_session'))
+        self.page_index_checkbox = QCheckBox("索引访问过的页面正文，用于历史记录搜索")
+        self.page_index_checkbox.setChecked(self.settings_store.get('page_index_enabled'))
+        self.video_popout_checkbox = QCheckBox("视频开始播放时改用本地播放器弹出播放（Ctrl+Shift+V手动弹出）")
+        self.video_popout_checkbox.setChecked(self.settings_store.get('video_popout'))
+        self.memory_monitor_checkbox = QCheckBox("监控渲染进程内存，超出预算时自动回收")
+        self.memory_monitor_checkbox.setChecked(self.settings_store.get('memory_monitor_enabled'))
+        self.memory_budget_spin = QSpinBox()
+        self.memory_budget_spin.setRange(0, 65536)
+        self.memory_budget_spin.setSingleStep(256)
+        self.memory_budget_spin.setPrefix("预算 ")
+        self.memory_budget_spin.setSuffix(" MB")
+        self.memory_budget_spin.setSpecialValueText("不限制")
+        self.memory_budget_spin.setValue(self.settings_store.get('tab_memory_budget_mb'))
+        memory_layout = QHBoxLayout()
+        memory_layout.addWidget(self.memory_monitor_checkbox)
+        memory_layout.addWidget(self.memory_budget_spin)
+        
+        # 性能预设（Chromium参数只能在启动时传入）
+        preset_label = QLabel(f"性能预设（重启后生效，当前: {PERFORMANCE_PRESETS[ACTIVE_PRESET]['label']}）:")
+        self.performance_preset_combo = QComboBox()
+        for name, preset in PERFORMANCE_PRESETS.items():
+            self.performance_preset_combo.addItem(preset['label'], name)
+        self.performance_preset_combo.setCurrentIndex(
+            max(0, self.performance_preset_combo.findData(self.settings_store.get('performance_preset'))))
+        
+        # 历史记录保留策略
+        history_label = QLabel("历史记录:")
+        self.history_retention_spin = QSpinBox()
+        self.history_retention_spin.setRange(0, 36500)
+        self.history_retention_spin.setPrefix("保留 ")
+        self.history_retention_spin.setSuffix(" 天")
+        self.history_retention_spin.setSpecialValueText("永久保留")
+        self.history_retention_spin.setValue(self.settings_store.get('history_retention_days'))
+        self.history_max_spin = QSpinBox()
+        self.history_max_spin.setRange(0, 10_000_000)
+        self.history_max_spin.setSingleStep(10000)
+        self.history_max_spin.setPrefix("最多 ")
+        self.history_max_spin.setSuffix(" 条")
+        self.history_max_spin.setSpecialValueText("不限条数")
+        self.history_max_spin.setValue(self.settings_store.get('history_max_entries'))
+        compact_btn = QPushButton("立即整理")
+        compact_result_label = QLabel()
+        compact_btn.clicked.connect(lambda: (compact_result_label.setText("整理中..."),
+                                             self.compact_history(compact_result_label.setText)))
+        
+        history_layout = QHBoxLayout()
+        history_layout.addWidget(self.history_retention_spin)
+        history_layout.addWidget(self.history_max_spin)
+        history_layout.addWidget(compact_btn)
         
         # 错误日志设置
         error_log_label = QLabel("错误日志:")
         self.error_log_text = QTextEdit()
         self.error_log_text.setReadOnly(True)
+        # 直接显示内存中最近的警告和错误，不读取文件
+        self.error_log_text.setPlainText('\n'.join(
+            format_log_entry(entry) for entry in reversed(LOG_BUFFER.recent(logging.WARNING, 50))))
         
         error_log_btn_layout = QHBoxLayout()
         view_error_btn = QPushButton("查看错误日志")
         view_error_btn.clicked.connect(lambda: self.show_error_log_window())
         error_log_btn_layout.addWidget(view_error_btn)
+        performance_btn = QPushButton("页面加载性能")
+        performance_btn.clicked.connect(lambda: PerformancePanel(self.page_telemetry, dialog).exec())
+        error_log_btn_layout.addWidget(performance_btn)
         
         # 修改密码设置
         change_pass_btn = QPushButton("修改密码")
@@ -736,8 +1324,30 @@ class Browser(QMainWindow):
         layout.addSpacing(10)
         layout.addWidget(download_label)
         layout.addLayout(download_layout)
+        layout.addLayout(download_options_layout)
         layout.addSpacing(10)
         layout.addWidget(self.mute_checkbox)
+        layout.addWidget(self.restore_session_checkbox)
+        layout.addWidget(self.page_index_checkbox)
+        layout.addWidget(self.video_popout_checkbox)
+        layout.addLayout(memory_layout)
+        layout.addWidget(preset_label)
+        layout.addWidget(self.performance_preset_combo)
+        layout.addSpacing(10)
+        layout.addWidget(cache_label)
+        layout.addLayout(cache_layout)
+        layout.addWidget(self.cache_warmup_checkbox)
+        layout.addWidget(self.prerender_checkbox)
+        layout.addWidget(prerender_stats_label)
+        layout.addWidget(self.adblock_checkbox)
+        layout.addSpacing(10)
+        layout.addWidget(screenshot_label)
+        layout.addLayout(screenshot_layout)
+        layout.addWidget(self.screenshot_burst_checkbox)
+        layout.addSpacing(10)
+        layout.addWidget(history_label)
+        layout.addLayout(history_layout)
+        layout.addWidget(compact_result_label)
         layout.addSpacing(10)
         layout.addWidget(error_log_label)
         layout.addWidget(self.error_log_text)
@@ -749,25 +1359,81 @@ class Browser(QMainWindow):
         dialog.setLayout(layout)
         dialog.exec()
         
+    def show_downloads_panel(self):
+        if not hasattr(self, 'downloads_panel'):
+            self.downloads_panel = DownloadsPanel(self.download_manager, self)
+        self.downloads_panel.show()
+        self.downloads_panel.raise_()
+        
     def show_error_log_window(self):
-        dialog = QDialog(self)
-        dialog.setWindowTitle("错误日志")
-        dialog.resize(800, 600)
+        LogViewer(self).exec()
         
-        layout = QVBoxLayout()
+    def archive_current_page(self):
+        if self.browser is not None:
+            self.show_archive_message("正在存档...")
+            self.page_archiver.save(self.browser.page())
+            
+    def on_page_archived(self, result):
+        self.show_archive_message(
+            f"已存档 {result['title'] or result['url']}：{result['parts']} 个资源，"
+            f"新增 {result['new_objects']} 个（{format_bytes(result['new_bytes'])}）")
+            
+    def show_archive_message(self, text):
+        QToolTip.showText(self.archive_btn.mapToGlobal(QPoint(0, self.archive_btn.height())), text,
+                          self.archive_btn)
         
-        text_edit = QTextEdit()
-        text_edit.setReadOnly(True)
+    def on_video_detected(self, view, url):
+        if self.settings_store.get('video_popout') and is_direct_media_url(url):
+            self.pop_out_video(view)
+            
+    def pop_out_video(self, view=None):
+        """暂停页面中正在播放的视频，改用本地播放器在独立窗口中从同一进度继续播放"""
+        view = view or self.browser
+        url = view.video_url if view is not None else None
+        if not url:
+            self.show_video_message("当前页面没有正在播放的视频")
+            return
+        if not is_direct_media_url(url):
+            self.show_video_message("该视频以流媒体方式播放，只能在页面中观看")
+            return
+        view.page().runJavaScript(VIDEO_POPOUT_SCRIPT % json.dumps(url),
+                                  lambda state: self.on_video_paused(view, url, state))
         
-        try:
-            with open(self.error_log_file, 'r', encoding='utf-8') as f:
-                text_edit.setPlainText(f.read())
-        except Exception as e:
-            text_edit.setPlainText(f"无法加载错误日志: {e}")
+    def on_video_paused(self, view, url, state):
+        if not state:
+            self.show_video_message("页面中找不到该视频")
+            return
+        # 页面内播放的开销：从开始播放到弹出期间渲染进程的CPU占用，以及页面报告的丢帧
+        elapsed = time.monotonic() - view.video_started if view.video_started is not None else 0
+        cpu_now = read_process_cpu(view.page().renderProcessPid())
+        cpu_percent = None
+        if elapsed > 0 and cpu_now is not None and view.video_cpu_start is not None:
+            cpu_percent = round((cpu_now - view.video_cpu_start) / elapsed * 100, 1)
+        page_stats = {'seconds': round(elapsed, 1), 'cpu_percent': cpu_percent,
+                      'frames': state.get('total'), 'dropped': state.get('dropped')}
+        if self.video_popout is not None:
+            self.video_popout.close()
+        muted = view.page().isAudioMuted() or bool(state.get('muted'))
+        self.video_popout = VideoPopout(get_media_service(), view, url, state, page_stats, muted)
+        self.video_popout.closed.connect(self.on_video_popout_closed)
+        self.video_popout.show()
+        logger.info("视频改用本地播放器播放", extra={'url': url, 'page': page_stats})
         
-        layout.addWidget(text_edit)
-        dialog.setLayout(layout)
-        dialog.exec()
+    def on_video_popout_closed(self):
+        if self.video_popout is self.sender():
+            self.video_popout = None
+            
+    def show_video_message(self, text):
+        QToolTip.showText(self.url_bar.mapToGlobal(QPoint(0, self.url_bar.height())), text, self.url_bar)
+        
+    def show_archive_panel(self):
+        ArchivePanel(self.archive_store, self.open_archived_page, self).exec()
+        
+    def open_archived_page(self, snapshot_id):
+        """在新标签页中打开存档，MHTML内的资源全部来自本地，不访问网络"""
+        run_in_background(lambda: self.archive_store.open_path(snapshot_id),
+                          lambda path: self.add_tab(QUrl.fromLocalFile(path).toString()),
+                          lambda error: self.show_archive_message(f"打开存档失败: {error}"))
         
     def browse_download_dir(self):
         from PyQt6.QtWidgets import QFileDialog
@@ -811,8 +1477,7 @@ class Browser(QMainWindow):
     def change_password(self, dialog, parent_dialog):
         # 验证当前密码
         try:
-            with open(self.password_file, 'r') as f:
-                stored_hash = f.read().strip()
+            stored_hash = self.settings_store.get('password_hash')
                 
             input_hash = hashlib.sha256(self.current_pass_input.text().encode()).hexdigest()
             
@@ -831,8 +1496,7 @@ class Browser(QMainWindow):
                 
             # 更新密码
             new_hash = hashlib.sha256(self.new_pass_input.text().encode()).hexdigest()
-            with open(self.password_file, 'w') as f:
-                f.write(new_hash)
+            self.settings_store.set('password_hash', new_hash)
                 
             QMessageBox.information(self, "成功", "密码修改成功！")
             dialog.close()
@@ -847,175 +1511,375 @@ class Browser(QMainWindow):
         if not url.startswith('http'):
             url = 'http://' + url
             
-        self.homepage_url = url
-        
-        # 保存下载路径
-        download_dir = self.download_dir_edit.text()
-        self.download_dir = download_dir
-        
-        # 保存静音设置
-        is_muted = self.mute_checkbox.isChecked()
-        self.is_muted = is_muted
-        self.browser.page().setAudioMuted(is_muted)
-        
         try:
-            # 保存起始页配置
-            with open('homepage.txt', 'w') as f:
-                f.write(url)
-                
-            # 保存下载路径配置
-            with open('download_dir.txt', 'w') as f:
-                f.write(download_dir)
-                
-            # 保存静音配置
-            with open('mute.txt', 'w') as f:
-                f.write('1' if is_muted else '0')
+            # 一次写入全部配置，变更通过setting_changed信号即时生效
+            self.settings_store.update({
+                'homepage': url,
+                'download_dir': self.download_dir_edit.text(),
+                'download_max_concurrent': self.download_concurrent_spin.value(),
+                'download_auto_save': self.download_auto_save_checkbox.isChecked(),
+                'muted': self.mute_checkbox.isChecked(),
+                'restore_session': self.restore_session_checkbox.isChecked(),
+                'page_index_enabled': self.page_index_checkbox.isChecked(),
+                'video_popout': self.video_popout_checkbox.isChecked(),
+                'memory_monitor_enabled': self.memory_monitor_checkbox.isChecked(),
+                'tab_memory_budget_mb': self.memory_budget_spin.value(),
+                'performance_preset': self.performance_preset_combo.currentData() or 'default',
+                'http_cache_type': self.cache_type_combo.currentData(),
+                'http_cache_size_mb': self.cache_size_spin.value(),
+                'cache_warmup': self.cache_warmup_checkbox.isChecked(),
+                'prerender_enabled': self.prerender_checkbox.isChecked(),
+                'adblock_enabled': self.adblock_checkbox.isChecked(),
+                'screenshot_format': self.screenshot_format_combo.currentData() or 'png',
+                'screenshot_quality': self.screenshot_quality_spin.value(),
+                'screenshot_full_page': self.screenshot_full_page_checkbox.isChecked(),
+                'screenshot_burst': self.screenshot_burst_checkbox.isChecked(),
+                'history_retention_days': self.history_retention_spin.value(),
+                'history_max_entries': self.history_max_spin.value(),
+            })
             
             # 检查当前网址是否已收藏
-            try:
-                with open('bookmarks.txt', 'r') as f:
-                    bookmarks = [line.strip() for line in f]
-                    if url in bookmarks:
-                        self.bookmark_btn.setText("★")
-                    else:
-                        self.bookmark_btn.setText("☆")
-            except FileNotFoundError:
-                self.bookmark_btn.setText("☆")
+            self.update_bookmark_star(url)
                 
             dialog.close()
         except Exception as e:
-            print(f"保存设置时出错: {e}")
+            logger.error(f"保存设置时出错: {e}")
             
-class WebEngineView(QWebEngineView):
-    def __init__(self, parent=None):
-        super().__init__(parent)
+    def on_setting_changed(self, key, value):
+        """配置变更（包括外部编辑settings.json）时即时应用"""
+        if key == 'muted':
+            for index in range(self.tabs.count()):
+                self.tabs.widget(index).page().setAudioMuted(value)
+            if self.video_popout is not None:
+                self.video_popout.media_service.audio_output.setMuted(value)
+        elif key in ('http_cache_type', 'http_cache_size_mb'):
+            apply_cache_settings(self.profile, self.settings_store)
+        elif key == 'prerender_enabled' and not value:
+            self.prerender_manager.cancel_all()
+        elif key == 'download_max_concurrent':
+            self.download_manager.start_queued()
+        elif key == 'session_save_interval_s':
+            self.session_manager.update_interval()
+        elif key in ('memory_monitor_enabled', 'memory_sample_interval_s'):
+            self.memory_monitor.update_interval()
+            if not self.memory_monitor.timer.isActive():
+                self.memory_label.clear()
+            
+# 性能预设：Chromium命令行参数在QApplication创建前通过环境变量传入，页面属性在每个页面创建时应用
+PERFORMANCE_PRESETS = {
+    'default': {
+        'label': "默认",
+        'flags': (),
+        'attributes': {},
+    },
+    'low-memory': {
+        'label': "低内存（同站点共用进程，限制渲染进程数）",
+        'flags': ('--process-per-site', '--renderer-process-limit=2', '--enable-low-end-device-mode'),
+        'attributes': {
+            QWebEngineSettings.WebAttribute.ScrollAnimatorEnabled: False,
+            QWebEngineSettings.WebAttribute.Accelerated2dCanvasEnabled: False,
+            QWebEngineSettings.WebAttribute.WebGLEnabled: False,
+        },
+    },
+    'software-raster': {
+        'label': "软件光栅化（无GPU的瘦客户机）",
+        'flags': ('--disable-gpu', '--disable-gpu-compositing', '--num-raster-threads=2',
+                  '--disable-smooth-scrolling'),
+        'attributes': {
+            QWebEngineSettings.WebAttribute.ScrollAnimatorEnabled: False,
+            QWebEngineSettings.WebAttribute.Accelerated2dCanvasEnabled: False,
+            QWebEngineSettings.WebAttribute.WebGLEnabled: False,
+        },
+    },
+    'throughput': {
+        'label': "高吞吐（GPU光栅化，更多光栅线程）",
+        'flags': ('--enable-gpu-rasterization', '--ignore-gpu-blocklist', '--num-raster-threads=4'),
+        'attributes': {},
+    },
+}
+ACTIVE_PRESET = 'default'
+
+
+def apply_performance_preset(name):
+    """启用性能预设，必须在创建QApplication之前调用；环境变量中已有的参数保留在后面，可覆盖预设"""
+    global ACTIVE_PRESET
+    if name not in PERFORMANCE_PRESETS:
+        logger.warning(f"未知的性能预设: {name}，使用默认设置")
+        name = 'default'
+    if QApplication.instance() is not None:
+        logger.warning("QApplication已创建，Chromium参数要到下次启动才生效", extra={'preset': name})
+    flags = list(PERFORMANCE_PRESETS[name]['flags'])
+    existing = os.environ.get('QTWEBENGINE_CHROMIUM_FLAGS', '').strip()
+    if existing:
+        flags.append(existing)
+    if flags:
+        os.environ['QTWEBENGINE_CHROMIUM_FLAGS'] = ' '.join(flags)
+    ACTIVE_PRESET = name
+    logger.info(f"性能预设: {name}", extra={'preset': name, 'chromium_flags': ' '.join(flags)})
+
+
+def configure_page_settings(page):
+    """为标签页和后台页面应用统一的页面设置"""
+    settings = page.settings()
+    # 启用安全相关设置
+    settings.setAttribute(QWebEngineSettings.WebAttribute.HyperlinkAuditingEnabled, False)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.AllowRunningInsecureContent, False)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessRemoteUrls, False)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessFileUrls, False)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.AllowGeolocationOnInsecureOrigins, False)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.AllowWindowActivationFromJavaScript, False)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanOpenWindows, False)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanAccessClipboard, False)
+    
+    # 保留必要的功能设置
+    settings.setAttribute(QWebEngineSettings.WebAttribute.ScrollAnimatorEnabled, True)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.Accelerated2dCanvasEnabled, True)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.PlaybackRequiresUserGesture, True)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.WebRTCPublicInterfacesOnly, True)
+    
+    # 增强HTML5视频播放支持
+    settings.setAttribute(QWebEngineSettings.WebAttribute.PlaybackRequiresUserGesture, False)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.AutoLoadIconsForPage, True)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanOpenWindows, True)
+    settings.setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanAccessClipboard, True)
+    # 媒体源扩展支持已被移除，因当前PyQt6版本不支持该属性
+    # 媒体编解码器支持已被移除，因当前PyQt6版本不支持该属性
+    # MediaStreamEnabled属性在当前PyQt6版本中不可用
+    
+    # 启用WebGL支持
+    settings.setAttribute(QWebEngineSettings.WebAttribute.WebGLEnabled, True)
+    # 启用视频轨道支持
+    settings.setAttribute(QWebEngineSettings.WebAttribute.AllowWindowActivationFromJavaScript, True)
+    # 启用全屏API
+    settings.setAttribute(QWebEngineSettings.WebAttribute.FullScreenSupportEnabled, True)
+    # 启用屏幕捕捉API
+    settings.setAttribute(QWebEngineSettings.WebAttribute.ScreenCaptureEnabled, True)
+    
+    # 性能预设可以关闭加速画布、WebGL等在没有GPU时反而更慢的功能
+    for attribute, enabled in PERFORMANCE_PRESETS[ACTIVE_PRESET]['attributes'].items():
+        settings.setAttribute(attribute, enabled)
+
+
+SCRIPT_INJECTION_POINTS = {
+    'document_creation': QWebEngineScript.InjectionPoint.DocumentCreation,
+    'document_ready': QWebEngineScript.InjectionPoint.DocumentReady,
+    'deferred': QWebEngineScript.InjectionPoint.Deferred,
+}
+SCRIPT_WORLDS = {
+    'main': QWebEngineScript.ScriptWorldId.MainWorld,
+    'application': QWebEngineScript.ScriptWorldId.ApplicationWorld,
+}
+# 页面脚本与浏览器之间的通道所在的隔离环境，页面自身的脚本无法访问
+BRIDGE_WORLD = QWebEngineScript.ScriptWorldId.ApplicationWorld
+
+# 建立QWebChannel连接；连接建立前的回报先排队。没有通道的页面（如批量渲染）直接丢弃回报
+BRIDGE_SCRIPT = """
+(function() {
+    var queue = [];
+    window.gfyReport = function(method, value) {
+        if (window.gfyBridge) {
+            window.gfyBridge[method](value);
+        } else if (queue) {
+            queue.push([method, value]);
+        }
+    };
+    if (typeof qt === 'undefined' || !qt.webChannelTransport) {
+        queue = null;
+        return;
+    }
+    new QWebChannel(qt.webChannelTransport, function(channel) {
+        window.gfyBridge = channel.objects.gfyBridge;
+        queue.forEach(function(item) {
+            window.gfyBridge[item[0]](item[1]);
+        });
+        queue = null;
+    });
+})();
+"""
+
+# play事件不冒泡，需要在捕获阶段监听
+VIDEO_PLAY_SCRIPT = """
+document.addEventListener('play', function(e) {
+    if (e.target instanceof HTMLVideoElement) {
+        gfyReport('videoPlayed', e.target.currentSrc);
+    }
+}, true);
+"""
+
+# 只有页面中有视频时才回报，普通页面没有任何往返
+VIDEO_SCAN_SCRIPT = """
+(function() {
+    var videos = document.getElementsByTagName('video');
+    if (videos.length) {
+        gfyReport('reportVideos', Array.prototype.map.call(videos, function(video) {
+            return {src: video.currentSrc || video.src, readyState: video.readyState};
+        }));
+    }
+})();
+"""
+
+# 弹出播放：找到正在播放该地址的视频，记下进度、音量和丢帧统计后暂停（参数为JSON编码的地址）
+VIDEO_POPOUT_SCRIPT = """
+(function(src) {
+    var videos = document.getElementsByTagName('video');
+    for (var i = 0; i < videos.length; i++) {
+        var video = videos[i];
+        if (video.currentSrc !== src) {
+            continue;
+        }
+        var quality = video.getVideoPlaybackQuality ? video.getVideoPlaybackQuality() : null;
+        video.pause();
+        return {
+            time: video.currentTime,
+            muted: video.muted,
+            volume: video.volume,
+            dropped: quality ? quality.droppedVideoFrames : null,
+            total: quality ? quality.totalVideoFrames : null
+        };
+    }
+    return null;
+})(%s)
+"""
+
+# 关闭弹出窗口时把播放进度写回页面中的视频（参数为地址和秒数）
+VIDEO_SYNC_SCRIPT = """
+(function(src, time) {
+    var videos = document.getElementsByTagName('video');
+    for (var i = 0; i < videos.length; i++) {
+        if (videos[i].currentSrc === src) {
+            videos[i].currentTime = time;
+        }
+    }
+})(%s, %f)
+"""
+
+
+def read_qwebchannel_js():
+    """Qt自带的qwebchannel.js（编译在Qt资源中）"""
+    qfile = QFile(":/qtwebchannel/qwebchannel.js")
+    if not qfile.open(QIODevice.OpenModeFlag.ReadOnly):
+        logger.error("无法读取qwebchannel.js，注入脚本将无法回报结果")
+        return ""
+    try:
+        return bytes(qfile.readAll()).decode('utf-8')
+    finally:
+        qfile.close()
+
+
+class ScriptRegistry:
+    """按名称登记注入脚本，通过QWebEngineScriptCollection在每个profile上只安装一次"""
+    
+    def __init__(self):
+        self.scripts = {}
         
-        # 初始化媒体播放器
-        self.media_player = QMediaPlayer()
-        self.audio_output = QAudioOutput()
-        self.media_player.setAudioOutput(self.audio_output)
-        self.video_widget = QVideoWidget()
-        self.media_player.setVideoOutput(self.video_widget)
+    def register(self, name, source, injection_point='document_creation', world='application', subframes=False):
+        script = QWebEngineScript()
+        script.setName(name)
+        script.setSourceCode(source)
+        script.setInjectionPoint(SCRIPT_INJECTION_POINTS[injection_point])
+        script.setWorldId(SCRIPT_WORLDS[world])
+        script.setRunsOnSubFrames(subframes)
+        self.scripts[name] = script
         
-        # 检查多媒体后端支持
-        if not self.media_player.isAvailable():
-            print("警告: 系统缺少必要的多媒体后端支持，请安装GStreamer或DirectShow")
-        else:
-            print("多媒体后端支持正常")
-        # 启用安全相关设置
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.HyperlinkAuditingEnabled, False)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.AllowRunningInsecureContent, False)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessRemoteUrls, False)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.LocalContentCanAccessFileUrls, False)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.AllowGeolocationOnInsecureOrigins, False)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.AllowWindowActivationFromJavaScript, False)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanOpenWindows, False)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanAccessClipboard, False)
-        
-        # 保留必要的功能设置
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.ScrollAnimatorEnabled, True)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.Accelerated2dCanvasEnabled, True)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.PlaybackRequiresUserGesture, True)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.WebRTCPublicInterfacesOnly, True)
-        
-        # 增强HTML5视频播放支持
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.PlaybackRequiresUserGesture, False)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.AutoLoadIconsForPage, True)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanOpenWindows, True)
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.JavascriptCanAccessClipboard, True)
-        # 媒体源扩展支持已被移除，因当前PyQt6版本不支持该属性
-        # 媒体编解码器支持已被移除，因当前PyQt6版本不支持该属性
-        # MediaStreamEnabled属性在当前PyQt6版本中不可用
-        
-        # 设置视频元素处理
-        self.page().runJavaScript("""
-            document.addEventListener('play', function(e) {
-                if(e.target.tagName.toLowerCase() === 'video') {
-                    window.videoUrl = e.target.currentSrc;
-                }
-            });
-        """)
+    def install(self, profile):
+        """同名脚本先移除再插入，重复安装不会叠加"""
+        collection = profile.scripts()
+        for name, script in self.scripts.items():
+            for existing in collection.find(name):
+                collection.remove(existing)
+            collection.insert(script)
+
+
+def create_script_registry():
+    registry = ScriptRegistry()
+    registry.register('gfy_bridge', read_qwebchannel_js() + BRIDGE_SCRIPT)
+    registry.register('gfy_video_play', VIDEO_PLAY_SCRIPT)
+    registry.register('gfy_video_scan', VIDEO_SCAN_SCRIPT, injection_point='document_ready')
+    return registry
+
+
+class PageBridge(QObject):
+    """注册到页面QWebChannel中的对象，接收注入脚本的回报"""
+    
+    video_played = pyqtSignal(str)
+    videos_reported = pyqtSignal(list)
+    
+    @pyqtSlot(str)
+    def videoPlayed(self, url):
+        self.video_played.emit(url)
         
-        # 通过JavaScript监听视频播放事件
-        self.page().runJavaScript("""
-            document.addEventListener('play', function(e) {
-                if(e.target.tagName.toLowerCase() === 'video') {
-                    window.videoUrl = e.target.currentSrc;
-                    console.log('视频播放:', window.videoUrl);
-                }
-            });
-        """)
-        # 启用WebGL支持
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.WebGLEnabled, True)
-        # 启用视频轨道支持
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.AllowWindowActivationFromJavaScript, True)
-        # 启用全屏API
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.FullScreenSupportEnabled, True)
-        # 启用屏幕捕捉API
-        self.settings().setAttribute(QWebEngineSettings.WebAttribute.ScreenCaptureEnabled, True)
+    @pyqtSlot('QVariantList')
+    def reportVideos(self, videos):
+        self.videos_reported.emit(list(videos))
+
+
+def page_bridge(page):
+    """返回页面的PageBridge，没有时创建并设置QWebChannel；需要在页面开始加载前调用"""
+    bridge = page.findChild(PageBridge)
+    if bridge is None:
+        bridge = PageBridge(page)
+        channel = QWebChannel(page)
+        channel.registerObject('gfyBridge', bridge)
+        page.setWebChannel(channel, BRIDGE_WORLD)
+    return bridge
+
+
+class WebEngineView(QWebEngineView):
+    # 页面中的视频开始播放时发出，参数为视频地址
+    video_detected = pyqtSignal(str)
+    
+    def __init__(self, parent=None, settings_store=None, profile=None, browser_window=None):
+        super().__init__(parent)
+        self.settings_store = settings_store if settings_store is not None else SettingsStore()
+        self.browser_window = browser_window
+        self.load_started = None
+        self.first_progress = None
+        self.video_url = None
+        self.videos = []
+        # 视频开始播放的时间和当时渲染进程的CPU时间，用于统计页面内播放的开销
+        self.video_started = None
+        self.video_cpu_start = None
+        # 恢复会话时的占位信息和待恢复的滚动位置
+        self.session_tab = None
+        self.pending_scroll = None
+        # 每个标签页拥有自己的页面，共享同一个profile（cookie、缓存）
+        if profile is not None:
+            self.setPage(QWebEnginePage(profile, self))
         
-        # 错误处理
-        self.page().featurePermissionRequested.connect(self.handle_feature_permission)
-        self.page().loadFinished.connect(self.on_load_finished)
+        configure_page_settings(self.page())
+        # 视频监听等脚本由profile上的ScriptRegistry注入，这里只接收回报
+        self.connect_page(self.page())
         
-        # 设置下载管理器
-        self.page().profile().downloadRequested.connect(self.on_download_requested)
+    def connect_page(self, page):
+        bridge = page_bridge(page)
+        bridge.video_played.connect(self.on_video_played)
+        bridge.videos_reported.connect(self.on_videos_reported)
+        # 错误处理
+        page.featurePermissionRequested.connect(self.handle_feature_permission)
+        page.loadStarted.connect(self.on_load_started)
+        page.loadProgress.connect(self.on_load_progress)
+        page.loadFinished.connect(self.on_load_finished)
         
         # 初始化静音状态
-        try:
-            with open('mute.txt', 'r') as f:
-                is_muted = f.read().strip() == '1'
-                self.page().setAudioMuted(is_muted)
-        except FileNotFoundError:
-            self.page().setAudioMuted(False)
-        
-    def on_download_requested(self, download):
-        # 获取下载文件名
-        file_name = download.url().fileName()
-        if not file_name:
-            file_name = "download_" + str(int(time.time()))
-            
-        # 确保下载目录存在
-        import os
-        try:
-            with open('download_dir.txt', 'r') as f:
-                download_dir = f.read().strip()
-                if not download_dir:
-                    download_dir = "download"
-        except FileNotFoundError:
-            download_dir = "download"
-            
-        if not os.path.exists(download_dir):
-            os.makedirs(download_dir)
-            
-        # 设置默认保存路径
-        default_path = os.path.join(download_dir, file_name)
+        page.setAudioMuted(self.settings_store.get('muted'))
         
-        # 弹出保存文件对话框
-        file_path, _ = QFileDialog.getSaveFileName(
-            self, "保存文件", default_path, "All Files (*.*)")
-            
-        if file_path:
-            # 设置保存路径
-            download.setPath(file_path)
-            # 接受下载
-            download.accept()
-            
-            # 显示下载进度
-            download.downloadProgress.connect(lambda bytes_received, bytes_total: 
-                print(f"下载进度: {bytes_received}/{bytes_total}"))
-            download.finished.connect(lambda: print("下载完成"))
-        else:
-            download.cancel()
+    def adopt_page(self, page):
+        """换上一个已在后台加载好的页面（预渲染命中），原页面随后释放"""
+        old_page = self.page()
+        page.setParent(self)
+        self.setPage(page)
+        self.connect_page(page)
+        if old_page is not None and old_page.parent() is self:
+            old_page.deleteLater()
         
     def createWindow(self, type):
-        # 处理新窗口/标签页的创建请求
-        if type == QWebEnginePage.WebWindowType.WebBrowserTab or \
-           type == QWebEnginePage.WebWindowType.WebBrowserWindow:
-            # 获取当前浏览器实例
-            browser_window = self.parent().parent().parent()
-            # 在当前窗口中加载新URL
-            return browser_window.browser
+        # 处理新窗口/标签页的创建请求，在新标签页中打开
+        if self.browser_window is not None and type in (
+                QWebEnginePage.WebWindowType.WebBrowserTab,
+                QWebEnginePage.WebWindowType.WebBrowserWindow,
+                QWebEnginePage.WebWindowType.WebBrowserBackgroundTab):
+            background = type == QWebEnginePage.WebWindowType.WebBrowserBackgroundTab
+            return self.browser_window.add_tab(background=background)
         return super().createWindow(type)
         
     def handle_feature_permission(self, securityOrigin, feature):
@@ -1030,23 +1894,4608 @@ class WebEngineView(QWebEngineView):
         """处理视频播放请求(已弃用)"""
         pass
             
+    def on_load_started(self):
+        self.load_started = time.monotonic()
+        self.first_progress = None
+        
+    def on_load_progress(self, progress):
+        if self.first_progress is None and self.load_started is not None and progress > 0:
+            self.first_progress = time.monotonic()
+            
     def on_load_finished(self, ok):
         if not ok:
-            print(f"页面加载失败，请检查网络连接或URL是否正确")
-        # 检查视频元素并打印状态
-        self.page().runJavaScript("""
-            var videos = document.getElementsByTagName('video');
-            for (var i = 0; i < videos.length; i++) {
-                console.log('视频状态: ' + videos[i].readyState);
-            }
-        """)
+            logger.warning("页面加载失败，请检查网络连接或URL是否正确", extra={'url': self.url().toString()})
+        # 预渲染换上的页面没有经过loadStarted，只记录页面内的计时
+        telemetry = getattr(self.browser_window, 'page_telemetry', None)
+        if telemetry is not None:
+            telemetry.collect(self.page(), ok, self.load_started, self.first_progress)
+        # 正文在页面空闲后才读取，不影响页面交互
+        indexer = getattr(self.browser_window, 'page_indexer', None)
+        if ok and indexer is not None:
+            indexer.capture(self.page())
+        self.load_started = None
+        if ok and self.pending_scroll is not None:
+            self.page().runJavaScript("window.scrollTo(%f, %f);" % self.pending_scroll)
+            self.pending_scroll = None
+        
+    def on_video_played(self, url):
+        self.video_url = url
+        self.video_started = time.monotonic()
+        self.video_cpu_start = read_process_cpu(self.page().renderProcessPid())
+        self.video_detected.emit(url)
+        
+    def on_videos_reported(self, videos):
+        self.videos = videos
+        logger.info(f"页面包含 {len(videos)} 个视频", extra={'url': self.url().toString(), 'videos': videos})
          
 
 
-if __name__ == "__main__":
+class PendingVisit:
+    def __init__(self, url, key, settle_at):
+        self.url = url
+        self.key = key
+        self.title = ''
+        self.visit_time = time.time()
+        self.loaded = False
+        self.settle_at = settle_at
+
+
+class NavigationRecorder(QObject):
+    """每个标签页只连接一次urlChanged/titleChanged/loadFinished，每次提交的导航记录一条访问
+
+    标题在页面加载完成且一段时间不再变化后才确定；同一标签页开始新的导航或关闭时，
+    上一条立即确定。确定的记录攒成一批后一次写入。
+    """
+    
+    visits_committed = pyqtSignal(list)
+    
+    TITLE_SETTLE_MS = 500
+    # 页面迟迟不结束加载时最多等待的时间
+    LOAD_WAIT_MS = 10_000
+    FLUSH_INTERVAL_MS = 1000
+    RECORDED_SCHEMES = ('http', 'https')
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pending = {}
+        self.batch = []
+        # 每个已连接视图的信号连接，断开时使用
+        self.connections = {}
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setInterval(100)
+        self.settle_timer.timeout.connect(self.settle)
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(self.FLUSH_INTERVAL_MS)
+        self.flush_timer.timeout.connect(self.flush)
+        
+    def attach(self, view):
+        """连接标签页的导航信号；重复调用不会叠加连接"""
+        if view in self.connections:
+            return
+        self.connections[view] = [
+            view.urlChanged.connect(lambda url, v=view: self.on_url_changed(v, url)),
+            view.titleChanged.connect(lambda title, v=view: self.on_title_changed(v, title)),
+            view.loadFinished.connect(lambda ok, v=view: self.on_load_finished(v, ok)),
+        ]
+        
+    def detach(self, view):
+        """标签页关闭前调用：立即确定未完成的记录并断开信号，之后迟到的信号不再产生记录"""
+        self.commit(view)
+        for connection in self.connections.pop(view, ()):
+            QObject.disconnect(connection)
+        
+    def on_url_changed(self, view, url):
+        if url.scheme() not in self.RECORDED_SCHEMES:
+            self.commit(view)
+            return
+        # 只改变#片段的页内跳转不算新的访问
+        key = url.adjusted(QUrl.UrlFormattingOption.RemoveFragment).toString()
+        pending = self.pending.get(view)
+        if pending is not None and pending.key == key:
+            return
+        self.commit(view)
+        self.pending[view] = PendingVisit(url.toString(), key, time.monotonic() + self.LOAD_WAIT_MS / 1000)
+        if not self.settle_timer.isActive():
+            self.settle_timer.start()
+            
+    def on_title_changed(self, view, title):
+        pending = self.pending.get(view)
+        if pending is None:
+            return
+        pending.title = title
+        if pending.loaded:
+            pending.settle_at = time.monotonic() + self.TITLE_SETTLE_MS / 1000
+            
+    def on_load_finished(self, view, ok):
+        pending = self.pending.get(view)
+        if pending is None or pending.loaded:
+            return
+        pending.loaded = True
+        pending.settle_at = time.monotonic() + self.TITLE_SETTLE_MS / 1000
+        
+    def settle(self):
+        now = time.monotonic()
+        for view, pending in list(self.pending.items()):
+            if now >= pending.settle_at:
+                self.commit(view)
+        if not self.pending:
+            self.settle_timer.stop()
+            
+    def commit(self, view):
+        pending = self.pending.pop(view, None)
+        if pending is None:
+            return
+        self.batch.append((pending.url, pending.title, pending.visit_time))
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+            
+    def flush(self):
+        if not self.batch:
+            return
+        visits, self.batch = self.batch, []
+        self.visits_committed.emit(visits)
+        
+    def flush_all(self):
+        """退出前确定所有未完成的记录并立即写入"""
+        for view in list(self.pending):
+            self.commit(view)
+        self.flush_timer.stop()
+        self.flush()
+
+
+def format_history_entry(entry):
+    """把历史记录行格式化为侧边栏显示文本"""
+    _, url, title, visit_time = entry
+    if visit_time is None:
+        # 兼容旧格式迁移过来的记录
+        return f"{title} - {url}" if title else url
+    current_time = datetime.fromtimestamp(visit_time).strftime('%Y-%m-%d %H:%M:%S')
+    return f"{current_time} - {title} - {url}"
+
+
+URL_ROLE = Qt.ItemDataRole.UserRole
+
+
+class HistoryListModel(QAbstractListModel):
+    """历史记录侧边栏模型，按从新到旧的顺序分页从数据库拉取"""
+    
+    PAGE_SIZE = 200
+    
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        # 每行只保存数据库原始元组，显示文本在绘制时才生成
+        self.rows = []
+        self.exhausted = False
+        
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+        
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return format_history_entry(row)
+        if role in (URL_ROLE, Qt.ItemDataRole.ToolTipRole):
+            return row[1]
+        return None
+        
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+        
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        before_id = self.rows[-1][0] if self.rows else None
+        page = self.store.fetch_page(before_id, self.PAGE_SIZE)
+        if len(page) < self.PAGE_SIZE:
+            self.exhausted = True
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(page) - 1)
+        self.rows.extend(page)
+        self.endInsertRows()
+        
+    def prepend_visits(self, entries):
+        """新访问记录（按时间顺序）插入到最上方"""
+        if not entries:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(entries) - 1)
+        self.rows[:0] = reversed(entries)
+        self.endInsertRows()
+        
+    def reset(self):
+        """丢弃已加载的行，视图会重新按需拉取"""
+        self.beginResetModel()
+        self.rows = []
+        self.exhausted = False
+        self.endResetModel()
+
+
+class BookmarkListModel(QAbstractListModel):
+    """收藏夹侧边栏模型，按页向视图暴露收藏的URL"""
+    
+    PAGE_SIZE = 200
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.bookmarks = []
+        self.loaded = 0
+        
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.loaded
+        
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, URL_ROLE, Qt.ItemDataRole.ToolTipRole):
+            return self.bookmarks[index.row()]
+        return None
+        
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.loaded < len(self.bookmarks)
+        
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.PAGE_SIZE, len(self.bookmarks) - self.loaded)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+        
+    def set_bookmarks(self, bookmarks):
+        self.beginResetModel()
+        self.bookmarks = list(bookmarks)
+        self.loaded = 0
+        self.endResetModel()
+        
+    def add_bookmark(self, url):
+        self.bookmarks.append(url)
+        # 尚未分页到末尾时，新行会在后续fetchMore中出现
+        if self.loaded == len(self.bookmarks) - 1:
+            self.beginInsertRows(QModelIndex(), self.loaded, self.loaded)
+            self.loaded += 1
+            self.endInsertRows()
+            
+    def remove_bookmark(self, url):
+        try:
+            row = self.bookmarks.index(url)
+        except ValueError:
+            return
+        if row < self.loaded:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.bookmarks[row]
+            self.loaded -= 1
+            self.endRemoveRows()
+        else:
+            del self.bookmarks[row]
+
+
+class BookmarkService(QObject):
+    """收藏夹服务：启动时加载一次，用哈希索引判断是否已收藏，延迟批量写回文件"""
+    
+    bookmark_toggled = pyqtSignal(str, bool)
+    
+    SAVE_DELAY_MS = 500
+    
+    def __init__(self, path='bookmarks.txt', parent=None):
+        super().__init__(parent)
+        self.path = path
+        # dict保持插入顺序，同时提供O(1)的成员判断和删除
+        self.index = {}
+        try:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    lines = f.readlines()
+            except UnicodeDecodeError:
+                with open(path, 'r', encoding='gbk', errors='replace') as f:
+                    lines = f.readlines()
+            for line in lines:
+                url = line.strip()
+                if url:
+                    self.index[url] = None
+        except FileNotFoundError:
+            pass
+            
+        self.dirty = False
+        self.save_timer = QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(self.SAVE_DELAY_MS)
+        self.save_timer.timeout.connect(self.flush)
+        
+    def contains(self, url):
+        return url in self.index
+        
+    def urls(self):
+        return list(self.index)
+        
+    def add(self, url):
+        if url in self.index:
+            return False
+        self.index[url] = None
+        self.schedule_save()
+        self.bookmark_toggled.emit(url, True)
+        return True
+        
+    def remove(self, url):
+        if url not in self.index:
+            return False
+        del self.index[url]
+        self.schedule_save()
+        self.bookmark_toggled.emit(url, False)
+        return True
+        
+    def schedule_save(self):
+        self.dirty = True
+        self.save_timer.start()
+        
+    def flush(self):
+        """写入临时文件后原子替换，避免写到一半时丢失收藏夹"""
+        if not self.dirty:
+            return
+        self.save_timer.stop()
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for url in self.index:
+                    f.write(url + '\n')
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            logger.error(f"保存收藏夹时出错: {e}")
+
+
+class TaskSignals(QObject):
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+
+class BackgroundTask(QRunnable):
+    """在QThreadPool中运行一个函数，结果通过信号回到GUI线程"""
+    
+    # 保存运行中的任务信号对象，防止回调前被回收
+    active = set()
+    
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+        self.signals = TaskSignals()
+        
+    def run(self):
+        try:
+            result = self.fn()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.finished.emit(result)
+
+
+def run_in_background(fn, on_finished=None, on_failed=None):
+    """把fn交给全局线程池执行，完成后在GUI线程调用on_finished(result)"""
+    task = BackgroundTask(fn)
+    signals = task.signals
+    # 回调在GUI线程执行完后再释放信号对象
+    signals.finished.connect(lambda _: BackgroundTask.active.discard(signals))
+    signals.failed.connect(lambda _: BackgroundTask.active.discard(signals))
+    if on_finished is not None:
+        task.signals.finished.connect(on_finished)
+    if on_failed is not None:
+        task.signals.failed.connect(on_failed)
+    BackgroundTask.active.add(signals)
+    QThreadPool.globalInstance().start(task)
+    return signals
+
+
+def directory_size(path):
+    """统计目录下所有文件的总字节数"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+HTTP_CACHE_TYPES = {
+    'disk': QWebEngineProfile.HttpCacheType.DiskHttpCache,
+    'memory': QWebEngineProfile.HttpCacheType.MemoryHttpCache,
+    'none': QWebEngineProfile.HttpCacheType.NoCache,
+}
+
+HTTP_CACHE_TYPE_NAMES = {
+    'disk': "磁盘缓存",
+    'memory': "内存缓存",
+    'none': "不缓存",
+}
+
+
+def apply_cache_settings(profile, settings_store):
+    cache_type = HTTP_CACHE_TYPES.get(settings_store.get('http_cache_type'),
+                                      QWebEngineProfile.HttpCacheType.DiskHttpCache)
+    profile.setHttpCacheType(cache_type)
+    # 0表示由Chromium自动决定缓存大小
+    profile.setHttpCacheMaximumSize(settings_store.get('http_cache_size_mb') * 1024 * 1024)
+
+
+def create_browser_profile(settings_store, parent=None):
+    """创建带持久化存储路径和可配置HTTP缓存的命名profile"""
+    profile = QWebEngineProfile("gfy", parent)
+    storage_path = os.path.abspath('profile')
+    profile.setPersistentStoragePath(storage_path)
+    profile.setCachePath(os.path.join(storage_path, 'cache'))
+    profile.setPersistentCookiesPolicy(QWebEngineProfile.PersistentCookiesPolicy.AllowPersistentCookies)
+    apply_cache_settings(profile, settings_store)
+    return profile
+
+
+class CacheWarmer(QObject):
+    """空闲时在隐藏页面中依次加载URL，把页面资源预先写入HTTP缓存"""
+    
+    START_DELAY_MS = 5000
+    PAGE_TIMEOUT_MS = 15000
+    
+    finished = pyqtSignal(int)
+    
+    def __init__(self, profile, urls, parent=None):
+        super().__init__(parent)
+        self.profile = profile
+        # 去重并保持顺序
+        self.urls = list(dict.fromkeys(url for url in urls if url))
+        self.loaded = 0
+        self.page = None
+        # 正在加载的URL；为None时收到的loadFinished都是已放弃的加载发出的，不推进队列
+        self.current = None
+        self.timeout_timer = QTimer(self)
+        self.timeout_timer.setSingleShot(True)
+        self.timeout_timer.timeout.connect(self.on_timeout)
+        
+    def start(self):
+        self.load_next()
+        
+    def create_page(self):
+        page = QWebEnginePage(self.profile, self)
+        page.setAudioMuted(True)
+        page.loadFinished.connect(self.on_load_finished)
+        return page
+        
+    def on_load_finished(self, ok):
+        if self.current is None:
+            return
+        self.timeout_timer.stop()
+        if ok:
+            self.loaded += 1
+        self.load_next()
+        
+    def on_timeout(self):
+        logger.warning(f"预热缓存超时，跳过: {self.current}")
+        # 停止并丢弃卡住的页面，被中止的加载发出的loadFinished不会影响下一个URL
+        self.discard_page()
+        self.load_next()
+        
+    def discard_page(self):
+        if self.page is None:
+            return
+        self.page.loadFinished.disconnect(self.on_load_finished)
+        self.page.triggerAction(QWebEnginePage.WebAction.Stop)
+        self.page.deleteLater()
+        self.page = None
+        
+    def load_next(self):
+        self.current = None
+        if not self.urls:
+            self.timeout_timer.stop()
+            self.discard_page()
+            self.finished.emit(self.loaded)
+            return
+        if self.page is None:
+            self.page = self.create_page()
+        self.current = self.urls.pop(0)
+        self.page.load(QUrl(self.current))
+        self.timeout_timer.start(self.PAGE_TIMEOUT_MS)
+
+
+DOWNLOAD_STATE_NAMES = {
+    QWebEngineDownloadRequest.DownloadState.DownloadRequested: "等待",
+    QWebEngineDownloadRequest.DownloadState.DownloadInProgress: "下载中",
+    QWebEngineDownloadRequest.DownloadState.DownloadCompleted: "已完成",
+    QWebEngineDownloadRequest.DownloadState.DownloadCancelled: "已取消",
+    QWebEngineDownloadRequest.DownloadState.DownloadInterrupted: "失败",
+}
+
+
+class DownloadEntry:
+    """下载管理器中的一项下载及其调度状态"""
+    
+    def __init__(self, download, priority, sequence):
+        self.download = download
+        self.priority = priority
+        self.sequence = sequence
+        self.queued = False
+        self.user_paused = False
+        self.finished = False
+        self.started = time.monotonic()
+        self.last_bytes = 0
+        self.speed = 0.0
+        
+    def __lt__(self, other):
+        # 优先级数值小的先下载，同优先级先进先出
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+        
+    def path(self):
+        return os.path.join(self.download.downloadDirectory(), self.download.downloadFileName())
+        
+    def status_text(self):
+        if self.queued:
+            return "排队中"
+        if self.download.isPaused():
+            return "已暂停"
+        return DOWNLOAD_STATE_NAMES.get(self.download.state(), "")
+
+
+class DownloadManager(QObject):
+    """下载管理：排队、限制同时下载数、按固定频率汇总进度，并记录完成和失败的下载"""
+    
+    progress_updated = pyqtSignal()
+    download_finished = pyqtSignal(object)
+    # QWebEnginePage.save()发起的保存网页请求，不进入下载列表
+    page_save_requested = pyqtSignal(object)
+    
+    REPORT_INTERVAL_MS = 250
+    
+    def __init__(self, settings_store, parent=None, log_path='downloads.txt'):
+        super().__init__(parent)
+        self.settings_store = settings_store
+        self.log_path = log_path
+        self.entries = []
+        self.queue = []
+        self.sequence = itertools.count()
+        self.dirty = False
+        
+        # 进度只在定时器中汇总，下载数量再多也不会刷屏或频繁重绘
+        self.report_timer = QTimer(self)
+        self.report_timer.setInterval(self.REPORT_INTERVAL_MS)
+        self.report_timer.timeout.connect(self.report_progress)
+        
+    def parent_widget(self):
+        return self.parent()
+        
+    def handle_request(self, download, priority=0):
+        if download.isSavePageDownload():
+            # 保存路径已由page.save()指定，不弹出对话框，直接接受
+            self.page_save_requested.emit(download)
+            download.accept()
+            return None
+            
+        file_name = download.downloadFileName() or download.url().fileName()
+        if not file_name:
+            file_name = "download_" + str(int(time.time()))
+            
+        # 确保下载目录存在
+        download_dir = self.settings_store.get('download_dir') or "download"
+        if not os.path.exists(download_dir):
+            os.makedirs(download_dir)
+            
+        if self.settings_store.get('download_auto_save'):
+            file_path = unique_path(os.path.join(download_dir, file_name))
+        else:
+            # 弹出保存文件对话框
+            file_path, _ = QFileDialog.getSaveFileName(
+                self.parent_widget(), "保存文件", os.path.join(download_dir, file_name), "All Files (*.*)")
+            if not file_path:
+                download.cancel()
+                return None
+                
+        download.setDownloadDirectory(os.path.dirname(os.path.abspath(file_path)))
+        download.setDownloadFileName(os.path.basename(file_path))
+        
+        # 必须在信号处理函数中接受下载，超出并发数的先接受再暂停排队
+        entry = DownloadEntry(download, priority, next(self.sequence))
+        if self.active_count() >= self.settings_store.get('download_max_concurrent'):
+            entry.queued = True
+            heapq.heappush(self.queue, entry)
+        self.entries.append(entry)
+        download.stateChanged.connect(lambda state, e=entry: self.on_state_changed(e, state))
+        download.receivedBytesChanged.connect(self.mark_dirty)
+        download.accept()
+        self.mark_dirty()
+        self.report_timer.start()
+        return entry
+        
+    def active_count(self):
+        return sum(1 for e in self.entries
+                   if not e.finished and not e.queued and not e.user_paused)
+        
+    def on_state_changed(self, entry, state):
+        if state == QWebEngineDownloadRequest.DownloadState.DownloadInProgress:
+            if entry.queued and not entry.download.isPaused():
+                entry.download.pause()
+        elif state in (QWebEngineDownloadRequest.DownloadState.DownloadCompleted,
+                       QWebEngineDownloadRequest.DownloadState.DownloadCancelled,
+                       QWebEngineDownloadRequest.DownloadState.DownloadInterrupted):
+            if entry.finished:
+                return
+            entry.finished = True
+            if entry.queued:
+                entry.queued = False
+                self.queue.remove(entry)
+                heapq.heapify(self.queue)
+            self.record(entry)
+            self.download_finished.emit(entry)
+            self.start_queued()
+        self.mark_dirty()
+        
+    def start_queued(self):
+        """空出名额后按优先级恢复排队中的下载"""
+        limit = self.settings_store.get('download_max_concurrent')
+        while self.queue and self.active_count() < limit:
+            entry = heapq.heappop(self.queue)
+            entry.queued = False
+            if entry.download.isPaused():
+                entry.download.resume()
+        self.mark_dirty()
+        
+    def pause(self, entry):
+        if entry.finished or entry.queued:
+            return
+        entry.user_paused = True
+        entry.download.pause()
+        self.start_queued()
+        
+    def resume(self, entry):
+        if entry.finished or not entry.user_paused:
+            return
+        entry.user_paused = False
+        if self.active_count() > self.settings_store.get('download_max_concurrent'):
+            # 没有空闲名额时回到队列
+            entry.queued = True
+            heapq.heappush(self.queue, entry)
+        else:
+            entry.download.resume()
+        self.mark_dirty()
+        
+    def cancel(self, entry):
+        if not entry.finished:
+            entry.download.cancel()
+            
+    def mark_dirty(self, *args):
+        self.dirty = True
+        
+    def report_progress(self):
+        if not self.dirty:
+            if all(e.finished for e in self.entries):
+                self.report_timer.stop()
+            return
+        self.dirty = False
+        interval = self.REPORT_INTERVAL_MS / 1000
+        for entry in self.entries:
+            received = entry.download.receivedBytes()
+            entry.speed = max(0, received - entry.last_bytes) / interval
+            entry.last_bytes = received
+        self.progress_updated.emit()
+        
+    def totals(self):
+        """返回(已接收字节, 总字节, 进行中数量, 排队数量)"""
+        running = [e for e in self.entries if not e.finished]
+        received = sum(e.download.receivedBytes() for e in running)
+        total = sum(max(0, e.download.totalBytes()) for e in running)
+        queued = sum(1 for e in running if e.queued)
+        return received, total, len(running) - queued, queued
+        
+    def record(self, entry):
+        """把完成或失败的下载追加到下载记录文件"""
+        download = entry.download
+        state = DOWNLOAD_STATE_NAMES.get(download.state(), "")
+        reason = download.interruptReasonString() if state == "失败" else ""
+        current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(f"{download.url().toString()}||{entry.path()}||{state}||{reason}||{current_time}\n")
+        except OSError as e:
+            logger.error(f"保存下载记录时出错: {e}")
+
+
+def unique_path(path):
+    """文件已存在时在文件名后追加序号"""
+    if not os.path.exists(path):
+        return path
+    base, ext = os.path.splitext(path)
+    for i in itertools.count(1):
+        candidate = f"{base} ({i}){ext}"
+        if not os.path.exists(candidate):
+            return candidate
+
+
+def format_bytes(size):
+    if size < 1024:
+        return f"{size} B"
+    for unit in ('KB', 'MB', 'GB'):
+        size /= 1024
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}"
+
+
+class DownloadsPanel(QDialog):
+    """下载列表窗口，随下载管理器的定时汇总刷新"""
+    
+    def __init__(self, manager, parent=None):
+        super().__init__(parent)
+        self.manager = manager
+        self.setWindowTitle("下载")
+        self.resize(700, 400)
+        
+        layout = QVBoxLayout()
+        self.summary_label = QLabel()
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["文件", "进度", "速度", "状态"])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        
+        button_layout = QHBoxLayout()
+        pause_btn = QPushButton("暂停")
+        resume_btn = QPushButton("继续")
+        cancel_btn = QPushButton("取消")
+        pause_btn.clicked.connect(lambda: self.apply_to_selected(manager.pause))
+        resume_btn.clicked.connect(lambda: self.apply_to_selected(manager.resume))
+        cancel_btn.clicked.connect(lambda: self.apply_to_selected(manager.cancel))
+        button_layout.addWidget(pause_btn)
+        button_layout.addWidget(resume_btn)
+        button_layout.addWidget(cancel_btn)
+        
+        layout.addWidget(self.summary_label)
+        layout.addWidget(self.table)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+        
+        manager.progress_updated.connect(self.refresh)
+        manager.download_finished.connect(lambda entry: self.refresh())
+        self.refresh()
+        
+    def apply_to_selected(self, action):
+        for index in self.table.selectionModel().selectedRows():
+            if index.row() < len(self.manager.entries):
+                action(self.manager.entries[index.row()])
+                
+    def refresh(self):
+        # 窗口隐藏时不刷新，显示时在showEvent中补上
+        if not self.isVisible():
+            return
+        received, total, running, queued = self.manager.totals()
+        percent = f"{received * 100 // total}%" if total else "-"
+        self.summary_label.setText(f"进行中: {running}  排队: {queued}  总进度: {percent}")
+        
+        self.table.setRowCount(len(self.manager.entries))
+        for row, entry in enumerate(self.manager.entries):
+            download = entry.download
+            total_bytes = download.totalBytes()
+            if total_bytes > 0:
+                progress = f"{download.receivedBytes() * 100 // total_bytes}% / {format_bytes(total_bytes)}"
+            else:
+                progress = format_bytes(download.receivedBytes())
+            speed = f"{format_bytes(int(entry.speed))}/s" if not entry.finished and not entry.queued else ""
+            values = [download.downloadFileName(), progress, speed, entry.status_text()]
+            for column, value in enumerate(values):
+                item = self.table.item(row, column)
+                if item is None:
+                    self.table.setItem(row, column, QTableWidgetItem(value))
+                elif item.text() != value:
+                    item.setText(value)
+                    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+
+
+# 已经压缩过的资源直接保存，不再用zlib压缩
+ARCHIVE_RAW_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/avif', 'font/woff',
+                     'font/woff2', 'application/font-woff', 'video/', 'audio/', 'application/zip')
+# 重建MHTML时保留的资源头，Content-Transfer-Encoding统一重写为base64
+ARCHIVE_PART_HEADERS = ('Content-Type', 'Content-ID', 'Content-Location')
+
+
+def parse_mhtml(data):
+    """把MHTML拆成(根头部列表, [(资源头部列表, 解码后的内容)])"""
+    message = email.message_from_bytes(data, policy=email.policy.compat32)
+    root_headers = [(name, value) for name, value in message.items() if name.lower() != 'content-type']
+    root_headers.append(('Content-Type', f'multipart/related; type="{message.get_param("type") or "text/html"}"'))
+    parts = []
+    for part in message.walk():
+        if part.is_multipart():
+            continue
+        headers = [(name, part[name]) for name in ARCHIVE_PART_HEADERS if part[name] is not None]
+        parts.append((headers, part.get_payload(decode=True) or b''))
+    return root_headers, parts
+
+
+def build_mhtml(root_headers, parts):
+    """由头部和内容重新生成MHTML，资源一律使用base64编码，分隔符不会与内容冲突"""
+    boundary = f"----MultipartBoundary--{hashlib.sha1(os.urandom(16)).hexdigest()}----"
+    lines = []
+    for name, value in root_headers:
+        if name == 'Content-Type':
+            value = f'{value}; boundary="{boundary}"'
+        lines.append(f"{name}: {value}".encode('utf-8'))
+    chunks = [b'\r\n'.join(lines), b'\r\n\r\n']
+    for headers, body in parts:
+        chunks.append(f"--{boundary}\r\n".encode('ascii'))
+        for name, value in headers:
+            chunks.append(f"{name}: {value}\r\n".encode('utf-8'))
+        chunks.append(b"Content-Transfer-Encoding: base64\r\n\r\n")
+        chunks.append(base64.encodebytes(body).replace(b'\n', b'\r\n'))
+        chunks.append(b'\r\n')
+    chunks.append(f"--{boundary}--\r\n".encode('ascii'))
+    return b''.join(chunks)
+
+
+class ArchiveStore:
+    """离线页面存档：MHTML按资源拆开，按内容的SHA-256去重并压缩保存，索引记录在SQLite中；供后台线程调用，内部加锁"""
+    
+    # 打开存档时重建的MHTML按最近使用保留，总大小超过上限时删除最久未用的
+    OPEN_CACHE_MAX_BYTES = 64 * 1024 * 1024
+    
+    def __init__(self, root='archive'):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.open_dir = os.path.join(root, 'open')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(root, 'index.db'), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                title TEXT NOT NULL DEFAULT '',
+                saved_at REAL NOT NULL,
+                headers TEXT NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS snapshot_parts (
+                snapshot_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                PRIMARY KEY (snapshot_id, position)
+            )
+        """)
+        # refs为引用该资源的次数，降为0时删除文件
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS objects (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL,
+                compressed INTEGER NOT NULL,
+                refs INTEGER NOT NULL
+            )
+        """)
+        self.conn.commit()
+        self.evict_open_cache()
+        
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+        
+    def write_object(self, digest, body, content_type):
+        """资源不存在时写入文件，返回(存储大小, 是否压缩)"""
+        compressed = not content_type.startswith(ARCHIVE_RAW_TYPES)
+        data = zlib.compress(body, 6) if compressed else body
+        if compressed and len(data) >= len(body):
+            data, compressed = body, False
+        path = self.object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        return len(data), compressed
+        
+    def read_object(self, digest, compressed):
+        with open(self.object_path(digest), 'rb') as f:
+            data = f.read()
+        return zlib.decompress(data) if compressed else data
+        
+    def ingest(self, mhtml_path, url, title):
+        """导入page.save()生成的MHTML文件（导入后删除），返回本次存档的统计"""
+        with open(mhtml_path, 'rb') as f:
+            data = f.read()
+        root_headers, parts = parse_mhtml(data)
+        hashed = [(headers, body, hashlib.sha256(body).hexdigest()) for headers, body in parts]
+        new_objects = new_bytes = 0
+        with self.lock:
+            known = set()
+            digests = list({digest for _, _, digest in hashed})
+            for i in range(0, len(digests), 500):
+                batch = digests[i:i + 500]
+                known.update(row[0] for row in self.conn.execute(
+                    f"SELECT digest FROM objects WHERE digest IN ({','.join('?' * len(batch))})", batch))
+            # 先写文件再提交索引，中途失败最多留下未被引用的文件
+            stored = {}
+            for headers, body, digest in hashed:
+                if digest in known or digest in stored:
+                    continue
+                content_type = dict(headers).get('Content-Type', '').split(';')[0].strip().lower()
+                stored[digest] = (len(body),) + self.write_object(digest, body, content_type)
+                new_objects += 1
+                new_bytes += len(body)
+            with self.conn:
+                snapshot_id = self.conn.execute(
+                    "INSERT INTO snapshots (url, title, saved_at, headers, size) VALUES (?, ?, ?, ?, ?)",
+                    (url, title, time.time(), json.dumps(root_headers, ensure_ascii=False), len(data))).lastrowid
+                self.conn.executemany(
+                    "INSERT INTO snapshot_parts (snapshot_id, position, headers, digest) VALUES (?, ?, ?, ?)",
+                    [(snapshot_id, position, json.dumps(headers, ensure_ascii=False), digest)
+                     for position, (headers, _, digest) in enumerate(hashed)])
+                self.conn.executemany(
+                    "INSERT INTO objects (digest, size, stored_size, compressed, refs) VALUES (?, ?, ?, ?, 0)",
+                    [(digest, size, stored_size, int(compressed))
+                     for digest, (size, stored_size, compressed) in stored.items()])
+                self.conn.executemany("UPDATE objects SET refs = refs + 1 WHERE digest = ?",
+                                      [(digest,) for _, _, digest in hashed])
+        os.remove(mhtml_path)
+        return {'id': snapshot_id, 'url': url, 'title': title, 'parts': len(parts),
+                'new_objects': new_objects, 'bytes': sum(len(body) for _, body, _ in hashed), 'new_bytes': new_bytes}
+        
+    def open_path(self, snapshot_id):
+        """返回可直接加载的MHTML文件路径；由资源重建后放入大小有上限的打开缓存，缓存中已有时直接复用"""
+        path = os.path.join(self.open_dir, f"{snapshot_id}.mhtml")
+        if os.path.exists(path):
+            # 修改时间记录最近一次使用，淘汰时按它排序
+            os.utime(path)
+            return path
+        with self.lock:
+            row = self.conn.execute("SELECT headers FROM snapshots WHERE id = ?", (snapshot_id,)).fetchone()
+            if row is None:
+                raise KeyError(snapshot_id)
+            parts = [(json.loads(headers), self.read_object(digest, compressed))
+                     for headers, digest, compressed in self.conn.execute(
+                         "SELECT p.headers, p.digest, o.compressed FROM snapshot_parts p "
+                         "JOIN objects o ON o.digest = p.digest WHERE p.snapshot_id = ? ORDER BY p.position",
+                         (snapshot_id,))]
+        os.makedirs(self.open_dir, exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(build_mhtml(json.loads(row[0]), parts))
+        os.replace(tmp_path, path)
+        # 刚重建的文件马上要加载，不参与淘汰
+        self.evict_open_cache(keep=path)
+        return path
+        
+    def open_cache_files(self):
+        """打开缓存中的文件[(最近使用时间, 大小, 路径)]"""
+        try:
+            names = os.listdir(self.open_dir)
+        except FileNotFoundError:
+            return []
+        files = []
+        for name in names:
+            if not name.endswith('.mhtml'):
+                continue
+            path = os.path.join(self.open_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+        
+    def evict_open_cache(self, keep=None):
+        files = sorted(self.open_cache_files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.OPEN_CACHE_MAX_BYTES:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        
+    def snapshots(self):
+        """从新到旧返回[(id, url, title, saved_at, size)]"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT id, url, title, saved_at, size FROM snapshots ORDER BY id DESC").fetchall()
+                
+    def delete(self, snapshot_id):
+        """删除存档，不再被任何存档引用的资源文件一并删除"""
+        with self.lock:
+            with self.conn:
+                digests = [row[0] for row in self.conn.execute(
+                    "SELECT digest FROM snapshot_parts WHERE snapshot_id = ?", (snapshot_id,))]
+                self.conn.executemany("UPDATE objects SET refs = refs - 1 WHERE digest = ?",
+                                      [(digest,) for digest in digests])
+                orphans = [row[0] for row in self.conn.execute("SELECT digest FROM objects WHERE refs <= 0")]
+                self.conn.execute("DELETE FROM objects WHERE refs <= 0")
+                self.conn.execute("DELETE FROM snapshot_parts WHERE snapshot_id = ?", (snapshot_id,))
+                self.conn.execute("DELETE FROM snapshots WHERE id = ?", (snapshot_id,))
+        for digest in orphans:
+            try:
+                os.remove(self.object_path(digest))
+            except OSError:
+                pass
+        cached = os.path.join(self.open_dir, f"{snapshot_id}.mhtml")
+        if os.path.exists(cached):
+            os.remove(cached)
+            
+    def report(self):
+        """存储统计：logical为各存档原始资源之和，unique为去重后大小，stored为压缩后资源的占用，open_cache为打开缓存的占用"""
+        with self.lock:
+            snapshots, mhtml = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM snapshots").fetchone()
+            logical = self.conn.execute(
+                "SELECT COALESCE(SUM(o.size), 0) FROM snapshot_parts p JOIN objects o ON o.digest = p.digest"
+            ).fetchone()[0]
+            objects, unique, stored = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM objects").fetchone()
+        open_cache = sum(size for _, size, _ in self.open_cache_files())
+        return {
+            'snapshots': snapshots,
+            'objects': objects,
+            'mhtml_bytes': mhtml,
+            'logical_bytes': logical,
+            'unique_bytes': unique,
+            'stored_bytes': stored,
+            'open_cache_bytes': open_cache,
+            'dedup_ratio': logical / unique if unique else 1.0,
+            'compression_ratio': unique / stored if stored else 1.0,
+        }
+        
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def format_archive_report(report):
+    return (f"{report['snapshots']} 个存档，{report['objects']} 个资源；原始 {format_bytes(report['logical_bytes'])}，"
+            f"去重后 {format_bytes(report['unique_bytes'])}（去重比 {report['dedup_ratio']:.2f}），"
+            f"压缩后占用 {format_bytes(report['stored_bytes'])}（压缩比 {report['compression_ratio']:.2f}），"
+            f"打开缓存 {format_bytes(report['open_cache_bytes'])}")
+
+
+class PageArchiver(QObject):
+    """用QWebEnginePage.save()保存MHTML，下载完成后在后台线程导入ArchiveStore"""
+    
+    archived = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.incoming_dir = os.path.join(store.root, 'incoming')
+        # 保存路径 -> (url, 标题)
+        self.pending = {}
+        
+    def save(self, page):
+        url = page.url().toString()
+        if not url or url.startswith('file:'):
+            self.failed.emit("当前页面不能存档")
+            return
+        os.makedirs(self.incoming_dir, exist_ok=True)
+        path = os.path.abspath(os.path.join(self.incoming_dir, f"{time.time_ns()}.mhtml"))
+        self.pending[path] = (url, page.title())
+        page.save(path, QWebEngineDownloadRequest.SavePageFormat.MimeHtmlSaveFormat)
+        
+    def handle_download(self, download):
+        """由DownloadManager转交的保存网页请求"""
+        path = os.path.abspath(os.path.join(download.downloadDirectory(), download.downloadFileName()))
+        if path not in self.pending:
+            return False
+        download.stateChanged.connect(lambda state, p=path, d=download: self.on_state_changed(p, d, state))
+        return True
+        
+    def on_state_changed(self, path, download, state):
+        if state == QWebEngineDownloadRequest.DownloadState.DownloadCompleted:
+            url, title = self.pending.pop(path)
+            run_in_background(lambda: self.store.ingest(path, url, title), self.on_ingested,
+                              lambda error: self.on_failed(url, error))
+        elif state in (QWebEngineDownloadRequest.DownloadState.DownloadCancelled,
+                       QWebEngineDownloadRequest.DownloadState.DownloadInterrupted):
+            url, _ = self.pending.pop(path, ('', ''))
+            self.on_failed(url, download.interruptReasonString())
+            
+    def on_ingested(self, result):
+        logger.info("页面已存档", extra=result)
+        self.archived.emit(result)
+        
+    def on_failed(self, url, error):
+        logger.error(f"页面存档失败: {error}", extra={'url': url})
+        self.failed.emit(str(error))
+
+
+class ArchivePanel(QDialog):
+    """离线存档列表：打开、删除存档并显示去重统计"""
+    
+    def __init__(self, store, open_callback, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.open_callback = open_callback
+        self.setWindowTitle("离线存档")
+        self.resize(800, 400)
+        
+        layout = QVBoxLayout()
+        self.report_label = QLabel()
+        self.report_label.setWordWrap(True)
+        self.table = QTableWidget(0, 4)
+        self.table.setHorizontalHeaderLabels(["标题", "网址", "保存时间", "大小"])
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.table.doubleClicked.connect(lambda index: self.open_selected())
+        
+        button_layout = QHBoxLayout()
+        open_btn = QPushButton("打开")
+        delete_btn = QPushButton("删除")
+        open_btn.clicked.connect(self.open_selected)
+        delete_btn.clicked.connect(self.delete_selected)
+        button_layout.addWidget(open_btn)
+        button_layout.addWidget(delete_btn)
+        
+        layout.addWidget(self.report_label)
+        layout.addWidget(self.table)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+        self.refresh()
+        
+    def selected_ids(self):
+        return [self.snapshots[index.row()][0] for index in self.table.selectionModel().selectedRows()]
+        
+    def refresh(self):
+        self.snapshots = self.store.snapshots()
+        self.report_label.setText(format_archive_report(self.store.report()))
+        self.table.setRowCount(len(self.snapshots))
+        for row, (_, url, title, saved_at, size) in enumerate(self.snapshots):
+            values = [title, url, datetime.fromtimestamp(saved_at).strftime('%Y-%m-%d %H:%M:%S'), format_bytes(size)]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+                
+    def open_selected(self):
+        for snapshot_id in self.selected_ids():
+            self.open_callback(snapshot_id)
+        self.accept()
+        
+    def delete_selected(self):
+        for snapshot_id in self.selected_ids():
+            self.store.delete(snapshot_id)
+        self.refresh()
+
+
+SCREENSHOT_FORMATS = {'png': ('PNG', '.png'), 'jpeg': ('JPEG', '.jpg'), 'webp': ('WEBP', '.webp')}
+
+
+def available_screenshot_formats():
+    """只列出当前Qt图像插件支持写入的格式"""
+    supported = {bytes(name).decode().lower() for name in QImageWriter.supportedImageFormats()}
+    return [key for key in SCREENSHOT_FORMATS if key in supported or (key == 'jpeg' and 'jpg' in supported)]
+
+
+def stitch_screenshot(tiles, total_height):
+    """把逐屏截取的图块按滚动位置拼成整页图片；tiles为[(滚动位置, QImage, 视口高度)]，位置和高度单位为CSS像素"""
+    first = tiles[0][1]
+    ratio = first.devicePixelRatio()
+    # 页面缩放时CSS像素与窗口坐标不一致，用第一块的尺寸换算
+    scale = (first.height() / ratio) / tiles[0][2]
+    image = QImage(first.width(), int(total_height * scale * ratio), QImage.Format.Format_RGB32)
+    image.setDevicePixelRatio(ratio)
+    image.fill(Qt.GlobalColor.white)
+    painter = QPainter(image)
+    for offset, tile, _ in tiles:
+        painter.drawImage(QPoint(0, int(offset * scale)), tile)
+    painter.end()
+    return image
+
+
+def encode_screenshot(image, path, image_format, quality=-1):
+    """在线程池中编码并写入图片，quality为-1时使用格式默认值"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if not image.save(path, SCREENSHOT_FORMATS[image_format][0], quality):
+        raise OSError(f"无法保存截图 {path}")
+    return path
+
+
+class FullPageCapture(QObject):
+    """逐屏滚动截取整个页面，完成后发出可在后台线程执行的拼接函数
+
+    每一步都有超时；页面跳转、标签页关闭或超时都会中止截图并发出failed，之后的回调一律忽略。
+    """
+    
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    
+    SETTLE_MS = 120
+    STEP_TIMEOUT_MS = 5000
+    MAX_HEIGHT = 16384
+    
+    def __init__(self, view, parent=None):
+        super().__init__(parent)
+        self.view = view
+        self.tiles = []
+        self.offsets = []
+        self.restore_position = (0, 0)
+        self.total_height = 0
+        self.viewport_height = 0
+        self.done = False
+        # 脚本回调迟迟不来（渲染进程卡住、页面被替换）时由看门狗结束截图
+        self.watchdog = QTimer(self)
+        self.watchdog.setSingleShot(True)
+        self.watchdog.setInterval(self.STEP_TIMEOUT_MS)
+        self.watchdog.timeout.connect(lambda: self.abort("页面长时间没有响应"))
+        view.destroyed.connect(self.on_view_destroyed)
+        view.loadStarted.connect(self.on_load_started)
+        
+    def start(self):
+        self.watchdog.start()
+        self.view.page().runJavaScript(
+            "[window.scrollX, window.scrollY, document.documentElement.scrollHeight, window.innerHeight]",
+            self.on_metrics)
+        
+    def on_metrics(self, metrics):
+        if self.done:
+            return
+        if metrics and metrics[3]:
+            scroll_x, scroll_y, scroll_height, viewport_height = (int(value) for value in metrics)
+            self.restore_position = (scroll_x, scroll_y)
+            self.viewport_height = viewport_height
+            self.total_height = min(scroll_height, self.MAX_HEIGHT)
+            self.offsets = list(range(0, self.total_height, viewport_height))
+        if not self.offsets:
+            # 取不到页面尺寸或页面高度为0时退回可见区域截图
+            image = self.view.grab().toImage()
+            self.finish(lambda: image)
+            return
+        self.scroll_next()
+        
+    def scroll_next(self):
+        if len(self.tiles) >= len(self.offsets):
+            self.restore_scroll()
+            tiles, total_height = self.tiles, self.total_height
+            self.finish(lambda: stitch_screenshot(tiles, total_height))
+            return
+        offset = self.offsets[len(self.tiles)]
+        self.watchdog.start()
+        # 最后一屏会被浏览器限制在最大滚动位置，按实际位置拼接
+        self.view.page().runJavaScript(
+            f"window.scrollTo(0, {offset}); window.scrollY",
+            lambda actual: QTimer.singleShot(self.SETTLE_MS, lambda: self.grab_tile(actual)))
+        
+    def grab_tile(self, actual_offset):
+        if self.done:
+            return
+        offset = self.offsets[len(self.tiles)] if actual_offset is None else int(actual_offset)
+        self.tiles.append((offset, self.view.grab().toImage(), self.viewport_height))
+        self.scroll_next()
+        
+    def restore_scroll(self):
+        x, y = self.restore_position
+        self.view.page().runJavaScript(f"window.scrollTo({x}, {y})")
+        
+    def finish(self, render):
+        self.stop()
+        self.finished.emit(render)
+        
+    def abort(self, reason):
+        if self.done:
+            return
+        if self.tiles:
+            self.restore_scroll()
+        self.stop()
+        self.failed.emit(reason)
+        
+    def on_load_started(self):
+        self.abort("页面已跳转")
+        
+    def on_view_destroyed(self):
+        # 视图已经释放，不能再访问它
+        if self.done:
+            return
+        self.stop()
+        self.failed.emit("标签页已关闭")
+        
+    def stop(self):
+        self.done = True
+        self.watchdog.stop()
+        try:
+            self.view.destroyed.disconnect(self.on_view_destroyed)
+            self.view.loadStarted.disconnect(self.on_load_started)
+        except (RuntimeError, TypeError):
+            pass
+
+
+class MediaService(QObject):
+    """所有标签页共享的多媒体服务，第一次使用时才导入QtMultimedia并创建播放器"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput, QMediaMetaData
+        from PyQt6.QtMultimediaWidgets import QVideoWidget
+        
+        # 初始化媒体播放器
+        self.media_player = QMediaPlayer(self)
+        self.audio_output = QAudioOutput(self)
+        self.media_player.setAudioOutput(self.audio_output)
+        self.video_widget = QVideoWidget()
+        self.media_player.setVideoOutput(self.video_widget)
+        
+        self.frame_rate_key = QMediaMetaData.Key.VideoFrameRate
+        self.loaded_statuses = (QMediaPlayer.MediaStatus.LoadedMedia, QMediaPlayer.MediaStatus.BufferedMedia)
+        
+        # 统计实际送到画面的帧数，用于估算本地播放的丢帧
+        self.frames = 0
+        self.video_widget.videoSink().videoFrameChanged.connect(self.on_frame)
+        # 媒体加载完成后才能跳转到页面中的进度
+        self.pending_position = None
+        self.media_player.mediaStatusChanged.connect(self.on_media_status_changed)
+        
+        # 检查多媒体后端支持
+        if not self.media_player.isAvailable():
+            logger.warning("系统缺少必要的多媒体后端支持，请安装GStreamer或DirectShow")
+            
+    def on_frame(self, frame):
+        self.frames += 1
+        
+    def play(self, url, position_ms=0, muted=False, volume=1.0):
+        self.media_player.stop()
+        self.audio_output.setMuted(muted)
+        self.audio_output.setVolume(volume)
+        self.pending_position = position_ms
+        self.media_player.setSource(QUrl(url))
+        self.media_player.play()
+        
+    def on_media_status_changed(self, status):
+        if status in self.loaded_statuses and self.pending_position:
+            self.media_player.setPosition(self.pending_position)
+            self.pending_position = None
+            
+    def frame_rate(self):
+        rate = self.media_player.metaData().value(self.frame_rate_key)
+        return float(rate) if rate else None
+
+
+_media_service = None
+
+
+def get_media_service():
+    """返回共享的MediaService，首次调用时创建"""
+    global _media_service
+    if _media_service is None:
+        _media_service = MediaService()
+    return _media_service
+
+
+def is_direct_media_url(url):
+    """本地播放器只能播放可直接请求的媒体地址，MSE等流媒体的blob:地址只存在于页面中"""
+    return bool(url) and url.split(':', 1)[0].lower() in ('http', 'https', 'file')
+
+
+def read_process_cpu(pid):
+    """从/proc读取进程累计使用的CPU时间（秒），读取失败时返回None"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # 进程名可能包含空格，从最后一个')'之后按字段切分
+            fields = f.read().rsplit(')', 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class VideoPopout(QWidget):
+    """在独立窗口中用QMediaPlayer播放页面中的视频，显示两种播放方式的丢帧和CPU统计，关闭时把进度写回页面"""
+    
+    STATS_INTERVAL_MS = 1000
+    
+    closed = pyqtSignal()
+    
+    def __init__(self, media_service, view, url, page_state, page_stats, muted=False):
+        super().__init__()
+        self.setAttribute(Qt.WidgetAttribute.WA_DeleteOnClose)
+        self.setWindowTitle("视频播放")
+        self.resize(960, 600)
+        self.media_service = media_service
+        self.view = view
+        self.url = url
+        self.page_stats = page_stats
+        
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(media_service.video_widget)
+        self.stats_label = QLabel()
+        layout.addWidget(self.stats_label)
+        self.setLayout(layout)
+        media_service.video_widget.show()
+        
+        self.position_start = int(page_state['time'] * 1000)
+        media_service.play(url, self.position_start, muted, page_state.get('volume', 1.0))
+        self.started = time.monotonic()
+        # 本地播放在浏览器进程内解码，用本进程的CPU时间衡量
+        self.cpu_start = time.process_time()
+        self.frames_start = media_service.frames
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.update_stats)
+        self.timer.start(self.STATS_INTERVAL_MS)
+        
+    def native_stats(self):
+        elapsed = time.monotonic() - self.started
+        frames = self.media_service.frames - self.frames_start
+        rate = self.media_service.frame_rate()
+        played = (self.media_service.media_player.position() - self.position_start) / 1000
+        dropped = max(0, round(played * rate) - frames) if rate and played > 0 else None
+        return {
+            'seconds': round(elapsed, 1),
+            'cpu_percent': round((time.process_time() - self.cpu_start) / elapsed * 100, 1) if elapsed else None,
+            'frames': frames,
+            'dropped': dropped,
+        }
+        
+    def update_stats(self):
+        native = self.native_stats()
+        page = self.page_stats
+        def describe(stats):
+            cpu = f"{stats['cpu_percent']}%" if stats['cpu_percent'] is not None else "-"
+            dropped = f"{stats['dropped']}/{stats['frames']}" if stats['dropped'] is not None else "-"
+            return f"CPU {cpu}，丢帧 {dropped}"
+        self.stats_label.setText(f"本地播放: {describe(native)}    页面内播放: {describe(page)}")
+        
+    def closeEvent(self, event):
+        player = self.media_service.media_player
+        position = player.position()
+        native = self.native_stats()
+        player.stop()
+        # 播放器和画面由MediaService共享，不随窗口释放
+        self.layout().removeWidget(self.media_service.video_widget)
+        self.media_service.video_widget.setParent(None)
+        try:
+            self.view.page().runJavaScript(VIDEO_SYNC_SCRIPT % (json.dumps(self.url), position / 1000))
+        except RuntimeError:
+            # 标签页已经关闭
+            pass
+        logger.info("视频弹出播放结束", extra={'url': self.url, 'position_ms': position,
+                                               'page': self.page_stats, 'native': native})
+        self.closed.emit()
+        super().closeEvent(event)
+
+
+class TabLifecycleManager(QObject):
+    """后台标签页生命周期管理：按最近使用顺序先冻结、再丢弃，重新激活时自动恢复"""
+    
+    CHECK_INTERVAL_MS = 10_000
+    
+    def __init__(self, settings_store, parent=None):
+        super().__init__(parent)
+        self.settings_store = settings_store
+        # 按最近激活时间排序，最前面的是最久未使用的标签页
+        self.views = OrderedDict()
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.CHECK_INTERVAL_MS)
+        self.timer.timeout.connect(self.enforce)
+        self.timer.start()
+        
+    def register(self, view):
+        self.views[view] = time.monotonic()
+        self.views.move_to_end(view, last=False)
+        
+    def unregister(self, view):
+        self.views.pop(view, None)
+        
+    def activate(self, view):
+        """切换到标签页时恢复为Active，被丢弃的页面会自动重新加载"""
+        if view not in self.views:
+            return
+        self.views[view] = time.monotonic()
+        self.views.move_to_end(view)
+        page = view.page()
+        if page.lifecycleState() != QWebEnginePage.LifecycleState.Active:
+            page.setLifecycleState(QWebEnginePage.LifecycleState.Active)
+        
+    def is_live(self, view):
+        """尚未加载的会话占位标签页不占用渲染进程，不计入存活数量"""
+        return (view.session_tab is None
+                and view.page().lifecycleState() != QWebEnginePage.LifecycleState.Discarded)
+        
+    def live_count(self):
+        return sum(1 for view in self.views if self.is_live(view))
+        
+    def live_tab_budget(self):
+        """按内存预算估算允许同时存活（未丢弃）的标签页数量，预算为0时不限制"""
+        budget = self.settings_store.get('tab_memory_budget_mb')
+        if budget <= 0:
+            return sys.maxsize
+        estimate = max(1, self.settings_store.get('tab_memory_estimate_mb'))
+        return max(1, budget // estimate)
+        
+    def set_state(self, view, state):
+        """在Qt推荐的范围内切换状态，正在播放音频等情况不会被冻结或丢弃"""
+        page = view.page()
+        if page.isVisible() or state.value > page.recommendedState().value:
+            return False
+        if page.lifecycleState() == state:
+            return False
+        page.setLifecycleState(state)
+        return True
+        
+    def enforce(self):
+        now = time.monotonic()
+        freeze_after = self.settings_store.get('tab_freeze_after_s')
+        views = list(self.views.items())
+        active_view = views[-1][0] if views else None
+        
+        live = [view for view, _ in views if self.is_live(view)]
+        excess = len(live) - self.live_tab_budget()
+        
+        for view, last_active in views:
+            if view is active_view or view.session_tab is not None:
+                continue
+            state = view.page().lifecycleState()
+            if excess > 0 and state != QWebEnginePage.LifecycleState.Discarded:
+                if self.set_state(view, QWebEnginePage.LifecycleState.Discarded):
+                    excess -= 1
+                    continue
+            if state == QWebEnginePage.LifecycleState.Active and now - last_active > freeze_after:
+                self.set_state(view, QWebEnginePage.LifecycleState.Frozen)
+
+
+def read_process_memory(pid):
+    """从/proc读取进程的(RSS, PSS)字节数；内核不提供smaps_rollup时PSS为None，进程已退出时返回None"""
+    rss = pss = None
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Rss:'):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith('Pss:'):
+                    pss = int(line.split()[1]) * 1024
+        return rss, pss
+    except OSError:
+        pass
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024, None
+    except OSError:
+        pass
+    return None
+
+
+class MemorySample:
+    """一次采样的结果：每个渲染进程的占用，以及按共享进程的页面数平摊到各页面的估算值"""
+    
+    def __init__(self, processes, pages):
+        # {pid: (rss, pss)}
+        self.processes = processes
+        # [(view或page, url, 估算字节数)]，从大到小排列
+        self.pages = sorted(pages, key=lambda item: item[2], reverse=True)
+        self.total = sum(pss if pss is not None else rss for rss, pss in processes.values())
+
+
+class MemoryMonitor(QObject):
+    """低频采样各页面渲染进程的内存占用；超出预算时依次释放预加载和缓存、冻结或丢弃闲置页面、重新加载占用最大的页面"""
+    
+    # 重新加载同一页面之间至少间隔的时间
+    RELOAD_COOLDOWN_S = 300
+    
+    sampled = pyqtSignal(object)
+    
+    def __init__(self, settings_store, profile, lifecycle_manager, prerender_manager, parent=None):
+        super().__init__(parent)
+        self.settings_store = settings_store
+        self.profile = profile
+        self.lifecycle_manager = lifecycle_manager
+        self.prerender_manager = prerender_manager
+        self.sampling = False
+        self.last_sample = None
+        # 超出预算后逐级升级的回收措施，回到预算内时重置
+        self.level = 0
+        self.reloaded = {}
+        # 所有措施都已用尽、没有可回收的后台页面时只记录一次日志
+        self.exhausted = False
+        self.supported = os.path.isdir('/proc')
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.sample)
+        if not self.supported:
+            logger.info("当前系统没有/proc，不监控渲染进程内存")
+        self.update_interval()
+        
+    def update_interval(self):
+        interval = self.settings_store.get('memory_sample_interval_s')
+        if self.supported and self.settings_store.get('memory_monitor_enabled') and interval > 0:
+            self.timer.start(interval * 1000)
+        else:
+            self.timer.stop()
+            
+    def budget(self):
+        return self.settings_store.get('tab_memory_budget_mb') * 1024 * 1024
+        
+    def pages(self):
+        """(对象, 页面)列表：标签页为其视图，预加载页面为页面本身"""
+        pages = [(view, view.page()) for view in self.lifecycle_manager.views]
+        pages += [(entry.page, entry.page) for entry in self.prerender_manager.entries.values()]
+        return pages
+        
+    def sample(self):
+        if self.sampling:
+            return
+        groups = {}
+        for owner, page in self.pages():
+            pid = page.renderProcessPid()
+            if pid > 0:
+                groups.setdefault(pid, []).append((owner, page.url().toString()))
+        if not groups:
+            return
+        self.sampling = True
+        pids = list(groups)
+        run_in_background(lambda: {pid: read_process_memory(pid) for pid in pids},
+                          lambda result: self.on_sampled(groups, result),
+                          self.on_sample_failed)
+        
+    def on_sample_failed(self, error):
+        self.sampling = False
+        logger.error(f"读取渲染进程内存失败: {error}")
+        
+    def on_sampled(self, groups, result):
+        self.sampling = False
+        processes = {pid: usage for pid, usage in result.items() if usage is not None}
+        pages = []
+        for pid, (rss, pss) in processes.items():
+            share = (pss if pss is not None else rss) // len(groups[pid])
+            pages.extend((owner, url, share) for owner, url in groups[pid])
+        sample = MemorySample(processes, pages)
+        self.last_sample = sample
+        logger.debug("渲染进程内存采样", extra={'total_mb': sample.total >> 20, 'processes': len(processes)})
+        self.sampled.emit(sample)
+        
+        budget = self.budget()
+        if budget and sample.total > budget:
+            self.reclaim(sample, budget)
+        else:
+            self.level = 0
+            self.exhausted = False
+            
+    def log_action(self, action, sample, budget, **fields):
+        logger.warning(f"渲染进程内存超出预算，执行: {action}",
+                       extra=dict(fields, action=action, total_mb=sample.total >> 20, budget_mb=budget >> 20))
+        
+    def reclaim(self, sample, budget):
+        """每次采样只执行一级措施，下次采样时再看效果决定是否升级"""
+        while self.level < 3:
+            level = self.level
+            self.level += 1
+            if level == 0 and self.release_caches(sample, budget):
+                return
+            if level == 1 and self.release_idle_pages(sample, budget):
+                return
+            if level == 2 and self.reload_worst(sample, budget):
+                # 仍超出预算时下次继续尝试重新加载其他页面
+                self.level = 2
+                self.exhausted = False
+                return
+        # 不再升级；之后的采样只在出现新的后台页面时重新加载
+        self.level = 2
+        if not self.exhausted:
+            self.exhausted = True
+            logger.warning("渲染进程内存仍超出预算，但已没有可回收的后台页面，停止升级",
+                           extra={'total_mb': sample.total >> 20, 'budget_mb': budget >> 20})
+        
+    def release_caches(self, sample, budget):
+        released = len(self.prerender_manager.entries)
+        self.prerender_manager.cancel_all()
+        # 磁盘缓存不占渲染进程内存，只清除内存缓存
+        memory_cache = self.settings_store.get('http_cache_type') == 'memory'
+        if memory_cache:
+            self.profile.clearHttpCache()
+        if not released and not memory_cache:
+            return False
+        self.log_action("释放预加载页面和内存缓存", sample, budget,
+                        prerender_released=released, http_cache_cleared=memory_cache)
+        return True
+        
+    def release_idle_pages(self, sample, budget):
+        """按最久未使用的顺序丢弃后台标签页，Qt不建议丢弃的页面改为冻结"""
+        usage = {id(owner): size for owner, _, size in sample.pages}
+        excess = sample.total - budget
+        acted = False
+        for view in list(self.lifecycle_manager.views):
+            if excess <= 0:
+                break
+            page = view.page()
+            if page.isVisible() or not self.lifecycle_manager.is_live(view):
+                continue
+            url = view.url().toString()
+            if self.lifecycle_manager.set_state(view, QWebEnginePage.LifecycleState.Discarded):
+                excess -= usage.get(id(view), 0)
+                self.log_action("丢弃闲置标签页", sample, budget, url=url,
+                                estimated_mb=usage.get(id(view), 0) >> 20)
+                acted = True
+            elif self.lifecycle_manager.set_state(view, QWebEnginePage.LifecycleState.Frozen):
+                self.log_action("冻结闲置标签页", sample, budget, url=url)
+                acted = True
+        return acted
+        
+    def reload_worst(self, sample, budget):
+        now = time.monotonic()
+        self.reloaded = {url: at for url, at in self.reloaded.items() if now - at < self.RELOAD_COOLDOWN_S}
+        for owner, url, size in sample.pages:
+            # 预加载页面已在第一级释放；刚重新加载过的页面不再重复
+            if not isinstance(owner, QWebEngineView) or url in self.reloaded:
+                continue
+            # 前台页面重新加载会丢失用户的输入和滚动位置
+            if owner.page().isVisible() or not self.lifecycle_manager.is_live(owner):
+                continue
+            self.reloaded[url] = now
+            self.log_action("重新加载占用最多的页面", sample, budget, url=url, estimated_mb=size >> 20)
+            owner.reload()
+            return True
+        return False
+
+
+class SessionTab:
+    """会话中的一个标签页；history为序列化的QWebEngineHistory，为空时只按URL打开"""
+    __slots__ = ('url', 'title', 'history', 'scroll_x', 'scroll_y')
+    
+    def __init__(self, url, title='', history=b'', scroll_x=0.0, scroll_y=0.0):
+        self.url = url
+        self.title = title
+        self.history = history
+        self.scroll_x = scroll_x
+        self.scroll_y = scroll_y
+
+
+def serialize_history(history):
+    data = QByteArray()
+    stream = QDataStream(data, QIODevice.OpenModeFlag.WriteOnly)
+    stream << history
+    return bytes(data)
+
+
+def restore_history(page, blob):
+    """把序列化的前进后退记录还原到页面上，页面随即加载当前项；数据损坏时返回False"""
+    stream = QDataStream(QByteArray(blob))
+    stream >> page.history()
+    return stream.status() == QDataStream.Status.Ok and page.history().count() > 0
+
+
+class SessionStore:
+    """会话文件：QDataStream编码的紧凑二进制格式，写入临时文件后原子替换"""
+    
+    MAGIC = 0x47465953  # 'GFYS'
+    VERSION = 1
+    
+    def __init__(self, path='session.bin'):
+        self.path = path
+        
+    def encode(self, tabs, current):
+        data = QByteArray()
+        stream = QDataStream(data, QIODevice.OpenModeFlag.WriteOnly)
+        stream.setVersion(QDataStream.Version.Qt_6_0)
+        stream.writeUInt32(self.MAGIC)
+        stream.writeUInt16(self.VERSION)
+        stream.writeUInt32(current)
+        stream.writeUInt32(len(tabs))
+        for tab in tabs:
+            stream.writeQString(tab.url)
+            stream.writeQString(tab.title)
+            stream.writeBytes(tab.history)
+            stream.writeDouble(tab.scroll_x)
+            stream.writeDouble(tab.scroll_y)
+        return bytes(data)
+        
+    def decode(self, raw):
+        stream = QDataStream(QByteArray(raw))
+        stream.setVersion(QDataStream.Version.Qt_6_0)
+        if stream.readUInt32() != self.MAGIC or stream.readUInt16() != self.VERSION:
+            raise ValueError("不是可识别的会话文件")
+        current = stream.readUInt32()
+        count = stream.readUInt32()
+        tabs = []
+        for _ in range(count):
+            url = stream.readQString()
+            title = stream.readQString()
+            history = stream.readBytes()
+            tabs.append(SessionTab(url, title, history, stream.readDouble(), stream.readDouble()))
+            if stream.status() != QDataStream.Status.Ok:
+                raise ValueError("会话文件不完整")
+        return tabs, min(current, max(0, len(tabs) - 1))
+        
+    def save(self, tabs, current):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(self.encode(tabs, current))
+        os.replace(tmp_path, self.path)
+        
+    def load(self):
+        """返回(标签页列表, 当前标签页序号)，文件不存在或损坏时返回空列表"""
+        if not os.path.exists(self.path):
+            return [], 0
+        try:
+            with open(self.path, 'rb') as f:
+                return self.decode(f.read())
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取会话文件失败: {e}", extra={'path': self.path})
+            return [], 0
+            
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class SessionManager(QObject):
+    """退出时和定期保存打开的标签页；启动时只加载前台标签页，其余作为占位，切换到时才加载"""
+    
+    def __init__(self, session_store, settings_store, browser_window):
+        super().__init__(browser_window)
+        self.session_store = session_store
+        self.settings_store = settings_store
+        self.browser_window = browser_window
+        self.dirty = False
+        self.restoring = False
+        self.restored = False
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.save_if_dirty)
+        self.update_interval()
+        
+    def update_interval(self):
+        interval = self.settings_store.get('session_save_interval_s')
+        if interval > 0:
+            self.timer.start(interval * 1000)
+        else:
+            self.timer.stop()
+            
+    def mark_dirty(self):
+        self.dirty = True
+        
+    def restore(self):
+        """恢复上次的会话，没有可恢复的标签页时返回False"""
+        if not self.settings_store.get('restore_session'):
+            return False
+        tabs, current = self.session_store.load()
+        if not tabs:
+            return False
+        tab_widget = self.browser_window.tabs
+        with log_duration("恢复会话", tabs=len(tabs)):
+            self.restoring = True
+            try:
+                for tab in tabs:
+                    self.browser_window.add_tab(background=True, session_tab=tab)
+            finally:
+                self.restoring = False
+            tab_widget.setCurrentIndex(current)
+            self.activate(tab_widget.widget(current))
+        self.restored = True
+        self.dirty = False
+        return True
+        
+    def activate(self, view):
+        """占位标签页第一次成为当前标签页时才真正加载"""
+        tab = view.session_tab
+        if tab is None or self.restoring:
+            return
+        view.session_tab = None
+        if tab.scroll_x or tab.scroll_y:
+            view.pending_scroll = (tab.scroll_x, tab.scroll_y)
+        if not (tab.history and restore_history(view.page(), tab.history)):
+            view.setUrl(QUrl(tab.url))
+            
+    def capture(self):
+        tab_widget = self.browser_window.tabs
+        tabs = []
+        current = 0
+        for index in range(tab_widget.count()):
+            view = tab_widget.widget(index)
+            if index == tab_widget.currentIndex():
+                current = len(tabs)
+            if view.session_tab is not None:
+                # 尚未加载的占位标签页原样保存
+                tabs.append(view.session_tab)
+                continue
+            url = view.url().toString()
+            if not url or url == 'about:blank':
+                continue
+            position = view.page().scrollPosition()
+            tabs.append(SessionTab(url, view.title(), serialize_history(view.history()),
+                                   position.x(), position.y()))
+        return tabs, min(current, max(0, len(tabs) - 1))
+        
+    def save(self):
+        try:
+            with log_duration("保存会话", logging.DEBUG):
+                tabs, current = self.capture()
+                self.session_store.save(tabs, current)
+            self.dirty = False
+        except OSError as e:
+            logger.error(f"保存会话时出错: {e}")
+            
+    def save_if_dirty(self):
+        if self.dirty:
+            self.save()
+
+
+class SuggestionListModel(QAbstractListModel):
+    """地址栏补全弹出列表的数据，每行是(url, title)"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.suggestions = []
+        
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.suggestions)
+        
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        url, title = self.suggestions[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return f"{title} - {url}" if title else url
+        if role in (Qt.ItemDataRole.EditRole, URL_ROLE):
+            return url
+        return None
+        
+    def set_suggestions(self, suggestions):
+        self.beginResetModel()
+        self.suggestions = suggestions
+        self.endResetModel()
+
+
+def yield_gil():
+    """在后台线程的长循环中主动让出GIL，使GUI线程不必等待解释器的切换间隔"""
+    time.sleep(0)
+
+
+class OmniboxIndex:
+    """地址栏补全索引：按规范化URL排序的前缀表 + 标题三元组倒排，按frecency排序
+
+    主索引是有序的URL键和一棵按位置存储分数的线段树，前缀查询先二分出区间，
+    再在线段树上按分数从高到低取前几名，耗时与区间大小无关。新URL先进入较小的
+    有序增量表，积累到一定数量后在后台合并进主索引。
+    """
+    
+    MAX_RESULTS = 8
+    DELTA_LIMIT = 2048
+    # 后台合并时每处理这么多条目让出一次GIL
+    MERGE_CHUNK = 16384
+    TRIGRAM_SCAN_LIMIT = 512
+    BOOKMARK_BONUS = 5
+    
+    def __init__(self):
+        # 按id保存每个URL的信息，id即列表下标
+        self.urls = []
+        self.titles = []
+        self.visit_counts = []
+        self.last_visits = []
+        self.bookmarked = []
+        self.scores = []
+        self.id_of_url = {}
+        # 标题三元组 -> id数组
+        self.trigrams = {}
+        # (主索引, 增量键, 增量id)作为一个元组整体替换，GUI线程不加锁读取一次即得到一致的快照。
+        # 主索引为(有序键, 对应id, 线段树, 叶子数, id到位置的映射)；增量表是尚未合并进主索引的新URL，
+        # 按键有序，创建后不再原地修改
+        self.state = (([], [], [0.0, 0.0], 1, {}), [], [])
+        # 后台合并与GUI线程的增量更新互斥；合并期间记录分数有变化的id
+        self.lock = threading.Lock()
+        self.rescored = None
+        
+    @staticmethod
+    def normalize(text):
+        """去掉协议和www前缀，统一小写"""
+        text = text.strip().lower()
+        for prefix in ('https://', 'http://'):
+            if text.startswith(prefix):
+                text = text[len(prefix):]
+                break
+        if text.startswith('www.'):
+            text = text[4:]
+        return text
+        
+    @classmethod
+    def frecency(cls, visit_count, last_visit, bookmarked, now):
+        """访问次数按最近访问时间加权，收藏额外加分"""
+        age_days = (now - last_visit) / 86400 if last_visit else 365
+        if age_days < 4:
+            weight = 100
+        elif age_days < 14:
+            weight = 70
+        elif age_days < 31:
+            weight = 50
+        elif age_days < 90:
+            weight = 30
+        else:
+            weight = 10
+        return (visit_count + (cls.BOOKMARK_BONUS if bookmarked else 0)) * weight
+        
+    def add_entry(self, url, title, visit_count, last_visit, bookmarked=False, now=None):
+        """添加新URL，返回id；不更新有序索引"""
+        entry_id = len(self.urls)
+        self.urls.append(url)
+        self.titles.append(title or '')
+        self.visit_counts.append(visit_count)
+        self.last_visits.append(last_visit)
+        self.bookmarked.append(bookmarked)
+        self.scores.append(self.frecency(visit_count, last_visit, bookmarked, now or time.time()))
+        self.id_of_url[url] = entry_id
+        self.index_title(entry_id, title)
+        return entry_id
+        
+    def index_title(self, entry_id, title):
+        title = (title or '').lower()
+        for gram in {title[i:i + 3] for i in range(len(title) - 2)}:
+            postings = self.trigrams.get(gram)
+            if postings is None:
+                postings = self.trigrams[gram] = array('I')
+            postings.append(entry_id)
+            
+    @classmethod
+    def build(cls, rows, bookmarks=()):
+        """从(url, title, visit_count, last_visit)批量构建索引"""
+        index = cls()
+        now = time.time()
+        bookmarks = set(bookmarks)
+        for url, title, visit_count, last_visit in rows:
+            index.add_entry(url, title, visit_count, last_visit, url in bookmarks, now)
+        for url in bookmarks:
+            if url not in index.id_of_url:
+                index.add_entry(url, '', 0, None, True, now)
+        index.merge_delta(list(range(len(index.urls))))
+        return index
+        
+    def merge_delta(self, new_ids=None):
+        """把增量表合并进主索引，重建有序键和线段树（可在后台线程执行）
+
+        主索引已经有序，只需把排好序的新键逐个二分插入；复制、建树等步骤都按MERGE_CHUNK分块，
+        块之间让出GIL，后台合并百万条目时GUI线程处理按键也不会被阻塞。
+        """
+        with self.lock:
+            if new_ids is None:
+                new_ids = list(self.state[2])
+            self.rescored = set()
+        main = self.state[0]
+        keys, ids = self.merge_sorted(main[0], main[1],
+                                      self.sort_chunked([(self.normalize(self.urls[i]), i) for i in new_ids]))
+        
+        size = 1
+        while size < max(1, len(ids)):
+            size *= 2
+        scores = self.scores
+        tree = [0.0] * (2 * size)
+        for start in range(0, len(ids), self.MERGE_CHUNK):
+            chunk = ids[start:start + self.MERGE_CHUNK]
+            tree[size + start:size + start + len(chunk)] = [scores[i] for i in chunk]
+            yield_gil()
+        for node in range(size - 1, 0, -1):
+            left = tree[2 * node]
+            right = tree[2 * node + 1]
+            tree[node] = left if left >= right else right
+            if not node % self.MERGE_CHUNK:
+                yield_gil()
+                
+        position = {}
+        for start in range(0, len(ids), self.MERGE_CHUNK):
+            position.update(zip(ids[start:start + self.MERGE_CHUNK], range(start, start + self.MERGE_CHUNK)))
+            yield_gil()
+            
+        merged_ids = set(new_ids)
+        with self.lock:
+            # 合并期间分数可能又被更新，替换前按最新分数修正叶子
+            for entry_id in self.rescored:
+                pos = position.get(entry_id)
+                if pos is not None:
+                    self.set_leaf(tree, size, pos, scores[entry_id])
+            self.rescored = None
+            # 整体替换，查询看到的始终是一致的旧索引或新索引
+            _, delta_keys, delta_ids = self.state
+            remaining = [(key, i) for key, i in zip(delta_keys, delta_ids) if i not in merged_ids]
+            self.state = ((keys, ids, tree, size, position),
+                          [key for key, _ in remaining], [i for _, i in remaining])
+        
+    @classmethod
+    def sort_chunked(cls, pairs):
+        """分块排序后归并，避免对大列表的一次sorted()长时间持有GIL"""
+        if len(pairs) <= cls.MERGE_CHUNK:
+            pairs.sort()
+            return pairs
+        runs = []
+        for start in range(0, len(pairs), cls.MERGE_CHUNK):
+            runs.append(sorted(pairs[start:start + cls.MERGE_CHUNK]))
+            yield_gil()
+        # heapq.merge是纯Python生成器，执行期间GIL照常切换
+        return list(heapq.merge(*runs))
+        
+    @classmethod
+    def merge_sorted(cls, main_keys, main_ids, new_pairs):
+        """把有序的(键, id)列表归并进有序的主索引键和id，返回新的(keys, ids)"""
+        if not main_keys:
+            return [key for key, _ in new_pairs], [entry_id for _, entry_id in new_pairs]
+        keys = []
+        ids = []
+        
+        def copy_main(lo, hi):
+            for start in range(lo, hi, cls.MERGE_CHUNK):
+                stop = min(start + cls.MERGE_CHUNK, hi)
+                keys.extend(main_keys[start:stop])
+                ids.extend(main_ids[start:stop])
+                yield_gil()
+                
+        copied = 0
+        for key, entry_id in new_pairs:
+            pos = bisect.bisect_right(main_keys, key, copied)
+            copy_main(copied, pos)
+            copied = pos
+            keys.append(key)
+            ids.append(entry_id)
+        copy_main(copied, len(main_keys))
+        return keys, ids
+        
+    def needs_merge(self):
+        return len(self.state[2]) >= self.DELTA_LIMIT
+        
+    def record_visit(self, url, title, visit_time):
+        """记录一次访问，增量更新分数和索引"""
+        entry_id = self.id_of_url.get(url)
+        if entry_id is None:
+            entry_id = self.add_entry(url, title, 1, visit_time)
+            key = self.normalize(url)
+            with self.lock:
+                # 复制出新的增量表再整体替换，查询不会看到只插入了一半的列表
+                main, delta_keys, delta_ids = self.state
+                pos = bisect.bisect_left(delta_keys, key)
+                self.state = (main, delta_keys[:pos] + [key] + delta_keys[pos:],
+                              delta_ids[:pos] + [entry_id] + delta_ids[pos:])
+            return
+        self.visit_counts[entry_id] += 1
+        self.last_visits[entry_id] = visit_time
+        if title and title != self.titles[entry_id]:
+            self.titles[entry_id] = title
+            self.index_title(entry_id, title)
+        self.update_score(entry_id)
+        
+    def set_bookmarked(self, url, bookmarked):
+        entry_id = self.id_of_url.get(url)
+        if entry_id is None:
+            if not bookmarked:
+                return
+            self.record_visit(url, '', None)
+            entry_id = self.id_of_url[url]
+            self.visit_counts[entry_id] = 0
+        self.bookmarked[entry_id] = bookmarked
+        self.update_score(entry_id)
+        
+    def update_score(self, entry_id):
+        self.scores[entry_id] = self.frecency(self.visit_counts[entry_id], self.last_visits[entry_id],
+                                              self.bookmarked[entry_id], time.time())
+        with self.lock:
+            if self.rescored is not None:
+                self.rescored.add(entry_id)
+            _, _, tree, size, position = self.state[0]
+            pos = position.get(entry_id)
+            if pos is not None:
+                self.set_leaf(tree, size, pos, self.scores[entry_id])
+                
+    @staticmethod
+    def set_leaf(tree, size, pos, score):
+        node = size + pos
+        tree[node] = score
+        node //= 2
+        while node:
+            left = tree[2 * node]
+            right = tree[2 * node + 1]
+            tree[node] = left if left >= right else right
+            node //= 2
+            
+    @staticmethod
+    def top_in_range(main, lo, hi, limit):
+        """在线段树上按分数从高到低取主索引[lo, hi)中的前limit个id"""
+        _, ids, tree, size, _ = main
+        # 分数相同时优先展开更深的节点（下标更大），避免在并列分数上广度展开
+        heap = []
+        lo += size
+        hi += size
+        while lo < hi:
+            if lo & 1:
+                heap.append((-tree[lo], -lo))
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                heap.append((-tree[hi], -hi))
+            lo //= 2
+            hi //= 2
+        heapq.heapify(heap)
+        result = []
+        while heap and len(result) < limit:
+            _, node = heapq.heappop(heap)
+            node = -node
+            if node >= size:
+                result.append(ids[node - size])
+            else:
+                heapq.heappush(heap, (-tree[2 * node], -2 * node))
+                heapq.heappush(heap, (-tree[2 * node + 1], -2 * node - 1))
+        return result
+        
+    def suggest(self, text, limit=MAX_RESULTS):
+        """返回按frecency排序的(url, title)建议列表"""
+        query = text.strip().lower()
+        key = self.normalize(query)
+        if not key:
+            return []
+        upper = key + '￿'
+        
+        # 前缀匹配：主索引走线段树，增量表直接扫描匹配区间
+        main, delta_keys, delta_ids = self.state
+        main_keys = main[0]
+        candidates = self.top_in_range(main, bisect.bisect_left(main_keys, key),
+                                       bisect.bisect_left(main_keys, upper), limit)
+        lo = bisect.bisect_left(delta_keys, key)
+        hi = bisect.bisect_left(delta_keys, upper)
+        candidates.extend(delta_ids[lo:hi])
+        
+        # 前缀结果不足时用标题三元组做子串匹配，只扫描最短的倒排表且有上限
+        if len(candidates) < limit and len(query) >= 3:
+            postings = []
+            for gram in {query[i:i + 3] for i in range(len(query) - 2)}:
+                ids = self.trigrams.get(gram)
+                if ids is None:
+                    postings = []
+                    break
+                postings.append(ids)
+            if postings:
+                # 倒排表过长时只检查最近加入的一段，保证耗时有上限
+                shortest = min(postings, key=len)[-self.TRIGRAM_SCAN_LIMIT:]
+                titles = self.titles
+                candidates.extend(i for i in shortest if query in titles[i].lower())
+                    
+        scores = self.scores
+        best = heapq.nlargest(limit, set(candidates), key=scores.__getitem__)
+        return [(self.urls[i], self.titles[i]) for i in best]
+
+
+OMNIBOX_BUILD_ATTEMPTS = 3
+OMNIBOX_RETRY_MS = 30_000
+
+
+def build_omnibox_index(db_path, bookmarks):
+    """在后台线程中使用独立的数据库连接汇总每个URL的访问次数并构建索引"""
+    conn = sqlite3.connect(db_path)
+    try:
+        # 与MAX()同时查询的title取自最近一次访问
+        rows = conn.execute(
+            "SELECT url, title, SUM(visit_count), MAX(visit_time) FROM visits GROUP BY url").fetchall()
+    finally:
+        conn.close()
+    return OmniboxIndex.build(rows, bookmarks)
+
+
+class PrerenderEntry:
+    def __init__(self, page, url):
+        self.page = page
+        self.url = url
+        self.started = time.monotonic()
+        self.finished = None
+
+
+class PrerenderManager(QObject):
+    """在隐藏页面中预先加载最可能访问的地址，提交导航时直接换到可见标签页"""
+    
+    DEBOUNCE_MS = 300
+    TTL_S = 60
+    
+    def __init__(self, profile, settings_store, lifecycle_manager, parent=None):
+        super().__init__(parent)
+        self.profile = profile
+        self.settings_store = settings_store
+        self.lifecycle_manager = lifecycle_manager
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.wasted = 0
+        self.saved_ms = 0.0
+        self.pending_url = None
+        
+        # 输入和悬停变化很快，只预加载停留一段时间的候选
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(self.DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(lambda: self.speculate(self.pending_url))
+        self.expire_timer = QTimer(self)
+        self.expire_timer.setInterval(self.TTL_S * 1000 // 4)
+        self.expire_timer.timeout.connect(self.expire)
+        self.expire_timer.start()
+        
+    @staticmethod
+    def key(url):
+        """完整URL只去掉#片段和末尾的/；协议和www.都保留，http页面不会被https导航换上"""
+        return url.split('#', 1)[0].rstrip('/')
+        
+    def enabled(self):
+        return self.settings_store.get('prerender_enabled')
+        
+    def schedule(self, url):
+        if not url or not self.enabled():
+            return
+        self.pending_url = url
+        self.debounce_timer.start()
+        
+    def has_budget(self):
+        """预渲染页面与存活的标签页共用内存预算"""
+        return self.lifecycle_manager.live_count() + len(self.entries) < self.lifecycle_manager.live_tab_budget()
+        
+    def speculate(self, url):
+        if not url or not self.enabled():
+            return
+        key = self.key(url)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return
+        # 超出数量时先取消最旧的推测
+        while self.entries and len(self.entries) >= self.settings_store.get('prerender_max'):
+            self.discard(next(iter(self.entries)))
+        if not self.has_budget():
+            return
+            
+        page = QWebEnginePage(self.profile, self)
+        configure_page_settings(page)
+        # 通道要在加载前建立，换到标签页后注入脚本的回报才能送达
+        page_bridge(page)
+        page.setAudioMuted(True)
+        entry = PrerenderEntry(page, url)
+        page.loadFinished.connect(lambda ok, k=key, e=entry: self.on_load_finished(k, e, ok))
+        self.entries[key] = entry
+        page.load(QUrl(url))
+        
+    def on_load_finished(self, key, entry, ok):
+        if self.entries.get(key) is not entry:
+            return
+        if ok:
+            entry.finished = time.monotonic()
+        else:
+            self.discard(key)
+            
+    def take(self, url):
+        """导航提交时取出匹配的预渲染条目（页面可能仍在加载），未命中返回None"""
+        entry = self.entries.pop(self.key(url), None)
+        if entry is None:
+            if self.enabled():
+                self.misses += 1
+            return None
+        self.hits += 1
+        # 页面已加载完成时节省整个加载时间，否则节省已经加载的那部分
+        self.saved_ms += ((entry.finished or time.monotonic()) - entry.started) * 1000
+        entry.page.setParent(None)
+        return entry
+        
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.wasted += 1
+            entry.page.deleteLater()
+            
+    def cancel_all(self):
+        for key in list(self.entries):
+            self.discard(key)
+            
+    def expire(self):
+        now = time.monotonic()
+        for key, entry in list(self.entries.items()):
+            if now - entry.started > self.TTL_S:
+                self.discard(key)
+                
+    def stats_text(self):
+        total = self.hits + self.misses
+        rate = f"{self.hits * 100 // total}%" if total else "-"
+        return (f"预加载命中 {self.hits} 次，未命中 {self.misses} 次（命中率 {rate}），"
+                f"丢弃 {self.wasted} 个，累计节省约 {self.saved_ms / 1000:.1f} 秒")
+
+
+# 规则和URL共用的分词方式：连续的字母、数字和%
+ADBLOCK_TOKEN_RE = re.compile(r'[a-z0-9%]{2,}')
+ADBLOCK_HOST_RULE_RE = re.compile(r'\|\|([a-z0-9-]+(?:\.[a-z0-9-]+)+)\^\|?')
+# 出现在几乎所有URL中的词，不适合作为索引键
+ADBLOCK_BAD_TOKENS = frozenset({'http', 'https', 'www', 'com', 'net', 'org', 'cn', 'js', 'html', 'htm', 'php',
+                                'jpg', 'png', 'gif', 'css', 'static', 'cdn', 'img', 'images'})
+ADBLOCK_TYPE_OPTIONS = {
+    'script': 'script', 'image': 'image', 'stylesheet': 'stylesheet', 'css': 'stylesheet',
+    'object': 'object', 'xmlhttprequest': 'xmlhttprequest', 'xhr': 'xmlhttprequest',
+    'subdocument': 'subdocument', 'frame': 'subdocument', 'document': 'document', 'doc': 'document',
+    'media': 'media', 'font': 'font', 'ping': 'ping', 'websocket': 'websocket', 'other': 'other',
+}
+ADBLOCK_ALL_TYPES = frozenset(ADBLOCK_TYPE_OPTIONS.values())
+# 拦截规则默认不作用于顶层文档
+ADBLOCK_DEFAULT_TYPES = ADBLOCK_ALL_TYPES - {'document'}
+# 不影响请求拦截的选项，直接忽略
+ADBLOCK_IGNORED_OPTIONS = frozenset({'match-case', 'collapse', 'all'})
+# 只作用于元素隐藏或弹窗的选项，这类规则不参与请求拦截
+ADBLOCK_NON_REQUEST_OPTIONS = frozenset({'elemhide', 'generichide', 'genericblock', 'popup'})
+
+
+def url_host(url):
+    """取URL中的主机名（不含用户信息和端口）"""
+    parts = url.split('/', 3)
+    if len(parts) < 3 or not parts[0].endswith(':'):
+        return ''
+    host = parts[2].split('?', 1)[0].split('#', 1)[0]
+    if '@' in host:
+        host = host.rsplit('@', 1)[1]
+    if ':' in host:
+        host = host.split(':', 1)[0]
+    return host
+
+
+def base_domain(host):
+    """粗略取可注册域名，用于判断第三方请求"""
+    parts = host.rsplit('.', 3)
+    if len(parts) >= 3 and parts[-2] in ('com', 'net', 'org', 'gov', 'edu', 'co', 'ac'):
+        return '.'.join(parts[-3:])
+    return '.'.join(parts[-2:])
+
+
+def host_suffixes(host):
+    """a.b.com -> a.b.com, b.com, com"""
+    while True:
+        yield host
+        dot = host.find('.')
+        if dot < 0:
+            return
+        host = host[dot + 1:]
+
+
+def pattern_to_regex(pattern):
+    """把EasyList的网址模式转换为正则表达式"""
+    regex = ''
+    if pattern.startswith('||'):
+        regex = r'^[a-z][a-z0-9+.-]*://(?:[^/?#]*\.)?'
+        pattern = pattern[2:]
+    elif pattern.startswith('|'):
+        regex = '^'
+        pattern = pattern[1:]
+    end = ''
+    if pattern.endswith('|'):
+        end = '$'
+        pattern = pattern[:-1]
+    for ch in pattern:
+        if ch == '*':
+            regex += '.*'
+        elif ch == '^':
+            regex += r'(?:[^a-z0-9_.%-]|$)'
+        else:
+            regex += re.escape(ch)
+    return regex + end
+
+
+class FilterRule:
+    """一条编译后的拦截或例外规则"""
+    
+    __slots__ = ('text', 'host', 'pattern', 'substring', 'regex', 'types', 'third_party',
+                 'include_domains', 'exclude_domains', 'important')
+    
+    def __init__(self, text):
+        self.text = text
+        self.host = None
+        self.pattern = ''
+        self.substring = None
+        self.regex = None
+        self.types = ADBLOCK_DEFAULT_TYPES
+        self.third_party = None
+        self.include_domains = None
+        self.exclude_domains = None
+        # $important：拦截规则优先于所有例外规则
+        self.important = False
+        
+    @classmethod
+    def parse(cls, line):
+        """解析一行规则，返回(是否例外, FilterRule)；注释、元素隐藏和不支持的规则返回None"""
+        line = line.strip()
+        if not line or line[0] in '![' or '##' in line or '#@#' in line or '#?#' in line or '#$#' in line:
+            return None
+        rule = cls(line)
+        exception = line.startswith('@@')
+        if exception:
+            line = line[2:]
+        pattern, options = line, ''
+        dollar = line.rfind('$')
+        if dollar >= 0:
+            pattern, options = line[:dollar], line[dollar + 1:]
+        pattern = pattern.lower()
+        # 正则表达式规则在EasyList中很少，匹配开销大，不支持
+        if len(pattern) > 2 and pattern[0] == '/' and pattern[-1] == '/':
+            return None
+        if options and not rule.parse_options(options):
+            return None
+            
+        match = ADBLOCK_HOST_RULE_RE.fullmatch(pattern)
+        if match:
+            rule.host = match.group(1)
+        elif pattern.strip('*'):
+            rule.pattern = pattern
+            if not any(ch in pattern for ch in '*^|'):
+                rule.substring = pattern
+        return exception, rule
+        
+    def parse_options(self, options):
+        positive = set()
+        negative = set()
+        for option in options.lower().split(','):
+            negated = option.startswith('~')
+            name = option.lstrip('~')
+            if name.startswith('domain='):
+                include = set()
+                exclude = set()
+                for domain in name[len('domain='):].split('|'):
+                    if domain.startswith('~'):
+                        exclude.add(domain[1:])
+                    elif domain:
+                        include.add(domain)
+                self.include_domains = frozenset(include) or None
+                self.exclude_domains = frozenset(exclude) or None
+            elif name in ('third-party', '3p'):
+                self.third_party = not negated
+            elif name in ('first-party', '1p'):
+                self.third_party = negated
+            elif name == 'important':
+                self.important = True
+            elif name in ADBLOCK_TYPE_OPTIONS:
+                (negative if negated else positive).add(ADBLOCK_TYPE_OPTIONS[name])
+            elif name in ADBLOCK_NON_REQUEST_OPTIONS:
+                return False
+            elif name not in ADBLOCK_IGNORED_OPTIONS:
+                return False
+        if positive:
+            self.types = frozenset(positive)
+        elif negative:
+            self.types = ADBLOCK_DEFAULT_TYPES - negative
+        return True
+        
+    def tokens(self):
+        """规则中在URL里一定作为完整词出现的部分，可用作索引键"""
+        pattern = self.pattern
+        anchored_start = pattern.startswith('|')
+        anchored_end = pattern.endswith('|')
+        pattern = pattern.strip('|')
+        result = []
+        for match in ADBLOCK_TOKEN_RE.finditer(pattern):
+            start, end = match.span()
+            before = pattern[start - 1] if start else ''
+            after = pattern[end] if end < len(pattern) else ''
+            if before == '*' or after == '*':
+                continue
+            if (not before and not anchored_start) or (not after and not anchored_end):
+                continue
+            result.append(match.group())
+        return result
+        
+    def applies(self, resource_type, host, first_party_url):
+        """检查规则选项（类型、第三方、domain=），所在页面的主机名只在需要时才解析"""
+        if resource_type not in self.types:
+            return False
+        if self.third_party is not None:
+            first_party_host = url_host(first_party_url)
+            third_party = bool(first_party_host) and base_domain(host) != base_domain(first_party_host)
+            if self.third_party != third_party:
+                return False
+        if self.include_domains is not None or self.exclude_domains is not None:
+            for suffix in host_suffixes(url_host(first_party_url)):
+                if self.exclude_domains is not None and suffix in self.exclude_domains:
+                    return False
+                if self.include_domains is not None and suffix in self.include_domains:
+                    return True
+            return self.include_domains is None
+        return True
+        
+    def matches_url(self, url):
+        if self.substring is not None:
+            return self.substring in url
+        if not self.pattern:
+            return True
+        # 正则在第一次需要时才编译，大部分规则不会成为候选
+        if self.regex is None:
+            self.regex = re.compile(pattern_to_regex(self.pattern))
+        return self.regex.search(url) is not None
+
+
+class RuleIndex:
+    """按域名哈希和URL词索引的规则集合，每个请求只检查少量候选规则"""
+    
+    def __init__(self):
+        self.domains = {}
+        self.tokens = {}
+        self.generic = []
+        
+    def add(self, rule):
+        if rule.host is not None:
+            self.domains.setdefault(rule.host, []).append(rule)
+            return
+        tokens = rule.tokens()
+        if not tokens:
+            self.generic.append(rule)
+            return
+        # 选择当前候选最少的词，让各个桶尽量均匀
+        token = min(tokens, key=lambda t: (t in ADBLOCK_BAD_TOKENS, len(self.tokens.get(t, ())), -len(t)))
+        self.tokens.setdefault(token, []).append(rule)
+        
+    def match(self, url, host, url_tokens, resource_type, first_party_url):
+        domains = self.domains
+        if domains:
+            suffix = host
+            while True:
+                rules = domains.get(suffix)
+                if rules is not None:
+                    for rule in rules:
+                        if rule.applies(resource_type, host, first_party_url):
+                            return rule
+                dot = suffix.find('.')
+                if dot < 0:
+                    break
+                suffix = suffix[dot + 1:]
+        get = self.tokens.get
+        for token in url_tokens:
+            rules = get(token)
+            if rules is not None:
+                for rule in rules:
+                    if rule.matches_url(url) and rule.applies(resource_type, host, first_party_url):
+                        return rule
+        for rule in self.generic:
+            if rule.matches_url(url) and rule.applies(resource_type, host, first_party_url):
+                return rule
+        return None
+
+
+class FilterEngine:
+    """EasyList格式规则编译后的拦截引擎，纯Python实现，可在后台线程中构建"""
+    
+    def __init__(self):
+        self.blocking = RuleIndex()
+        # $important拦截规则单独索引，在例外规则之前检查
+        self.important = RuleIndex()
+        self.important_count = 0
+        self.exceptions = RuleIndex()
+        self.rule_count = 0
+        self.skipped = 0
+        
+    @classmethod
+    def compile(cls, lines):
+        engine = cls()
+        for line in lines:
+            parsed = FilterRule.parse(line)
+            if parsed is None:
+                if line.strip() and line[0] not in '![':
+                    engine.skipped += 1
+                continue
+            exception, rule = parsed
+            if exception:
+                engine.exceptions.add(rule)
+            elif rule.important:
+                engine.important.add(rule)
+                engine.important_count += 1
+            else:
+                engine.blocking.add(rule)
+            engine.rule_count += 1
+        return engine
+        
+    @classmethod
+    def load(cls, paths):
+        lines = []
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    lines.extend(f.read().splitlines())
+            except UnicodeDecodeError:
+                with open(path, 'r', encoding='gbk', errors='replace') as f:
+                    lines.extend(f.read().splitlines())
+        return cls.compile(lines)
+        
+    def match(self, url, resource_type='other', first_party_url=''):
+        """返回命中的拦截规则，不拦截时返回None"""
+        url = url.lower()
+        host = url_host(url)
+        url_tokens = ADBLOCK_TOKEN_RE.findall(url)
+        if self.important_count:
+            rule = self.important.match(url, host, url_tokens, resource_type, first_party_url)
+            if rule is not None:
+                return rule
+        rule = self.blocking.match(url, host, url_tokens, resource_type, first_party_url)
+        if rule is None:
+            return None
+        # 只有命中拦截规则时才检查例外规则
+        first_party_url = first_party_url.lower()
+        if self.exceptions.match(url, host, url_tokens, resource_type, first_party_url):
+            return None
+        # @@...$document 例外：整个页面不拦截
+        if first_party_url and self.exceptions.match(
+                first_party_url, url_host(first_party_url), ADBLOCK_TOKEN_RE.findall(first_party_url),
+                'document', first_party_url):
+            return None
+        return rule
+
+class AdBlockInterceptor(QWebEngineUrlRequestInterceptor):
+    """安装在profile上的请求拦截器，命中规则的请求直接取消"""
+    
+    def __init__(self, service, parent=None):
+        super().__init__(parent)
+        self.service = service
+        
+    def interceptRequest(self, info):
+        self.service.check_request(info)
+
+
+class AdBlockService(QObject):
+    """加载规则目录下的*.txt规则文件，文件变化时在后台重新编译并替换引擎，并按页面统计拦截数"""
+    
+    blocked_count_changed = pyqtSignal(str, int)
+    engine_loaded = pyqtSignal(int)
+    
+    RELOAD_DELAY_MS = 500
+    MAX_PAGES = 500
+    
+    def __init__(self, settings_store, parent=None):
+        super().__init__(parent)
+        self.settings_store = settings_store
+        self.enabled = settings_store.get('adblock_enabled')
+        self.rules_dir = settings_store.get('adblock_dir')
+        self.engine = None
+        self.page_counts = OrderedDict()
+        ResourceType = QWebEngineUrlRequestInfo.ResourceType
+        self.resource_types = {
+            ResourceType.ResourceTypeSubFrame: 'subdocument',
+            ResourceType.ResourceTypeStylesheet: 'stylesheet',
+            ResourceType.ResourceTypeScript: 'script',
+            ResourceType.ResourceTypeImage: 'image',
+            ResourceType.ResourceTypeFavicon: 'image',
+            ResourceType.ResourceTypeFontResource: 'font',
+            ResourceType.ResourceTypeObject: 'object',
+            ResourceType.ResourceTypePluginResource: 'object',
+            ResourceType.ResourceTypeMedia: 'media',
+            ResourceType.ResourceTypeXhr: 'xmlhttprequest',
+            ResourceType.ResourceTypePing: 'ping',
+        }
+        self.interceptor = AdBlockInterceptor(self, self)
+        
+        # 规则文件编辑、新增或删除后自动重新加载
+        self.reload_timer = QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(self.RELOAD_DELAY_MS)
+        self.reload_timer.timeout.connect(self.reload)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.reload_timer.start)
+        self.watcher.fileChanged.connect(self.reload_timer.start)
+        settings_store.setting_changed.connect(self.on_setting_changed)
+        self.reload()
+        
+    def rule_files(self):
+        try:
+            names = sorted(os.listdir(self.rules_dir))
+        except OSError:
+            return []
+        return [os.path.join(self.rules_dir, name) for name in names if name.endswith('.txt')]
+        
+    def reload(self):
+        os.makedirs(self.rules_dir, exist_ok=True)
+        if self.rules_dir not in self.watcher.directories():
+            self.watcher.addPath(self.rules_dir)
+        paths = self.rule_files()
+        # 原子替换会换掉文件，重新监听当前的文件列表
+        if self.watcher.files():
+            self.watcher.removePaths(self.watcher.files())
+        if paths:
+            self.watcher.addPaths(paths)
+        def load():
+            with log_duration("编译拦截规则", files=len(paths)):
+                return FilterEngine.load(paths)
+        run_in_background(load, self.on_engine_ready,
+                          lambda error: logger.error(f"加载拦截规则时出错: {error}"))
+        
+    def on_engine_ready(self, engine):
+        logger.info(f"已加载 {engine.rule_count} 条拦截规则，跳过 {engine.skipped} 条")
+        self.engine = engine
+        self.engine_loaded.emit(engine.rule_count)
+        
+    def rule_count(self):
+        return self.engine.rule_count if self.engine is not None else 0
+        
+    def check_request(self, info):
+        engine = self.engine
+        if engine is None or not self.enabled:
+            return
+        resource_type = info.resourceType()
+        if resource_type == QWebEngineUrlRequestInfo.ResourceType.ResourceTypeMainFrame:
+            # 新的顶层导航，重新开始统计这个页面
+            self.page_counts.pop(info.requestUrl().toString(), None)
+            return
+        first_party = info.firstPartyUrl().toString()
+        rule = engine.match(info.requestUrl().toString(), self.resource_types.get(resource_type, 'other'),
+                            first_party)
+        if rule is None:
+            return
+        info.block(True)
+        count = self.page_counts.pop(first_party, 0) + 1
+        self.page_counts[first_party] = count
+        if len(self.page_counts) > self.MAX_PAGES:
+            self.page_counts.popitem(last=False)
+        self.blocked_count_changed.emit(first_party, count)
+        
+    def blocked_count(self, url):
+        return self.page_counts.get(url, 0)
+        
+    def on_setting_changed(self, key, value):
+        if key == 'adblock_enabled':
+            self.enabled = value
+        elif key == 'adblock_dir':
+            self.watcher.removePaths(self.watcher.directories())
+            self.rules_dir = value
+            self.reload()
+
+
+class SettingsStore(QObject):
+    """统一的配置存储：启动时加载一次settings.json，读取只查内存字典，写入时原子替换文件"""
+    
+    setting_changed = pyqtSignal(str, object)
+    
+    # 默认值同时决定每项配置的类型
+    DEFAULTS = {
+        'homepage': "https://www.baidu.com",
+        'download_dir': "download",
+        'muted': False,
+        'password_hash': "",
+        'history_cleared': False,
+        'password_error': False,
+        'tab_freeze_after_s': 300,
+        'tab_memory_budget_mb': 2048,
+        'tab_memory_estimate_mb': 150,
+        'fast_startup': True,
+        'http_cache_type': 'disk',
+        'http_cache_size_mb': 512,
+        'cache_warmup': False,
+        'cache_warmup_count': 5,
+        'download_max_concurrent': 3,
+        'download_auto_save': False,
+        'history_retention_days': 0,
+        'history_max_entries': 0,
+        'history_compact_interval_h': 24,
+        'history_last_compacted': 0.0,
+        'prerender_enabled': True,
+        'prerender_max': 2,
+        'adblock_enabled': True,
+        'adblock_dir': 'adblock',
+        'screenshot_format': 'png',
+        'screenshot_quality': -1,
+        'screenshot_full_page': False,
+        'screenshot_burst': False,
+        'restore_session': True,
+        'session_save_interval_s': 30,
+        'memory_monitor_enabled': True,
+        'memory_sample_interval_s': 5,
+        'performance_preset': 'default',
+        'page_index_enabled': True,
+        'video_popout': False,
+    }
+    
+    # 旧版本分散保存的配置文件，首次启动时迁移
+    LEGACY_FILES = {
+        'homepage': 'homepage.txt',
+        'download_dir': 'download_dir.txt',
+        'muted': 'mute.txt',
+        'password_hash': 'password.txt',
+        'history_cleared': 'history_cleared.txt',
+        'password_error': 'password_error.txt',
+    }
+    
+    def __init__(self, path='settings.json', parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.values = dict(self.DEFAULTS)
+        
+        if os.path.exists(path):
+            self.values.update(self.read_file() or {})
+        else:
+            self.migrate_legacy()
+            
+        # 监听外部编辑；原子替换会换掉文件，所以每次变更后需要重新添加监听
+        self.watcher = QFileSystemWatcher(self)
+        if os.path.exists(path):
+            self.watcher.addPath(path)
+        self.watcher.fileChanged.connect(self.on_file_changed)
+        
+    @classmethod
+    def peek(cls, key, path='settings.json'):
+        """不创建QObject直接读取一项配置，供创建QApplication之前使用"""
+        default = cls.DEFAULTS[key]
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                value = json.load(f).get(key, default)
+        except (OSError, ValueError, AttributeError):
+            return default
+        return value if type(value) is type(default) else default
+        
+    def read_file(self):
+        """读取并校验配置文件，忽略未知项和类型不符的项；文件损坏或不完整时返回None"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取配置文件时出错: {e}")
+            return None
+        if not isinstance(data, dict):
+            logger.warning("配置文件内容不是JSON对象，已忽略")
+            return None
+        return {key: value for key, value in data.items()
+                if key in self.DEFAULTS and type(value) is type(self.DEFAULTS[key])}
+        
+    def migrate_legacy(self):
+        for key, legacy_path in self.LEGACY_FILES.items():
+            if not os.path.exists(legacy_path):
+                continue
+            try:
+                with open(legacy_path, 'r') as f:
+                    content = f.read().strip()
+            except (OSError, UnicodeDecodeError):
+                continue
+            if isinstance(self.DEFAULTS[key], bool):
+                self.values[key] = content == '1'
+            elif content:
+                self.values[key] = content
+        self.save()
+        for legacy_path in self.LEGACY_FILES.values():
+            if os.path.exists(legacy_path):
+                os.replace(legacy_path, legacy_path + '.migrated')
+        
+    def get(self, key):
+        return self.values[key]
+        
+    def set(self, key, value):
+        self.update({key: value})
+        
+    def update(self, changes):
+        """批量修改配置，只写一次文件，并为实际变化的项发出信号"""
+        changed = {}
+        for key, value in changes.items():
+            if key not in self.DEFAULTS:
+                raise KeyError(key)
+            if type(value) is not type(self.DEFAULTS[key]):
+                raise TypeError(f"配置项 {key} 需要 {type(self.DEFAULTS[key]).__name__} 类型")
+            if self.values[key] != value:
+                changed[key] = value
+        if not changed:
+            return
+        self.values.update(changed)
+        self.save()
+        for key, value in changed.items():
+            self.setting_changed.emit(key, value)
+            
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.values, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        
+    def on_file_changed(self, path):
+        if os.path.exists(path) and path not in self.watcher.files():
+            self.watcher.addPath(path)
+        if not os.path.exists(path):
+            return
+        # 外部程序可能正写到一半：读取失败时保留内存中的配置，等待下一次变更通知
+        new_values = self.read_file()
+        if new_values is None:
+            return
+        # 只更新文件中实际存在的项，缺失的项不回退为默认值；自己写入的内容与内存一致，不会产生变更信号
+        changed = {key: value for key, value in new_values.items() if self.values[key] != value}
+        self.values.update(changed)
+        for key, value in changed.items():
+            self.setting_changed.emit(key, value)
+
+
+HISTORY_COMPACT_DELAY_MS = 30_000
+HISTORY_BUSY_TIMEOUT_S = 0.5
+HISTORY_RETRY_MS = 2000
+
+
+def format_compaction_result(result):
+    return (f"历史记录整理完成: {result['rows_before']} -> {result['rows_after']} 条，"
+            f"合并重复 {result['merged']} 条，过期 {result['expired']} 条，"
+            f"超出上限 {result['trimmed']} 条，释放 {format_bytes(result['bytes_reclaimed'])}")
+
+
+class HistoryStore:
+    """基于SQLite的历史记录存储，每次访问对应一条带索引的记录"""
+    
+    def __init__(self, db_path='history.db', legacy_path='history.txt'):
+        self.db_path = db_path
+        self.legacy_path = legacy_path
+        # 后台整理只短暂持有写锁，界面线程不必长时间等待；超时的写入由调用方稍后重试
+        self.conn = sqlite3.connect(db_path, timeout=HISTORY_BUSY_TIMEOUT_S)
+        # 新数据库开启增量回收，整理后无需完整VACUUM即可归还空间（必须在建表之前设置）
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL模式下追加写入不需要每次同步整个数据库文件
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # visit_count/first_visit用于整理后把同一URL的多次访问合并为一条
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS visits (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                title TEXT NOT NULL DEFAULT '',
+                visit_time REAL,
+                visit_count INTEGER NOT NULL DEFAULT 1,
+                first_visit REAL
+            )
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(visits)")}
+        if 'visit_count' not in columns:
+            self.conn.execute("ALTER TABLE visits ADD COLUMN visit_count INTEGER NOT NULL DEFAULT 1")
+        if 'first_visit' not in columns:
+            self.conn.execute("ALTER TABLE visits ADD COLUMN first_visit REAL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_visits_url ON visits(url)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_visits_time ON visits(visit_time)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+        self.migrate_legacy()
+        
+    def migrate_legacy(self):
+        """一次性导入旧的url||title||time文本格式，导入后重命名原文件
+
+        导入与迁移标记在同一事务中提交：即使之后重命名失败，下次启动也只会重试重命名，不会重复导入。
+        """
+        if not os.path.exists(self.legacy_path):
+            return 0
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_migrated'").fetchone():
+            self.retire_legacy()
+            return 0
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except UnicodeDecodeError:
+            with open(self.legacy_path, 'r', encoding='gbk', errors='replace') as f:
+                lines = f.readlines()
+                
+        rows = []
+        for line in lines:
+            parts = line.strip().split('||')
+            if len(parts) == 3:
+                url, title, visit_time = parts
+                try:
+                    timestamp = datetime.fromisoformat(visit_time).timestamp()
+                except ValueError:
+                    timestamp = None
+                rows.append((url, title, timestamp))
+            elif len(parts) == 2:
+                url, title = parts
+                rows.append((url, title, None))
+            elif len(parts) == 1 and parts[0]:  # 兼容旧格式
+                rows.append((parts[0], '', None))
+                
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO visits (url, title, visit_time) VALUES (?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_migrated', ?)",
+                              (str(time.time()),))
+        self.retire_legacy()
+        return len(rows)
+        
+    def retire_legacy(self):
+        try:
+            os.replace(self.legacy_path, self.legacy_path + '.migrated')
+        except OSError as e:
+            logger.warning(f"重命名旧历史记录文件时出错，将在下次启动时重试: {e}")
+        
+    def add_visit(self, url, title, visit_time=None):
+        """追加一条访问记录，返回(id, url, title, visit_time)"""
+        if visit_time is None:
+            visit_time = time.time()
+        return self.add_visits([(url, title, visit_time)])[0]
+        
+    def add_visits(self, visits):
+        """在一个事务中追加多条(url, title, visit_time)，返回对应的(id, url, title, visit_time)列表"""
+        entries = []
+        with self.conn:
+            for url, title, visit_time in visits:
+                cursor = self.conn.execute(
+                    "INSERT INTO visits (url, title, visit_time) VALUES (?, ?, ?)",
+                    (url, title, visit_time))
+                entries.append((cursor.lastrowid, url, title, visit_time))
+        return entries
+        
+    def iter_visits(self):
+        """按访问顺序遍历全部记录"""
+        return self.conn.execute("SELECT id, url, title, visit_time FROM visits ORDER BY id")
+        
+    def fetch_page(self, before_id=None, limit=200):
+        """从新到旧取一页记录，before_id为上一页最后一条的id"""
+        if before_id is None:
+            return self.conn.execute(
+                "SELECT id, url, title, visit_time FROM visits ORDER BY id DESC LIMIT ?",
+                (limit,)).fetchall()
+        return self.conn.execute(
+            "SELECT id, url, title, visit_time FROM visits WHERE id < ? ORDER BY id DESC LIMIT ?",
+            (before_id, limit)).fetchall()
+        
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM visits").fetchone()[0]
+        
+    def visit_counts(self, urls):
+        """返回给定URL各自的访问次数"""
+        counts = {}
+        urls = list(urls)
+        # SQLite对参数个数有限制，分批查询
+        for i in range(0, len(urls), 500):
+            batch = urls[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            counts.update(self.conn.execute(
+                f"SELECT url, SUM(visit_count) FROM visits WHERE url IN ({placeholders}) GROUP BY url",
+                batch).fetchall())
+        return counts
+        
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM visits")
+        # 清空后VACUUM代价很小，顺便把旧数据库转换为增量回收模式
+        self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self.conn.execute("VACUUM")
+        
+    def close(self):
+        self.conn.close()
+
+
+def database_size(conn):
+    """数据库中实际使用的字节数（不含空闲页）"""
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return (page_count - freelist_count) * page_size
+
+
+# 整理时每个写事务处理的行数；事务短小，界面线程的写入只需等待几毫秒
+COMPACT_BATCH_ROWS = 500
+COMPACT_VACUUM_PAGES = 256
+
+
+def compact_in_batches(conn, statement, params=()):
+    """重复执行一条带LIMIT的DELETE，每批单独提交，返回删除的总行数"""
+    total = 0
+    while True:
+        with conn:
+            deleted = conn.execute(statement, (*params, COMPACT_BATCH_ROWS)).rowcount
+        total += deleted
+        if deleted < COMPACT_BATCH_ROWS:
+            return total
+        # 让出写锁，等待中的界面线程写入可以插进来
+        time.sleep(0.001)
+
+
+def compact_history(db_path, retention_days=0, max_entries=0, now=None):
+    """合并同一URL的重复访问并执行保留策略，返回整理统计（在后台线程中使用独立连接）
+
+    每个URL只保留最近一次访问的记录，visit_count累加、first_visit取最早一次。
+    retention_days和max_entries为0时表示不限制。
+    所有修改都拆成小事务提交，不长时间占用写锁；释放的页面通过incremental_vacuum分批归还，不执行完整VACUUM。
+    """
+    now = now or time.time()
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        rows_before = conn.execute("SELECT COUNT(*) FROM visits").fetchone()[0]
+        bytes_before = database_size(conn)
+        
+        # 只读地找出重复的URL（WAL模式下不阻塞写入），之后按批合并
+        duplicates = conn.execute("""
+            SELECT url, MAX(id), SUM(visit_count), MIN(COALESCE(first_visit, visit_time)), MAX(visit_time)
+            FROM visits GROUP BY url HAVING COUNT(*) > 1
+        """).fetchall()
+        merged = 0
+        batch_rows = 0
+        for url, keep_id, total, first, last in duplicates:
+            # 只合并统计时已存在的记录，整理期间新增的访问留给下一次整理
+            batch_rows += conn.execute(
+                "DELETE FROM visits WHERE url = ? AND id < ?", (url, keep_id)).rowcount
+            conn.execute(
+                "UPDATE visits SET visit_count = ?, first_visit = ?, visit_time = ? WHERE id = ?",
+                (total, first, last, keep_id))
+            if batch_rows >= COMPACT_BATCH_ROWS:
+                conn.commit()
+                merged += batch_rows
+                batch_rows = 0
+                time.sleep(0.001)
+        conn.commit()
+        merged += batch_rows
+            
+        expired = 0
+        if retention_days > 0:
+            # 旧格式迁移来的无时间记录不按时间清理
+            expired = compact_in_batches(
+                conn, "DELETE FROM visits WHERE id IN (SELECT id FROM visits WHERE visit_time < ? LIMIT ?)",
+                (now - retention_days * 86400,))
+            
+        trimmed = 0
+        if max_entries > 0:
+            excess = conn.execute("SELECT COUNT(*) FROM visits").fetchone()[0] - max_entries
+            while excess > 0:
+                with conn:
+                    deleted = conn.execute(
+                        "DELETE FROM visits WHERE id IN (SELECT id FROM visits ORDER BY id LIMIT ?)",
+                        (min(excess, COMPACT_BATCH_ROWS),)).rowcount
+                if not deleted:
+                    break
+                trimmed += deleted
+                excess -= deleted
+                time.sleep(0.001)
+                
+        if merged or expired or trimmed:
+            # 旧数据库未开启auto_vacuum时空闲页留在库内供之后的写入复用
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                while conn.execute("PRAGMA freelist_count").fetchone()[0]:
+                    conn.execute(f"PRAGMA incremental_vacuum({COMPACT_VACUUM_PAGES})").fetchall()
+                    time.sleep(0.001)
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        rows_after = conn.execute("SELECT COUNT(*) FROM visits").fetchone()[0]
+        bytes_after = database_size(conn)
+    finally:
+        conn.close()
+    return {
+        'rows_before': rows_before,
+        'rows_after': rows_after,
+        'merged': merged,
+        'expired': expired,
+        'trimmed': trimmed,
+        'bytes_reclaimed': max(0, bytes_before - bytes_after),
+    }
+
+
+# 中日韩文字没有空格分词，按相邻两字切分；其余文字按连续的字母数字切分
+CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+TEXT_TOKEN_RE = re.compile(f'([{CJK_RANGES}]+)|([^\\W_{CJK_RANGES}]+)')
+
+
+def tokenize_text(text):
+    """把文本切分为词列表：中文等连续文字切为重叠的两字词，其后再附上其中每个单字
+
+    两字词保持相邻供短语查询使用；单字使搜索单个字时能命中它出现的任意位置。
+    """
+    tokens = []
+    for cjk, word in TEXT_TOKEN_RE.findall(text.lower()):
+        if word:
+            tokens.append(word)
+        else:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            tokens.extend(cjk)
+    return tokens
+
+
+def build_match_query(query):
+    """把搜索框输入转换为FTS5查询：中文片段的两字词作为短语（要求相邻），单字匹配索引中的单字，最后一个词按前缀匹配"""
+    matches = TEXT_TOKEN_RE.findall(query.lower())
+    if not matches:
+        return None
+    terms = []
+    for cjk, word in matches:
+        if word:
+            terms.append(f'"{word}"')
+        elif len(cjk) == 1:
+            terms.append(f'"{cjk}"')
+        else:
+            terms.append('"' + ' '.join(cjk[i:i + 2] for i in range(len(cjk) - 1)) + '"')
+    # 单字已经能匹配包含它的任意位置，只有字母数字词需要前缀匹配
+    if matches[-1][1]:
+        terms[-1] += '*'
+    return ' '.join(terms)
+
+
+class PageTextIndex:
+    """访问过的页面正文的全文索引（SQLite FTS5），同一URL只保留最新内容；供后台线程调用，内部加锁"""
+    
+    # 只索引正文开头部分，避免超长页面拖慢写入
+    MAX_TEXT_CHARS = 50_000
+    # 常见词会命中大量页面，只对最近索引的这么多个命中计算相关度
+    RANK_CANDIDATES = 2000
+    # 切词方式变化时递增，旧版本的索引在打开时清空，之后随页面访问重新建立
+    INDEX_VERSION = 2
+    
+    def __init__(self, db_path='page_index.db'):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL UNIQUE,
+                title TEXT NOT NULL DEFAULT '',
+                digest TEXT NOT NULL,
+                indexed_at REAL NOT NULL
+            )
+        """)
+        # 存入的是已经切分好的词，unicode61只需按空格拆开
+        try:
+            self.conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS page_fts USING fts5(title, body)")
+            self.available = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"当前SQLite不支持FTS5，页面全文搜索不可用: {e}")
+            self.available = False
+        self.conn.commit()
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if self.available and version != self.INDEX_VERSION:
+            with self.conn:
+                dropped = self.conn.execute("DELETE FROM pages").rowcount
+                self.conn.execute("DELETE FROM page_fts")
+                self.conn.execute(f"PRAGMA user_version = {self.INDEX_VERSION}")
+            if dropped:
+                logger.info(f"页面全文索引格式已更新，清空旧索引的 {dropped} 个页面，之后随访问重新建立")
+        
+    def index_page(self, url, title, text):
+        """写入或更新一个页面，内容未变化时只更新时间，返回是否重新索引"""
+        if not self.available:
+            return False
+        text = text[:self.MAX_TEXT_CHARS]
+        digest = hashlib.sha1(f"{title}\0{text}".encode('utf-8', 'replace')).hexdigest()
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT id, digest FROM pages WHERE url = ?", (url,)).fetchone()
+            if row is not None and row[1] == digest:
+                self.conn.execute("UPDATE pages SET indexed_at = ? WHERE id = ?", (now, row[0]))
+                return False
+            if row is not None:
+                # 内容变化时换一个新的id，使id顺序始终等于最近索引的顺序
+                self.conn.execute("DELETE FROM pages WHERE id = ?", (row[0],))
+                self.conn.execute("DELETE FROM page_fts WHERE rowid = ?", (row[0],))
+            page_id = self.conn.execute(
+                "INSERT INTO pages (url, title, digest, indexed_at) VALUES (?, ?, ?, ?)",
+                (url, title, digest, now)).lastrowid
+            self.conn.execute("INSERT INTO page_fts (rowid, title, body) VALUES (?, ?, ?)",
+                              (page_id, ' '.join(tokenize_text(title)), ' '.join(tokenize_text(text))))
+        return True
+        
+    def search(self, query, limit=50):
+        """按相关度（标题权重更高）返回[(url, title)]
+
+        FTS5按rowid倒序遍历命中的页面，只为最近的RANK_CANDIDATES个计算bm25，
+        查询常见词时耗时不随索引页面数增长。
+        """
+        match = build_match_query(query)
+        if not self.available or match is None:
+            return []
+        with self.lock:
+            return self.conn.execute(
+                "SELECT pages.url, pages.title FROM ("
+                "  SELECT rowid, bm25(page_fts, 5.0, 1.0) AS score FROM page_fts"
+                "  WHERE page_fts MATCH ? ORDER BY rowid DESC LIMIT ?"
+                ") AS hits JOIN pages ON pages.id = hits.rowid ORDER BY hits.score LIMIT ?",
+                (match, self.RANK_CANDIDATES, limit)).fetchall()
+                
+    def count(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+            
+    def clear(self):
+        with self.lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM pages")
+                if self.available:
+                    self.conn.execute("DELETE FROM page_fts")
+            self.conn.execute("VACUUM")
+            
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class PageTextIndexer(QObject):
+    """页面加载完成并空闲一段时间后读取正文，在后台线程切词并写入PageTextIndex"""
+    
+    CAPTURE_DELAY_MS = 1500
+    
+    def __init__(self, page_index, settings_store, parent=None):
+        super().__init__(parent)
+        self.page_index = page_index
+        self.settings_store = settings_store
+        # 正在等待写入的URL，避免同一页面重复排队
+        self.pending = set()
+        
+    def capture(self, page):
+        if not self.page_index.available or not self.settings_store.get('page_index_enabled'):
+            return
+        if not page.url().toString().startswith('http'):
+            return
+        # 计时器挂在页面上，页面先被释放时随之取消
+        timer = QTimer(page)
+        timer.setSingleShot(True)
+        timer.timeout.connect(lambda: self.request_text(page))
+        timer.timeout.connect(timer.deleteLater)
+        timer.start(self.CAPTURE_DELAY_MS)
+        
+    def request_text(self, page):
+        # 地址和标题在请求时记下，回调时页面可能已经导航或被释放
+        url = page.url().toString()
+        title = page.title()
+        if url.startswith('http') and url not in self.pending:
+            page.toPlainText(lambda text: self.on_text(url, title, text))
+            
+    def on_text(self, url, title, text):
+        if not text or url in self.pending:
+            return
+        self.pending.add(url)
+        run_in_background(lambda: self.page_index.index_page(url, title, text),
+                          lambda changed: self.pending.discard(url),
+                          lambda error: self.on_failed(url, error))
+        
+    def on_failed(self, url, error):
+        self.pending.discard(url)
+        logger.error(f"索引页面内容时出错: {error}", extra={'url': url})
+
+
+# 在页面内读取Navigation Timing和Paint Timing，时间均相对于导航开始（毫秒）
+PAGE_TIMING_SCRIPT = """
+(function() {
+    var nav = performance.getEntriesByType('navigation')[0];
+    if (!nav) {
+        return null;
+    }
+    var paint = performance.getEntriesByName('first-contentful-paint')[0];
+    return {
+        ttfb: nav.responseStart,
+        dcl: nav.domContentLoadedEventEnd || null,
+        load: nav.loadEventEnd || nav.loadEventStart || performance.now(),
+        fcp: paint ? paint.startTime : null
+    };
+})()
+"""
+
+PAGE_METRICS = (('ttfb_ms', 'TTFB'), ('dcl_ms', 'DOMContentLoaded'), ('load_ms', 'load'), ('fcp_ms', 'FCP'))
+
+
+def percentile(values, p):
+    """已排序列表的最近秩百分位数，空列表返回None"""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * p // 100))
+    return values[rank - 1]
+
+
+class PageLoadTelemetry:
+    """记录每次导航的加载耗时，按来源(origin)汇总p50/p95"""
+    
+    MAX_SAMPLES = 20000
+    
+    def __init__(self, db_path='metrics.db'):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        # wall_ms/progress_ms为浏览器侧从loadStarted起的耗时，其余来自页面内的计时接口
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS page_loads (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                origin TEXT NOT NULL,
+                load_time REAL NOT NULL,
+                ok INTEGER NOT NULL,
+                wall_ms REAL,
+                progress_ms REAL,
+                ttfb_ms REAL,
+                dcl_ms REAL,
+                load_ms REAL,
+                fcp_ms REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_page_loads_origin ON page_loads(origin)")
+        # 只保留最近的样本，避免数据库无限增长
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM page_loads WHERE id <= (SELECT MAX(id) FROM page_loads) - ?",
+                (self.MAX_SAMPLES,))
+                
+    def collect(self, page, ok, started=None, first_progress=None):
+        """在loadFinished时调用，读取页面内计时后写入一条样本"""
+        url = page.url().toString()
+        if not url.startswith('http'):
+            return
+        finished = time.monotonic()
+        wall_ms = (finished - started) * 1000 if started is not None else None
+        progress_ms = None
+        if started is not None and first_progress is not None:
+            progress_ms = (first_progress - started) * 1000
+        if not ok:
+            self.add_sample(url, False, wall_ms, progress_ms, None)
+            return
+        page.runJavaScript(PAGE_TIMING_SCRIPT,
+                           lambda timing: self.add_sample(url, True, wall_ms, progress_ms, timing))
+        
+    def add_sample(self, url, ok, wall_ms, progress_ms, timing, load_time=None):
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        timing = timing or {}
+        try:
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO page_loads (url, origin, load_time, ok, wall_ms, progress_ms, "
+                    "ttfb_ms, dcl_ms, load_ms, fcp_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (url, origin, load_time or time.time(), int(ok), wall_ms, progress_ms,
+                     timing.get('ttfb'), timing.get('dcl'), timing.get('load'), timing.get('fcp')))
+        except sqlite3.Error as e:
+            logger.error(f"记录页面加载耗时时出错: {e}")
+            
+    def summary(self):
+        """每个来源一行：样本数、失败数以及各指标的p50/p95（毫秒）"""
+        columns = ', '.join(name for name, _ in PAGE_METRICS)
+        rows = self.conn.execute(
+            f"SELECT origin, ok, {columns} FROM page_loads ORDER BY origin")
+        result = []
+        for origin, group in itertools.groupby(rows, key=lambda row: row[0]):
+            group = list(group)
+            succeeded = [row for row in group if row[1]]
+            entry = {'origin': origin, 'samples': len(group), 'failed': len(group) - len(succeeded)}
+            for i, (name, _) in enumerate(PAGE_METRICS, 2):
+                values = sorted(row[i] for row in succeeded if row[i] is not None)
+                entry[name + '_p50'] = percentile(values, 50)
+                entry[name + '_p95'] = percentile(values, 95)
+            result.append(entry)
+        return result
+        
+    def samples(self):
+        cursor = self.conn.execute(
+            "SELECT url, origin, load_time, ok, wall_ms, progress_ms, ttfb_ms, dcl_ms, load_ms, fcp_ms "
+            "FROM page_loads ORDER BY id")
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+        
+    def export_csv(self, path):
+        """按来源导出汇总表，返回来源数"""
+        summary = self.summary()
+        fields = ['origin', 'samples', 'failed'] + [
+            name + suffix for name, _ in PAGE_METRICS for suffix in ('_p50', '_p95')]
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(summary)
+        return len(summary)
+        
+    def export_json(self, path):
+        """导出汇总和全部原始样本，返回来源数"""
+        data = {
+            'exported_at': datetime.now().isoformat(timespec='seconds'),
+            'origins': self.summary(),
+            'samples': self.samples(),
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return len(data['origins'])
+        
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM page_loads")
+            
+    def close(self):
+        self.conn.close()
+
+
+def format_ms(value):
+    return "-" if value is None else f"{value:.0f}"
+
+
+class PerformancePanel(QDialog):
+    """按来源显示页面加载耗时的p50/p95，可导出为CSV或JSON"""
+    
+    def __init__(self, telemetry, parent=None):
+        super().__init__(parent)
+        self.telemetry = telemetry
+        self.setWindowTitle("页面加载性能")
+        self.resize(900, 400)
+        
+        layout = QVBoxLayout()
+        headers = ["来源", "次数", "失败"]
+        for _, label in PAGE_METRICS:
+            headers += [f"{label} p50", f"{label} p95"]
+        self.table = QTableWidget(0, len(headers))
+        self.table.setHorizontalHeaderLabels(headers)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        
+        button_layout = QHBoxLayout()
+        refresh_btn = QPushButton("刷新")
+        csv_btn = QPushButton("导出CSV")
+        json_btn = QPushButton("导出JSON")
+        refresh_btn.clicked.connect(self.refresh)
+        csv_btn.clicked.connect(lambda: self.export("CSV文件 (*.csv)", telemetry.export_csv))
+        json_btn.clicked.connect(lambda: self.export("JSON文件 (*.json)", telemetry.export_json))
+        button_layout.addWidget(refresh_btn)
+        button_layout.addWidget(csv_btn)
+        button_layout.addWidget(json_btn)
+        
+        layout.addWidget(QLabel("单位：毫秒，从导航开始计时"))
+        layout.addWidget(self.table)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+        self.refresh()
+        
+    def refresh(self):
+        summary = self.telemetry.summary()
+        self.table.setRowCount(len(summary))
+        for row, entry in enumerate(summary):
+            values = [entry['origin'], str(entry['samples']), str(entry['failed'])]
+            for name, _ in PAGE_METRICS:
+                values += [format_ms(entry[name + '_p50']), format_ms(entry[name + '_p95'])]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+                
+    def export(self, file_filter, exporter):
+        path, _ = QFileDialog.getSaveFileName(self, "导出", "", file_filter)
+        if not path:
+            return
+        try:
+            count = exporter(path)
+            QMessageBox.information(self, "导出完成", f"已导出 {count} 个来源的数据到 {path}")
+        except OSError as e:
+            QMessageBox.warning(self, "导出失败", str(e))
+
+
+class BatchJob:
+    def __init__(self, index, url):
+        self.index = index
+        self.url = url
+        self.started = time.monotonic()
+        self.wall_ms = None
+        self.timing = None
+        self.done = False
+
+
+class BatchRenderer(QObject):
+    """无界面批量渲染：用固定数量的页面并发加载URL列表，为每个URL保存截图和加载耗时"""
+    
+    finished = pyqtSignal()
+    
+    # 加载完成后再等一小段时间，让首屏绘制完成后再截图
+    SETTLE_MS = 200
+    
+    def __init__(self, urls, output_dir, pool_size=4, timeout_s=30, viewport=(1280, 720), parent=None):
+        super().__init__(parent)
+        self.urls = urls
+        self.queue = deque(enumerate(urls))
+        self.output_dir = output_dir
+        self.pool_size = max(1, min(pool_size, len(urls)))
+        self.timeout_ms = int(timeout_s * 1000)
+        self.viewport = viewport
+        # 不落盘的临时profile，批量任务之间互不影响
+        self.profile = QWebEngineProfile(self)
+        self.slots = []
+        self.jobs = {}
+        self.counts = {'ok': 0, 'failed': 0, 'timeout': 0}
+        self.peak_renderer_bytes = 0
+        os.makedirs(output_dir, exist_ok=True)
+        self.results_file = open(os.path.join(output_dir, 'results.jsonl'), 'w', encoding='utf-8')
+        
+    def start(self):
+        self.started = time.monotonic()
+        for slot in range(self.pool_size):
+            view = QWebEngineView()
+            view.resize(*self.viewport)
+            view.show()
+            timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.timeout.connect(lambda v=view: self.on_timeout(v))
+            view.batch_timer = timer
+            view.batch_slot = slot
+            self.slots.append(view)
+            self.new_page(view)
+            self.next_url(view)
+            
+    def new_page(self, view):
+        """给槽位换一个新页面；超时后换页可丢弃旧页面尚未发出的信号"""
+        old_page = view.page()
+        page = QWebEnginePage(self.profile, view)
+        configure_page_settings(page)
+        page.setAudioMuted(True)
+        page.loadFinished.connect(lambda ok, v=view, p=page: self.on_load_finished(v, p, ok))
+        view.setPage(page)
+        if old_page is not None and old_page.parent() is view:
+            old_page.deleteLater()
+            
+    def next_url(self, view):
+        if not self.queue:
+            self.jobs.pop(view, None)
+            if not self.jobs:
+                self.finish()
+            return
+        index, url = self.queue.popleft()
+        job = BatchJob(index, url)
+        self.jobs[view] = job
+        view.batch_timer.start(self.timeout_ms)
+        view.load(QUrl(url))
+        
+    def on_load_finished(self, view, page, ok):
+        job = self.jobs.get(view)
+        if job is None or job.done or view.page() is not page:
+            return
+        job.wall_ms = (time.monotonic() - job.started) * 1000
+        if not ok:
+            self.record(view, job, 'failed')
+            return
+        page.runJavaScript(PAGE_TIMING_SCRIPT, lambda timing: self.on_timing(view, job, timing))
+        
+    def on_timing(self, view, job, timing):
+        job.timing = timing
+        QTimer.singleShot(self.SETTLE_MS, lambda: self.capture(view, job))
+        
+    def capture(self, view, job):
+        if job.done:
+            return
+        path = os.path.join(self.output_dir, f"{job.index:05d}.png")
+        if not view.grab().save(path, 'PNG'):
+            path = None
+        self.record(view, job, 'ok', path)
+        
+    def on_timeout(self, view):
+        job = self.jobs.get(view)
+        if job is None or job.done:
+            return
+        view.stop()
+        self.new_page(view)
+        self.record(view, job, 'timeout')
+        
+    def record(self, view, job, status, screenshot=None):
+        job.done = True
+        view.batch_timer.stop()
+        self.counts[status] += 1
+        timing = job.timing or {}
+        # 加载完成后渲染进程的内存占用（PSS，没有时为RSS），用于比较性能预设
+        usage = read_process_memory(view.page().renderProcessPid()) if status == 'ok' else None
+        renderer_bytes = (usage[1] if usage[1] is not None else usage[0]) if usage else None
+        if renderer_bytes:
+            self.peak_renderer_bytes = max(self.peak_renderer_bytes, renderer_bytes)
+        result = {
+            'index': job.index,
+            'url': job.url,
+            'status': status,
+            'final_url': view.url().toString() if status != 'timeout' else None,
+            'title': view.title() if status == 'ok' else None,
+            'wall_ms': job.wall_ms,
+            'ttfb_ms': timing.get('ttfb'),
+            'dcl_ms': timing.get('dcl'),
+            'load_ms': timing.get('load'),
+            'fcp_ms': timing.get('fcp'),
+            'screenshot': screenshot,
+            'renderer_mb': round(renderer_bytes / 2**20, 1) if renderer_bytes else None,
+            'slot': view.batch_slot,
+        }
+        self.results_file.write(json.dumps(result, ensure_ascii=False) + '\n')
+        self.results_file.flush()
+        # 回到事件循环后再开始下一个，避免在loadFinished处理中直接发起新加载
+        QTimer.singleShot(0, lambda: self.next_url(view))
+        
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        return dict(self.counts, total=len(self.urls), pool_size=self.pool_size, elapsed_s=elapsed,
+                    pages_per_s=len(self.urls) / elapsed if elapsed else 0.0, preset=ACTIVE_PRESET,
+                    peak_renderer_mb=round(self.peak_renderer_bytes / 2**20, 1))
+        
+    def finish(self):
+        self.results_file.close()
+        summary = self.summary()
+        with open(os.path.join(self.output_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"渲染 {summary['total']} 个URL：成功 {summary['ok']}，失败 {summary['failed']}，"
+              f"超时 {summary['timeout']}；并发 {summary['pool_size']}，用时 {summary['elapsed_s']:.1f} s，"
+              f"{summary['pages_per_s']:.2f} 页/秒")
+        for view in self.slots:
+            view.deleteLater()
+        self.finished.emit()
+
+
+def read_url_list(path):
+    """读取URL列表，每行一个，忽略空行和#注释；'-'表示标准输入"""
+    f = sys.stdin if path == '-' else open(path, 'r', encoding='utf-8')
+    try:
+        urls = []
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            urls.append(line if '://' in line else 'http://' + line)
+        return urls
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def run_batch(url_list, output_dir, pool_size=4, timeout_s=30, viewport=(1280, 720), qt_args=()):
+    """批量模式入口：不创建浏览器窗口、不要求密码，全部成功时返回0"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    urls = read_url_list(url_list)
+    app = QApplication(sys.argv[:1] + list(qt_args))
+    renderer = BatchRenderer(urls, output_dir, pool_size, timeout_s, viewport)
+    renderer.finished.connect(app.quit)
+    QTimer.singleShot(0, renderer.start)
+    app.exec()
+    return 0 if renderer.counts['ok'] == len(urls) else 1
+
+
+class LogFileReader:
+    """从新到旧逐块读取日志文件；每次读取时重新打开文件，不妨碍日志轮转"""
+    
+    BLOCK_SIZE = 64 * 1024
+    
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self.position = None
+        self.remainder = b''
+        self.pending = []
+        
+    def read_lines(self):
+        """返回下一批行（从新到旧），读完所有文件后返回空列表"""
+        while self.paths:
+            path = self.paths[0]
+            try:
+                with open(path, 'rb') as f:
+                    if self.position is None:
+                        f.seek(0, os.SEEK_END)
+                        self.position = f.tell()
+                    size = min(self.BLOCK_SIZE, self.position)
+                    self.position -= size
+                    f.seek(self.position)
+                    block = f.read(size) + self.remainder
+            except OSError:
+                self.position = 0
+                block = b''
+            lines = block.split(b'\n')
+            if self.position > 0:
+                # 块开头可能是半行，留到下一块拼接
+                self.remainder = lines.pop(0)
+            else:
+                self.remainder = b''
+                self.paths.pop(0)
+                self.position = None
+            lines = [line for line in reversed(lines) if line.strip()]
+            if lines:
+                return lines
+        return []
+
+
+def parse_log_line(line):
+    text = line.decode('utf-8', errors='replace').rstrip('\r')
+    try:
+        entry = json.loads(text)
+        if isinstance(entry, dict):
+            return entry
+    except ValueError:
+        pass
+    # 旧版error_log.txt的纯文本行
+    return {'time': '', 'level': 'ERROR', 'message': text}
+
+
+def format_log_entry(entry):
+    text = f"{entry.get('time', '')[:19].replace('T', ' ')} {entry.get('level', ''):<7} {entry.get('message', '')}"
+    if 'duration_ms' in entry:
+        text += f" ({entry['duration_ms']} ms)"
+    return text
+
+
+class LogListModel(QAbstractListModel):
+    """日志查看器模型：按需从文件末尾向前读取，只保留符合筛选条件的记录"""
+    
+    PAGE_SIZE = 200
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = []
+        self.min_level = logging.NOTSET
+        self.text = ''
+        self.reader = LogFileReader(log_files())
+        self.exhausted = False
+        
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.entries)
+        
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        entry = self.entries[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return format_log_entry(entry)
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return json.dumps(entry, ensure_ascii=False, indent=2)
+        return None
+        
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+        
+    def matches(self, entry):
+        if logging.getLevelName(entry.get('level', 'INFO')) < self.min_level:
+            return False
+        return not self.text or self.text in entry.get('message', '').lower()
+        
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        page = []
+        while len(page) < self.PAGE_SIZE:
+            lines = self.reader.read_lines()
+            if not lines:
+                self.exhausted = True
+                break
+            if self.text:
+                # 先按原始字节粗筛，避免逐行解析整个文件
+                needle = self.text.encode('utf-8')
+                lines = [line for line in lines if needle in line.lower()]
+            page.extend(entry for entry in map(parse_log_line, lines) if self.matches(entry))
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.entries), len(self.entries) + len(page) - 1)
+        self.entries.extend(page)
+        self.endInsertRows()
+        
+    def set_filter(self, min_level, text):
+        """修改筛选条件后从最新的记录重新读取"""
+        self.beginResetModel()
+        self.min_level = min_level
+        self.text = text.lower()
+        self.entries = []
+        self.reader = LogFileReader(log_files())
+        self.exhausted = False
+        self.endResetModel()
+
+
+class LogViewer(QDialog):
+    """分页查看日志，可按级别和关键字筛选"""
+    
+    LEVELS = [("全部", logging.NOTSET), ("信息", logging.INFO), ("警告", logging.WARNING), ("错误", logging.ERROR)]
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("日志")
+        self.resize(900, 600)
+        
+        self.model = LogListModel(self)
+        self.level_combo = QComboBox()
+        for name, level in self.LEVELS:
+            self.level_combo.addItem(name, level)
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索日志内容")
+        # 输入停顿后再重新筛选
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(300)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.level_combo.currentIndexChanged.connect(lambda _: self.apply_filter())
+        self.search_edit.textChanged.connect(lambda _: self.filter_timer.start())
+        
+        self.list_view = QListView()
+        self.list_view.setUniformItemSizes(True)
+        self.list_view.setModel(self.model)
+        
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.level_combo)
+        filter_layout.addWidget(self.search_edit)
+        layout = QVBoxLayout()
+        layout.addLayout(filter_layout)
+        layout.addWidget(self.list_view)
+        self.setLayout(layout)
+        
+    def apply_filter(self):
+        self.model.set_filter(self.level_combo.currentData(), self.search_edit.text())
+
+
+def benchmark_history(sizes=(10_000, 100_000, 1_000_000), inserts=1000):
+    """对比旧文本格式(追加+全量重读)与SQLite存储在不同规模下的耗时"""
+    import tempfile
+    
+    print(f"{'条目数':>10} {'迁移(s)':>10} {'插入(us/次)':>12} {'旧方式(ms/次)':>14} {'数据库(MB)':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            legacy_path = os.path.join(tmp, 'history.txt')
+            with open(legacy_path, 'w', encoding='utf-8') as f:
+                for i in range(size):
+                    f.write(f"https://example.com/page/{i}||示例页面 {i}||2024-01-01 12:00:00\n")
+                    
+            # 旧方式：每次访问追加一行后重新读取并拆分整个文件
+            start = time.perf_counter()
+            with open(legacy_path, 'a', encoding='utf-8') as f:
+                f.write("https://example.com/new||新页面||2024-01-01 12:00:00\n")
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                rows = [line.strip().split('||') for line in f]
+            legacy_ms = (time.perf_counter() - start) * 1000
+            del rows
+            
+            start = time.perf_counter()
+            store = HistoryStore(os.path.join(tmp, 'history.db'), legacy_path)
+            migrate_s = time.perf_counter() - start
+            
+            start = time.perf_counter()
+            for i in range(inserts):
+                store.add_visit(f"https://example.com/visit/{i}", f"访问 {i}")
+            insert_us = (time.perf_counter() - start) / inserts * 1_000_000
+            store.close()
+            
+            db_mb = os.path.getsize(os.path.join(tmp, 'history.db')) / (1024 * 1024)
+            print(f"{size:>10} {migrate_s:>10.2f} {insert_us:>12.1f} {legacy_ms:>14.1f} {db_mb:>10.1f}")
+
+
+MEDIA_BENCH_SCRIPT = """
+import resource, sys, time
+start = time.perf_counter()
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtWebEngineWidgets import QWebEngineView
+if sys.argv[1] == 'eager':
+    from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
+    from PyQt6.QtMultimediaWidgets import QVideoWidget
+imported = time.perf_counter()
+app = QApplication(sys.argv[:1])
+if sys.argv[1] == 'eager':
+    player = QMediaPlayer()
+    audio = QAudioOutput()
+    player.setAudioOutput(audio)
+    video = QVideoWidget()
+    player.setVideoOutput(video)
+    player.isAvailable()
+end = time.perf_counter()
+print(imported - start, end - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def benchmark_media_startup(runs=5):
+    """对比启动时立即创建多媒体栈与按需加载的导入耗时和内存峰值"""
+    import subprocess
+    import statistics
+    
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'))
+    print(f"{'模式':>8} {'导入(ms)':>10} {'初始化(ms)':>12} {'峰值RSS(MB)':>12}")
+    for mode in ('eager', 'lazy'):
+        results = []
+        for _ in range(runs):
+            output = subprocess.run([sys.executable, '-c', MEDIA_BENCH_SCRIPT, mode],
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            results.append([float(x) for x in output.split()[-3:]])
+        import_ms = statistics.median(r[0] for r in results) * 1000
+        total_ms = statistics.median(r[1] for r in results) * 1000
+        rss_mb = statistics.median(r[2] for r in results) / 1024
+        print(f"{mode:>8} {import_ms:>10.1f} {total_ms:>12.1f} {rss_mb:>12.1f}")
+
+
+STARTUP_FIXTURE_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>启动基准测试</title></head>
+<body><h1>GFY浏览器启动基准测试</h1>%s</body></html>
+"""
+
+
+def serve_startup_fixture():
+    """在本地随机端口启动HTTP测试页面，返回(server, url, 请求计数器)"""
+    import threading
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    
+    body = (STARTUP_FIXTURE_HTML % ("<p>" + "测试内容 " * 200 + "</p>")).encode('utf-8')
+    hits = []
+    
+    class FixtureHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(body)
+            
+        def log_message(self, format, *args):
+            pass
+            
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/", hits
+
+
+def run_startup_probe(url, legacy, timeout_s=30):
+    """启动浏览器并在启动流程结束后以JSON输出各阶段时间，由benchmark_startup在子进程中调用"""
+    STARTUP_TIMELINE.mark('imports')
+    app = QApplication(sys.argv[:1])
+    STARTUP_TIMELINE.mark('qapplication')
+    
+    settings_store = SettingsStore()
+    settings_store.set('homepage', url)
+    window = Browser(require_password=False, fast_startup=not legacy)
+    window.show()
+    
+    # 旧启动流程会在1秒后再次加载起始页，需要等第二次加载完成
+    expected_loads = 2 if legacy else 1
+    deadline = time.monotonic() + timeout_s
+    
+    def check_done():
+        marks = STARTUP_TIMELINE.marks
+        loads_done = len(STARTUP_TIMELINE.load_finished) >= expected_loads
+        if (loads_done and 'bookmarks_ready' in marks) or time.monotonic() > deadline:
+            STARTUP_TIMELINE.finish()
+            print(json.dumps(STARTUP_TIMELINE.as_dict()))
+            app.quit()
+            
+    poll_timer = QTimer()
+    poll_timer.timeout.connect(check_done)
+    poll_timer.start(10)
+    app.exec()
+
+
+def benchmark_startup(runs=5):
+    """在无界面模式下对比旧启动流程与快速启动流程的各阶段耗时"""
+    import subprocess
+    import statistics
+    import tempfile
+    
+    server, url, hits = serve_startup_fixture()
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    script = os.path.abspath(__file__)
+    phases = ['imports', 'qapplication', 'window_shown', 'first_load_finished',
+              'history_ready', 'bookmarks_ready']
+    
+    try:
+        print(f"{'模式':>8} " + " ".join(f"{phase:>20}" for phase in phases) + f" {'完成(ms)':>10} {'起始页请求':>10}")
+        for mode in ('legacy', 'fast'):
+            results = []
+            requests = []
+            for _ in range(runs):
+                del hits[:]
+                # 每次都在空的临时目录中运行，不影响真实的配置和历史记录
+                with tempfile.TemporaryDirectory() as tmp:
+                    args = [sys.executable, script, '--startup-probe', url]
+                    if mode == 'legacy':
+                        args.append('--legacy-startup')
+                    output = subprocess.run(args, cwd=tmp, env=env, capture_output=True,
+                                            text=True, check=True).stdout
+                results.append(json.loads(output.strip().splitlines()[-1]))
+                requests.append(len(hits))
+                
+            row = []
+            for phase in phases:
+                values = [r['marks'][phase] for r in results if phase in r['marks']]
+                row.append(f"{statistics.median(values) * 1000:>20.1f}" if values else f"{'-':>20}")
+            settled = [r['load_finished'][-1] for r in results if r['load_finished']]
+            settled_ms = statistics.median(settled) * 1000 if settled else float('nan')
+            print(f"{mode:>8} " + " ".join(row) + f" {settled_ms:>10.1f} {statistics.median(requests):>10}")
+    finally:
+        server.shutdown()
+
+
+def benchmark_session(sizes=(1, 50), runs=5):
+    """对比恢复不同标签页数量的会话时的启动耗时和实际发出的页面请求数"""
+    import subprocess
+    import statistics
+    import tempfile
+    
+    server, url, hits = serve_startup_fixture()
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    script = os.path.abspath(__file__)
+    
+    try:
+        print(f"{'标签页':>8} {'窗口显示(ms)':>14} {'首页加载完成(ms)':>18} {'页面请求':>10}")
+        for size in sizes:
+            shown = []
+            loaded = []
+            requests = []
+            for _ in range(runs):
+                del hits[:]
+                with tempfile.TemporaryDirectory() as tmp:
+                    tabs = [SessionTab(f"{url}page/{i}", f"页面 {i}") for i in range(size)]
+                    SessionStore(os.path.join(tmp, 'session.bin')).save(tabs, 0)
+                    output = subprocess.run([sys.executable, script, '--startup-probe', url], cwd=tmp,
+                                            env=env, capture_output=True, text=True, check=True).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                shown.append(result['marks'].get('window_shown', float('nan')))
+                loaded.append(result['marks'].get('first_load_finished', float('nan')))
+                requests.append(len(hits))
+            print(f"{size:>8} {statistics.median(shown) * 1000:>14.1f} "
+                  f"{statistics.median(loaded) * 1000:>18.1f} {statistics.median(requests):>10}")
+    finally:
+        server.shutdown()
+
+
+def benchmark_omnibox(size=1_000_000, queries=10_000, budget_ms=1.0):
+    """在size条合成历史上测量每次按键的补全耗时，p99超过预算时返回非零"""
+    import random
+    import gc
+    
+    rng = random.Random(2024)
+    words = ['新闻', '报告', '项目', '会议', '财务', '设计', '周报', '文档', 'github', 'docs',
+             'issue', 'weekly', 'dashboard', 'python', 'release', 'plan']
+    now = time.time()
+    start = time.perf_counter()
+    rows = []
+    for i in range(size):
+        domain = rng.randrange(20000)
+        rows.append((f"https://{'www.' if domain % 3 == 0 else ''}site{domain}.corp{domain % 7}.com/{rng.choice(words)}/{i}",
+                     f"{rng.choice(words)} {rng.choice(words)} 页面 {i}",
+                     rng.randrange(1, 50), now - rng.randrange(0, 200 * 86400)))
+    index = OmniboxIndex.build(rows)
+    del rows
+    print(f"构建 {size} 条索引: {time.perf_counter() - start:.1f} s")
+    
+    # 模拟逐字输入：URL前缀、标题关键词以及关键词片段
+    keys = index.state[0][0]
+    inputs = []
+    for _ in range(queries):
+        kind = rng.random()
+        if kind < 0.6:
+            key = rng.choice(keys)
+            inputs.append(key[:rng.randint(1, 20)])
+        elif kind < 0.8:
+            inputs.append(rng.choice(words))
+        else:
+            word = rng.choice(words)
+            inputs.append(word[:rng.randint(1, len(word))])
+            
+    gc.disable()
+    try:
+        latencies = []
+        for text in inputs:
+            start = time.perf_counter()
+            index.suggest(text)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"每次按键: p50 {p50:.3f} ms  p99 {p99:.3f} ms  最大 {latencies[-1] * 1000:.3f} ms")
+    
+    # 积累一批新URL后在后台线程合并，同时继续模拟按键
+    for i in range(OmniboxIndex.DELTA_LIMIT):
+        index.record_visit(f"https://new{i}.example.com/{rng.choice(words)}", rng.choice(words), now)
+    merger = threading.Thread(target=index.merge_delta)
+    start = time.perf_counter()
+    merger.start()
+    merge_latencies = []
+    while merger.is_alive():
+        text = rng.choice(inputs)
+        begin = time.perf_counter()
+        index.suggest(text)
+        merge_latencies.append(time.perf_counter() - begin)
+        # 按键之间留出间隔，模拟用户输入
+        time.sleep(0.002)
+    merger.join()
+    merge_latencies.sort()
+    merge_p99 = merge_latencies[int(len(merge_latencies) * 0.99)] * 1000
+    print(f"后台合并 {OmniboxIndex.DELTA_LIMIT} 条新URL: {time.perf_counter() - start:.2f} s，"
+          f"期间 {len(merge_latencies)} 次按键 p99 {merge_p99:.3f} ms  最大 {merge_latencies[-1] * 1000:.3f} ms")
+    if p99 >= budget_ms or merge_p99 >= budget_ms:
+        print(f"超出延迟预算 {budget_ms} ms")
+        return False
+    return True
+
+
+def benchmark_page_search(pages=100_000, queries=1000, budget_ms=50.0):
+    """在pages个合成页面的全文索引上测量搜索耗时，p95超过预算时返回False"""
+    import random
+    import tempfile
+    
+    rng = random.Random(2024)
+    # 词频按Zipf分布：少数常见词出现在大部分页面中，多数词只出现在少数页面中
+    chars = [chr(code) for code in range(0x4e00, 0x4e00 + 3000)]
+    vocabulary = [''.join(rng.choice(chars) for _ in range(rng.choice((2, 2, 2, 3, 4)))) for _ in range(20000)]
+    vocabulary += ['github', 'docs', 'issue', 'weekly', 'dashboard', 'python', 'release', 'plan', 'kernel', 'cache']
+    rng.shuffle(vocabulary)
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+    words = lambda k: rng.choices(vocabulary, cum_weights=weights, k=k)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = PageTextIndex(os.path.join(tmp, 'page_index.db'))
+        if not index.available:
+            print("当前SQLite不支持FTS5")
+            return False
+        start = time.perf_counter()
+        for i in range(pages):
+            text = '，'.join(''.join(words(rng.randint(2, 6))) for _ in range(40))
+            index.index_page(f"https://site{i % 5000}.example.com/page/{i}", ' '.join(words(3)), text)
+        elapsed = time.perf_counter() - start
+        print(f"索引 {pages} 个页面: {elapsed:.1f} s（平均每页 {elapsed * 1000 / pages:.2f} ms，在后台线程执行）")
+        
+        # 单字查询必须能命中它在两字词中的任意位置，且可以与其他词组合
+        index.index_page("https://check.example.com/zh", "中文 python 教程", "这个页面介绍中文分词")
+        for query in ('中 python', '面', '文', '分词 中', '页面 python'):
+            if ("https://check.example.com/zh", "中文 python 教程") not in index.search(query, limit=index.RANK_CANDIDATES):
+                print(f"查询 {query!r} 没有命中包含它的页面")
+                index.close()
+                return False
+                
+        # 约一成查询是单个汉字
+        inputs = [rng.choice(chars) if rng.random() < 0.1 else ' '.join(words(rng.randint(1, 3)))
+                  for _ in range(queries)]
+        latencies = []
+        for query in inputs:
+            start = time.perf_counter()
+            index.search(query)
+            latencies.append(time.perf_counter() - start)
+        index.close()
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    print(f"每次搜索: p50 {p50:.2f} ms  p95 {p95:.2f} ms  最大 {latencies[-1] * 1000:.2f} ms")
+    if p95 >= budget_ms:
+        print(f"超出延迟预算 {budget_ms} ms")
+        return False
+    return True
+
+
+def synthetic_filter_rules(count, rng):
+    """生成与EasyList结构相近的规则：约六成域名规则，其余为路径、参数和通配符规则"""
+    words = ['ad', 'ads', 'advert', 'banner', 'track', 'pixel', 'beacon', 'promo', 'sponsor', 'analytics',
+             'popunder', 'affiliate', 'click', 'stat', 'counter', 'metrics', 'tag', 'widget', 'social']
+    rules = ['! 合成规则', '[Adblock Plus 2.0]']
+    for i in range(count):
+        word = rng.choice(words)
+        kind = rng.random()
+        if kind < 0.6:
+            options = rng.choice(['', '', '$third-party', '$script,third-party', '$image'])
+            if i % 500 == 0:
+                # 少量$important规则，与EasyList中的比例相近
+                options = options + ',important' if options else '$important'
+            rules.append(f"||{word}{i}.{rng.choice(['com', 'net', 'cn', 'io'])}^{options}")
+        elif kind < 0.8:
+            rules.append(f"/{word}{i}/{rng.choice(words)}_{rng.choice(['', 'img', 'js'])}")
+        elif kind < 0.9:
+            rules.append(f"&{word}_{i}=")
+        elif kind < 0.97:
+            rules.append(f"||cdn{i % 500}.example.com/{word}{i}/*.js")
+        else:
+            rules.append(f"@@||cdn{i % 500}.example.com/{word}{i}/allowed.js")
+    return rules
+
+
+def synthetic_request_corpus(count, rng, rules):
+    """生成(url, 类型, 所在页面)请求，约一成取自规则本身，应当被拦截"""
+    types = ['script', 'image', 'stylesheet', 'xmlhttprequest', 'subdocument', 'font', 'media', 'other']
+    sites = [f"https://www.site{i}.com/" for i in range(200)]
+    hosts = [rule[2:].split('^', 1)[0] for rule in rules if rule.startswith('||') and '/' not in rule]
+    paths = [rule for rule in rules if rule.startswith('/')]
+    corpus = []
+    for i in range(count):
+        page = rng.choice(sites)
+        r = rng.random()
+        if r < 0.05:
+            url = f"https://{rng.choice(hosts)}/serve/{i}.js?cb={rng.randrange(10**9)}"
+        elif r < 0.1:
+            url = f"https://img.site{rng.randrange(200)}.com{rng.choice(paths)}{i}.png"
+        else:
+            url = (f"https://{rng.choice(['static', 'img', 'api', 'cdn'])}.site{rng.randrange(200)}.com/"
+                   f"{rng.choice(['assets', 'js', 'images', 'v1/items', 'css'])}/{rng.choice(['main', 'app', 'vendor', 'logo', 'list'])}"
+                   f".{rng.choice(['js', 'png', 'css', 'json'])}?v={rng.randrange(10**6)}&id={i}")
+        corpus.append((url, rng.choice(types), page))
+    return corpus
+
+
+def load_request_corpus(path):
+    """读取记录的请求：每行 url<TAB>类型<TAB>所在页面，后两列可省略"""
+    corpus = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if parts[0]:
+                corpus.append((parts[0], parts[1] if len(parts) > 1 else 'other',
+                               parts[2] if len(parts) > 2 else ''))
+    return corpus
+
+
+def benchmark_adblock(rule_count=50_000, requests=100_000, rules_path=None, corpus_path=None,
+                      budget_us=5.0, p99_budget_us=15.0):
+    """测量拦截引擎的编译时间和每个请求的匹配耗时，中位数或p99超过预算时返回False"""
+    import random
+    import gc
+    
+    # $important拦截规则必须优先于例外规则
+    check = FilterEngine.compile(['||important.example^$important', '@@||important.example^'])
+    if check.match('https://important.example/a.js', 'script', 'https://site.example/') is None:
+        print("$important规则被例外规则覆盖")
+        return False
+        
+    rng = random.Random(2024)
+    if rules_path:
+        with open(rules_path, 'r', encoding='utf-8', errors='replace') as f:
+            lines = f.read().splitlines()
+    else:
+        lines = synthetic_filter_rules(rule_count, rng)
+    start = time.perf_counter()
+    engine = FilterEngine.compile(lines)
+    print(f"编译 {engine.rule_count} 条规则（跳过 {engine.skipped} 条）: {time.perf_counter() - start:.2f} s")
+    
+    if corpus_path:
+        corpus = load_request_corpus(corpus_path)
+    else:
+        corpus = synthetic_request_corpus(requests, rng, lines)
+    gc.disable()
+    try:
+        blocked = 0
+        latencies = []
+        match = engine.match
+        for url, resource_type, first_party in corpus:
+            start = time.perf_counter()
+            rule = match(url, resource_type, first_party)
+            latencies.append(time.perf_counter() - start)
+            if rule is not None:
+                blocked += 1
+    finally:
+        gc.enable()
+    latencies.sort()
+    mean = sum(latencies) / len(latencies) * 1e6
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    print(f"{len(corpus)} 个请求，拦截 {blocked} 个")
+    print(f"每个请求: 平均 {mean:.2f} us  p50 {p50:.2f} us  p99 {p99:.2f} us  最大 {latencies[-1] * 1e6:.1f} us")
+    if p50 >= budget_us or p99 >= p99_budget_us:
+        print(f"超出匹配预算（p50 {budget_us} us，p99 {p99_budget_us} us）")
+        return False
+    return True
+
+
+def benchmark_batch(pool_sizes=(1, 2, 4, 8), pages=48):
+    """用本地测试页面比较不同并发数下批量渲染的吞吐量"""
+    import subprocess
+    import tempfile
+    
+    server, url, _ = serve_startup_fixture()
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    script = os.path.abspath(__file__)
+    try:
+        print(f"{'并发':>6} {'用时(s)':>10} {'页/秒':>10} {'加速比':>8} {'成功':>6}")
+        baseline = None
+        for pool_size in pool_sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                url_list = os.path.join(tmp, 'urls.txt')
+                with open(url_list, 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(f"{url}page/{i}" for i in range(pages)))
+                output_dir = os.path.join(tmp, 'out')
+                subprocess.run([sys.executable, script, '--batch', url_list, '--batch-out', output_dir,
+                                '--batch-pool', str(pool_size)],
+                               cwd=tmp, env=env, capture_output=True, text=True)
+                with open(os.path.join(output_dir, 'summary.json'), 'r', encoding='utf-8') as f:
+                    summary = json.load(f)
+            throughput = summary['pages_per_s']
+            baseline = baseline or throughput
+            print(f"{pool_size:>6} {summary['elapsed_s']:>10.2f} {throughput:>10.2f} "
+                  f"{throughput / baseline:>8.2f} {summary['ok']:>6}")
+    finally:
+        server.shutdown()
+
+
+PRESET_CORPUS_PAGES = {
+    'text': """<!DOCTYPE html><html><head><meta charset="utf-8"><title>文本</title></head><body>%s</body></html>"""
+            % (("<p>" + "性能预设测试文本 " * 400 + "</p>") * 20),
+    'table': """<!DOCTYPE html><html><head><meta charset="utf-8"><title>表格</title></head><body><table>%s</table></body></html>"""
+             % "".join(f"<tr><td>{i}</td><td>行 {i}</td><td>{i * 7 % 1000}</td></tr>" for i in range(5000)),
+    'canvas': """<!DOCTYPE html><html><head><meta charset="utf-8"><title>画布</title></head><body>
+<canvas id="c" width="1200" height="700"></canvas><script>
+var ctx = document.getElementById('c').getContext('2d');
+for (var i = 0; i < 20000; i++) {
+  ctx.fillStyle = 'hsl(' + (i % 360) + ',70%,50%)';
+  ctx.fillRect((i * 37) % 1200, (i * 53) % 700, 20, 20);
+}
+</script></body></html>""",
+    'webgl': """<!DOCTYPE html><html><head><meta charset="utf-8"><title>WebGL</title></head><body>
+<canvas id="g" width="1200" height="700"></canvas><script>
+var gl = document.getElementById('g').getContext('webgl');
+if (gl) { for (var i = 0; i < 200; i++) { gl.clearColor(i / 200, 0.5, 0.5, 1); gl.clear(gl.COLOR_BUFFER_BIT); } }
+</script></body></html>""",
+}
+
+
+def write_preset_corpus(directory, repeats):
+    """生成覆盖文本、大表格、2D画布和WebGL的本地测试页面，返回file:// URL列表"""
+    urls = []
+    for name, html in PRESET_CORPUS_PAGES.items():
+        path = os.path.join(directory, f"{name}.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html)
+        urls.append(QUrl.fromLocalFile(os.path.abspath(path)).toString())
+    return [f"{url}?run={i}" for i in range(repeats) for url in urls]
+
+
+def benchmark_presets(presets=None, repeats=5, corpus_dir=None):
+    """在各性能预设下用批量模式加载同一组本地页面，比较加载耗时、CPU时间和渲染进程内存"""
+    import subprocess
+    import statistics
+    import tempfile
+    try:
+        import resource
+    except ImportError:
+        resource = None
+        
+    env = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+    script = os.path.abspath(__file__)
+    print(f"{'预设':>16} {'成功':>6} {'加载中位数(ms)':>14} {'总用时(s)':>10} {'CPU(s)':>8} {'渲染进程峰值(MB)':>16}")
+    for preset in presets or list(PERFORMANCE_PRESETS):
+        with tempfile.TemporaryDirectory() as tmp:
+            if corpus_dir:
+                urls = [QUrl.fromLocalFile(os.path.abspath(os.path.join(corpus_dir, name))).toString()
+                        for name in sorted(os.listdir(corpus_dir)) if name.endswith(('.html', '.htm', '.mhtml'))]
+            else:
+                urls = write_preset_corpus(tmp, repeats)
+            url_list = os.path.join(tmp, 'urls.txt')
+            with open(url_list, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(urls))
+            output_dir = os.path.join(tmp, 'out')
+            # 子进程及其渲染进程退出后，CPU时间计入RUSAGE_CHILDREN
+            before = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+            subprocess.run([sys.executable, script, '--batch', url_list, '--batch-out', output_dir,
+                            '--batch-pool', '1', '--preset', preset],
+                           cwd=tmp, env=env, capture_output=True, text=True)
+            if resource:
+                after = resource.getrusage(resource.RUSAGE_CHILDREN)
+                cpu = f"{after.ru_utime + after.ru_stime - before.ru_utime - before.ru_stime:>8.2f}"
+            else:
+                cpu = f"{'-':>8}"
+            with open(os.path.join(output_dir, 'summary.json'), 'r', encoding='utf-8') as f:
+                summary = json.load(f)
+            with open(os.path.join(output_dir, 'results.jsonl'), 'r', encoding='utf-8') as f:
+                wall = [r['wall_ms'] for r in map(json.loads, f) if r['status'] == 'ok']
+        median = f"{statistics.median(wall):>14.1f}" if wall else f"{'-':>14}"
+        print(f"{preset:>16} {summary['ok']:>6} {median} {summary['elapsed_s']:>10.2f} {cpu} "
+              f"{summary['peak_renderer_mb']:>16.1f}")
+
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="GFY浏览器")
+    parser.add_argument('--bench-history', action='store_true', help="运行历史记录存储基准测试后退出")
+    parser.add_argument('--bench-media', action='store_true', help="对比多媒体栈立即加载与按需加载的启动开销后退出")
+    parser.add_argument('--bench-startup', action='store_true', help="在无界面模式下运行冷启动基准测试后退出")
+    parser.add_argument('--bench-session', action='store_true', help="对比恢复1个和50个标签页的会话时的启动耗时后退出")
+    parser.add_argument('--bench-omnibox', action='store_true', help="测量100万条历史下的地址栏补全延迟后退出")
+    parser.add_argument('--bench-search', action='store_true', help="测量10万个页面的全文索引上的搜索延迟后退出")
+    parser.add_argument('--bench-adblock', action='store_true', help="测量5万条规则下拦截引擎的单次匹配耗时后退出")
+    parser.add_argument('--adblock-rules', metavar='FILE', help="--bench-adblock使用的规则文件（默认生成合成规则）")
+    parser.add_argument('--adblock-corpus', metavar='FILE', help="--bench-adblock使用的请求记录，每行 url<TAB>类型<TAB>所在页面")
+    parser.add_argument('--bench-batch', action='store_true', help="比较不同并发数下批量渲染的吞吐量后退出")
+    parser.add_argument('--batch', metavar='URL_LIST', help="无界面批量渲染URL列表（每行一个，'-'为标准输入），输出截图和results.jsonl后退出")
+    parser.add_argument('--batch-out', metavar='DIR', default='batch_output', help="批量模式的输出目录")
+    parser.add_argument('--batch-pool', metavar='N', type=int, default=4, help="批量模式同时加载的页面数")
+    parser.add_argument('--batch-timeout', metavar='SECONDS', type=float, default=30, help="批量模式每个URL的超时时间")
+    parser.add_argument('--batch-viewport', metavar='WxH', default='1280x720', help="批量模式的页面尺寸")
+    parser.add_argument('--bench-presets', action='store_true', help="在各性能预设下加载本地测试页面，比较加载耗时、CPU和内存后退出")
+    parser.add_argument('--preset-corpus', metavar='DIR', help="--bench-presets使用的本地页面目录（默认生成测试页面）")
+    parser.add_argument('--preset', choices=list(PERFORMANCE_PRESETS),
+                        help="性能预设，覆盖设置中保存的值（default、low-memory、software-raster、throughput）")
+    parser.add_argument('--legacy-startup', action='store_true', help="使用旧的启动流程（重复加载起始页、固定延时）")
+    parser.add_argument('--startup-probe', metavar='URL', help=argparse.SUPPRESS)
+    args, qt_args = parser.parse_known_args()
+    
+    if args.bench_history:
+        benchmark_history()
+        sys.exit(0)
+    if args.bench_media:
+        benchmark_media_startup()
+        sys.exit(0)
+    if args.bench_startup:
+        benchmark_startup()
+        sys.exit(0)
+    if args.bench_session:
+        benchmark_session()
+        sys.exit(0)
+    if args.bench_omnibox:
+        sys.exit(0 if benchmark_omnibox() else 1)
+    if args.bench_search:
+        sys.exit(0 if benchmark_page_search() else 1)
+    if args.bench_adblock:
+        sys.exit(0 if benchmark_adblock(rules_path=args.adblock_rules, corpus_path=args.adblock_corpus) else 1)
+    if args.bench_batch:
+        benchmark_batch()
+        sys.exit(0)
+    if args.bench_presets:
+        benchmark_presets(corpus_dir=args.preset_corpus)
+        sys.exit(0)
+        
+    # 以下各模式都会创建QApplication，Chromium参数必须在此之前设置
+    apply_performance_preset(args.preset or SettingsStore.peek('performance_preset'))
+    if args.batch:
+        width, height = (int(value) for value in args.batch_viewport.lower().split('x'))
+        sys.exit(run_batch(args.batch, args.batch_out, args.batch_pool, args.batch_timeout,
+                           (width, height), qt_args))
+    if args.startup_probe:
+        run_startup_probe(args.startup_probe, args.legacy_startup)
+        sys.exit(0)
+        
     try:
-        app = QApplication(sys.argv)
-        window = Browser()
+        STARTUP_TIMELINE.mark('imports')
+        app = QApplication(sys.argv[:1] + qt_args)
+        STARTUP_TIMELINE.mark('qapplication')
+        window = Browser(fast_startup=False if args.legacy_startup else None)
         window.show()
         app.exec()
     except KeyboardInterrupt:
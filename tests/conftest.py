@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# 测试直接导入仓库根目录下的browser.py，在无显示环境中运行
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    pytest.importorskip('PyQt6.QtWebEngineWidgets')
+    from PyQt6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
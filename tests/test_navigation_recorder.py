@@ -0,0 +1,164 @@
+"""NavigationRecorder：每次提交的导航只记录一条访问，信号连接不叠加、不泄漏"""
+import pytest
+
+pytest.importorskip('PyQt6.QtWebEngineWidgets')
+
+import browser
+from PyQt6.QtCore import QObject, QUrl, pyqtSignal
+
+
+class StubView(QObject):
+    """只提供记录器用到的三个信号的替身视图"""
+
+    urlChanged = pyqtSignal(QUrl)
+    titleChanged = pyqtSignal(str)
+    loadFinished = pyqtSignal(bool)
+
+    def navigate(self, url):
+        self.urlChanged.emit(QUrl(url))
+
+    def receiver_count(self):
+        return sum(self.receivers(signal) for signal in (self.urlChanged, self.titleChanged, self.loadFinished))
+
+
+class FakeClock:
+    """以整数毫秒计时，避免浮点累加误差影响边界判断"""
+
+    def __init__(self):
+        self.now_ms = 1_000_000
+
+    def __call__(self):
+        return self.now_ms / 1000
+
+    def advance(self, ms):
+        self.now_ms += ms
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(browser.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def recorder(qapp, clock):
+    recorder = browser.NavigationRecorder()
+    recorder.committed = []
+    recorder.visits_committed.connect(recorder.committed.extend)
+    yield recorder
+    recorder.settle_timer.stop()
+    recorder.flush_timer.stop()
+
+
+@pytest.fixture
+def view(recorder):
+    view = StubView()
+    recorder.attach(view)
+    return view
+
+
+def recorded(recorder):
+    recorder.flush_all()
+    return [(url, title) for url, title, _ in recorder.committed]
+
+
+def test_rapid_navigations_record_each_url_once(recorder, view):
+    for url in ('https://a.example/', 'https://b.example/', 'https://c.example/'):
+        view.navigate(url)
+    # 同一导航的重定向或重复通知不产生新的记录
+    view.navigate('https://c.example/')
+    view.loadFinished.emit(True)
+    view.loadFinished.emit(True)
+
+    assert recorded(recorder) == [('https://a.example/', ''), ('https://b.example/', ''),
+                                  ('https://c.example/', '')]
+
+
+def test_fragment_only_changes_are_not_new_visits(recorder, view):
+    view.navigate('https://a.example/doc')
+    view.navigate('https://a.example/doc#intro')
+    view.navigate('https://a.example/doc#usage')
+
+    assert recorded(recorder) == [('https://a.example/doc', '')]
+
+
+def test_title_settles_after_load(recorder, view, clock):
+    view.navigate('https://a.example/')
+    view.titleChanged.emit('加载中')
+    view.loadFinished.emit(True)
+    view.titleChanged.emit('首页')
+    clock.advance(browser.NavigationRecorder.TITLE_SETTLE_MS - 1)
+    recorder.settle()
+    assert recorder.pending
+
+    clock.advance(1)
+    recorder.settle()
+    assert not recorder.pending
+    assert recorded(recorder) == [('https://a.example/', '首页')]
+
+
+def test_title_that_never_changes_is_committed_once(recorder, view, clock):
+    view.navigate('https://a.example/')
+    view.loadFinished.emit(True)
+    clock.advance(browser.NavigationRecorder.TITLE_SETTLE_MS)
+    recorder.settle()
+    recorder.settle()
+
+    assert recorded(recorder) == [('https://a.example/', '')]
+
+
+def test_page_that_never_finishes_loading_is_committed(recorder, view, clock):
+    view.navigate('https://slow.example/')
+    clock.advance(browser.NavigationRecorder.LOAD_WAIT_MS)
+    recorder.settle()
+
+    assert recorded(recorder) == [('https://slow.example/', '')]
+
+
+def test_tab_closed_mid_load(recorder, view):
+    view.navigate('https://a.example/')
+    view.titleChanged.emit('标题')
+    recorder.detach(view)
+    # 视图释放前迟到的信号不再产生记录
+    view.loadFinished.emit(True)
+    view.navigate('https://b.example/')
+
+    assert recorded(recorder) == [('https://a.example/', '标题')]
+    assert view not in recorder.pending
+    assert view.receiver_count() == 0
+
+
+def test_non_http_urls_are_not_recorded(recorder, view):
+    view.navigate('https://a.example/')
+    view.navigate('about:blank')
+    view.navigate('file:///tmp/page.html')
+
+    assert recorded(recorder) == [('https://a.example/', '')]
+
+
+def test_attach_does_not_stack_connections(recorder, view):
+    connected = view.receiver_count()
+    recorder.attach(view)
+    recorder.attach(view)
+    assert view.receiver_count() == connected == 3
+
+    view.navigate('https://a.example/')
+    assert recorded(recorder) == [('https://a.example/', '')]
+
+    recorder.detach(view)
+    assert view.receiver_count() == 0
+    assert view not in recorder.connections
+
+
+def test_visits_are_flushed_in_one_batch(recorder, qapp):
+    views = [StubView() for _ in range(3)]
+    for i, view in enumerate(views):
+        recorder.attach(view)
+        view.navigate(f'https://site{i}.example/')
+    batches = []
+    recorder.visits_committed.connect(batches.append)
+    recorder.flush_all()
+
+    assert len(batches) == 1
+    assert [url for url, _, _ in batches[0]] == [f'https://site{i}.example/' for i in range(3)]